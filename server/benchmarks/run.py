@@ -0,0 +1,270 @@
+"""
+View Benchmarks
+---------------
+Measures throughput and latency of the djangoapp views against in-process
+stub upstream services (see `stubs.py`), at several concurrency levels, and
+saves the results as JSON so releases can be compared.
+
+Usage (from the server directory):
+    python -m benchmarks.run [--views get_cars,get_dealer_reviews,get_inventory,add_review]
+                             [--concurrency 1,4,16] [--requests 200]
+                             [--latency-ms 5] [--backend-latency-ms N]
+                             [--sentiment-latency-ms N] [--searchcars-latency-ms N]
+                             [--scale 1] [--no-cache] [--output results.json]
+
+Requests are sent through Django's test client from a pool of threads, so
+they exercise the full middleware and view stack without a web server. Each
+run uses a fresh SQLite database. `--no-cache` turns off the response and
+sentiment caches so every request reaches the upstream stubs.
+
+The output file holds the run settings, one entry per view and concurrency
+level ({"requests", "errors", "throughput_rps", "latency_ms": {"mean", "p50",
+"p95", "p99", "max"}}) and the server-side timing histograms recorded by the
+request timing middleware.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .stubs import BackendStub, SearchCarsStub, SentimentStub
+
+VIEWS = ("get_cars", "get_dealer_reviews", "get_inventory", "add_review")
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Settings that cache upstream responses, turned off by --no-cache
+CACHE_SETTINGS = ("dealers_cache_ttl", "dealer_details_cache_ttl", "dealer_reviews_cache_ttl",
+                  "dealer_full_cache_ttl", "inventory_cache_ttl", "sentiment_cache_max_entries")
+
+
+def _csv(value):
+    return [item for item in value.split(",") if item]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark djangoapp views against stub upstreams")
+    parser.add_argument('--views', type=_csv, default=list(VIEWS),
+                        help="Comma-separated views to measure (default: all)")
+    parser.add_argument('--concurrency', type=lambda value: [int(item) for item in _csv(value)],
+                        default=[1, 4, 16], help="Comma-separated thread counts (default: 1,4,16)")
+    parser.add_argument('--requests', type=int, default=200,
+                        help="Requests per view and concurrency level (default: %(default)s)")
+    parser.add_argument('--warmup', type=int, default=10,
+                        help="Untimed requests before each measurement (default: %(default)s)")
+    parser.add_argument('--latency-ms', type=float, default=5.0,
+                        help="Latency added by every stub (default: %(default)s)")
+    for name in ("backend", "sentiment", "searchcars"):
+        parser.add_argument('--{}-latency-ms'.format(name), type=float, default=None,
+                            help="Override --latency-ms for the {} stub".format(name))
+    parser.add_argument('--scale', type=int, default=1,
+                        help="Multiply the seeded reviews and cars (default: %(default)s)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Disable the response and sentiment caches")
+    parser.add_argument('--output', type=Path, default=None,
+                        help="Results file (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args(argv)
+    unknown = set(args.views) - set(VIEWS)
+    if unknown:
+        parser.error("Unknown views: {}".format(", ".join(sorted(unknown))))
+    return args
+
+
+def _latency(args, name):
+    value = getattr(args, name + "_latency_ms")
+    return (args.latency_ms if value is None else value) / 1000
+
+
+def start_stubs(args):
+    """
+    Starts the stub services and points the Django app at them
+
+    Must run before djangoapp modules are imported: they read their upstream
+    URLs from the environment at import time.
+    """
+    stubs = {
+        "backend": BackendStub(_latency(args, "backend"), args.scale).start(),
+        "sentiment": SentimentStub(_latency(args, "sentiment")).start(),
+        "searchcars": SearchCarsStub(_latency(args, "searchcars"), args.scale).start(),
+    }
+    os.environ["backend_url"] = stubs["backend"].url
+    os.environ["sentiment_analyzer_url"] = stubs["sentiment"].url + "/"
+    os.environ["searchcars_url"] = stubs["searchcars"].url
+    os.environ["inventory_backend"] = "remote"
+    os.environ["review_queue"] = "false"
+    if args.no_cache:
+        for setting in CACHE_SETTINGS:
+            os.environ[setting] = "0"
+    return stubs
+
+
+def setup_django(database):
+    # Configure Django against a fresh database with the default catalog
+    # and create the benchmark user
+    os.environ["benchmark_database"] = database
+    os.environ["DJANGO_SETTINGS_MODULE"] = "benchmarks.settings"
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command("migrate", run_syncdb=True, verbosity=0)
+    call_command("load_catalog", verbosity=0)
+    from django.contrib.auth.models import User
+    return User.objects.create_user("benchmark", password="benchmark")
+
+
+def request_factory(view, dealer_ids):
+    """
+    Returns a function sending one request for `view` through a test client,
+    cycling over the seeded dealers
+    """
+    dealers = itertools.cycle(dealer_ids)
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    def next_dealer():
+        with lock:
+            return next(dealers), next(counter)
+
+    def send(client):
+        dealer_id, number = next_dealer()
+        if view == "get_cars":
+            return client.get("/djangoapp/get_cars")
+        if view == "get_dealer_reviews":
+            return client.get("/djangoapp/reviews/dealer/{}".format(dealer_id))
+        if view == "get_inventory":
+            return client.get("/djangoapp/get_inventory/{}".format(dealer_id))
+        review = {
+            "name": "Benchmark User",
+            "dealership": dealer_id,
+            "review": "Benchmark review number {}".format(number),
+            "purchase": True,
+            "purchase_date": "01/01/2024",
+            "car_make": "Audi",
+            "car_model": "A6",
+            "car_year": 2020,
+        }
+        return client.post("/djangoapp/add_review", data=json.dumps(review),
+                           content_type="application/json")
+
+    return send
+
+
+def _percentile(ordered, percent):
+    # Nearest-rank percentile of an ascending list
+    index = max(int(round(percent / 100 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def measure(send, user, concurrency, total, warmup):
+    """
+    Sends `total` requests from `concurrency` threads
+
+    Returns:
+        dict: {"requests", "errors", "throughput_rps", "latency_ms"}
+    """
+    from django.test import Client
+
+    local = threading.local()
+
+    def timed_request(_):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = Client()
+            client.force_login(user)
+        started = time.perf_counter()
+        response = send(client)
+        elapsed = (time.perf_counter() - started) * 1000
+        # Views report failures in the body as well as the status code
+        try:
+            body_status = json.loads(response.content).get("status", 200)
+        except (ValueError, AttributeError):
+            body_status = response.status_code
+        return elapsed, response.status_code >= 400 or body_status >= 400
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed_request, range(warmup)))
+        started = time.perf_counter()
+        results = list(executor.map(timed_request, range(total)))
+        wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed for elapsed, _ in results)
+    return {
+        "requests": total,
+        "errors": sum(failed for _, failed in results),
+        "throughput_rps": round(total / wall, 2),
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 3),
+            "p50": round(_percentile(latencies, 50), 3),
+            "p95": round(_percentile(latencies, 95), 3),
+            "p99": round(_percentile(latencies, 99), 3),
+            "max": round(latencies[-1], 3),
+        },
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stubs = start_stubs(args)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            user = setup_django(os.path.join(workdir, "benchmark.sqlite3"))
+            import django
+            from djangoapp.instrumentation import metrics_snapshot
+
+            results = []
+            for view in args.views:
+                for concurrency in args.concurrency:
+                    send = request_factory(view, stubs["backend"].dealer_ids())
+                    result = measure(send, user, concurrency, args.requests, args.warmup)
+                    result.update(view=view, concurrency=concurrency)
+                    results.append(result)
+                    print("{:<20} c={:<4} {:>9.1f} req/s  p50 {:>8.2f} ms  p99 {:>8.2f} ms"
+                          "  errors {}".format(view, concurrency, result["throughput_rps"],
+                                              result["latency_ms"]["p50"],
+                                              result["latency_ms"]["p99"], result["errors"]))
+            server_metrics = metrics_snapshot()
+    finally:
+        for stub in stubs.values():
+            stub.stop()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "settings": {key: (str(value) if isinstance(value, Path) else value)
+                         for key, value in vars(args).items()},
+        },
+        "results": results,
+        "server_metrics": server_metrics,
+    }
+    output = args.output or RESULTS_DIR / "{}.json".format(
+        datetime.now().strftime("%Y%m%d-%H%M%S"))
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2)
+    print("Results written to {}".format(output))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,22 @@
+"""
+Benchmark Settings
+------------------
+Project settings with a throwaway SQLite database, so benchmark runs never
+touch db.sqlite3. `run.py` points it at a fresh file for every run (a
+file, not :memory:, so the benchmark threads share one database).
+"""
+
+import os
+import tempfile
+from djangoproj.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('benchmark_database',
+                               os.path.join(tempfile.gettempdir(), 'benchmark.sqlite3')),
+    }
+}
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
@@ -0,0 +1,243 @@
+"""
+Stub Upstream Services
+----------------------
+In-process stand-ins for the services the proxy views call, so benchmarks run
+without Express, Mongo or the sentiment analyzer. Each stub is a threaded
+`http.server` on a free local port that answers the routes the Django app
+uses, after an optional fixed latency.
+
+Stubs are seeded from the repository's data files:
+- BackendStub: database/data/dealerships.json and reviews.json
+- SearchCarsStub: carsInventory/data/car_records.json
+- SentimentStub: labels texts deterministically, without NLTK
+
+`scale` multiplies the seeded reviews and cars (with fresh ids), to measure
+how the views behave with larger upstream payloads.
+
+Classes:
+- StubServer: Threaded HTTP server with a fixed per-request latency
+- BackendStub: /fetchDealers, /fetchDealer, /fetchDealersByIds, /fetchReviews,
+  /fetchReviewsByDealers, /insert_review, /update_sentiments
+- SentimentStub: /analyze/<text> and /analyze/batch
+- SearchCarsStub: /carsearch/<dealer_id>
+"""
+
+import hashlib
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+DATABASE_DATA = SERVER_DIR / "database" / "data"
+INVENTORY_DATA = SERVER_DIR / "carsInventory" / "data"
+
+SENTIMENTS = ("positive", "negative", "neutral")
+
+
+def _load(path, key):
+    with open(path, encoding="utf-8") as data_file:
+        return json.load(data_file)[key]
+
+
+def _scaled(records, scale, id_field=None):
+    # Repeat records `scale` times, renumbering `id_field` so ids stay unique
+    if scale <= 1:
+        return list(records)
+    copies = []
+    next_id = itertools.count(1)
+    for _ in range(scale):
+        for record in records:
+            copy = dict(record)
+            if id_field:
+                copy[id_field] = next(next_id)
+            copies.append(copy)
+    return copies
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Dispatches to the stub's `handle_get` / `handle_post`
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; with Nagle's algorithm on,
+    # each response on a kept-alive connection waits for a delayed ACK
+    # (~40 ms) and the benchmark measures TCP instead of the views
+    disable_nagle_algorithm = True
+
+    def _respond(self, method):
+        stub = self.server.stub
+        if stub.latency:
+            time.sleep(stub.latency)
+        url = urlsplit(self.path)
+        # Base URLs may end in "/" and endpoints start with one
+        path = "/" + unquote(url.path).lstrip("/")
+        query = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        status, payload = getattr(stub, "handle_" + method)(path, query, body)
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._respond("get")
+
+    def do_POST(self):
+        self._respond("post")
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+
+class StubServer:
+    """
+    Threaded HTTP server answering on a free local port
+
+    Args:
+        latency (float): Seconds to wait before answering each request
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handle_get(self, path, query, body):
+        return 404, {"error": "Not found"}
+
+    def handle_post(self, path, query, body):
+        return 404, {"error": "Not found"}
+
+
+class BackendStub(StubServer):
+    """
+    Stub of the Express dealership and review service
+    """
+
+    def __init__(self, latency=0.0, scale=1):
+        super().__init__(latency)
+        self.dealers = _load(DATABASE_DATA / "dealerships.json", "dealerships")
+        reviews = _scaled(_load(DATABASE_DATA / "reviews.json", "reviews"), scale, "id")
+        self.lock = threading.Lock()
+        self.reviews = {review["id"]: review for review in reviews}
+        self.next_id = max(self.reviews, default=0) + 1
+
+    def dealer_ids(self):
+        return [dealer["id"] for dealer in self.dealers]
+
+    def handle_get(self, path, query, body):
+        parts = path.strip("/").split("/")
+        if parts == ["fetchDealers"]:
+            return 200, self.dealers
+        if parts[0] == "fetchDealers" and len(parts) == 2:
+            return 200, [dealer for dealer in self.dealers if dealer["state"] == parts[1]]
+        if parts[0] == "fetchDealer" and len(parts) == 2:
+            return 200, [dealer for dealer in self.dealers if str(dealer["id"]) == parts[1]]
+        if parts == ["fetchDealersByIds"]:
+            # Unknown and malformed ids are left out, as in the backend
+            ids = set(query.get("ids", "").split(","))
+            return 200, [dealer for dealer in self.dealers if str(dealer["id"]) in ids]
+        if parts == ["fetchReviews"]:
+            with self.lock:
+                return 200, list(self.reviews.values())
+        if parts == ["fetchReviewsByDealers"]:
+            ids = set(query.get("ids", "").split(","))
+            with self.lock:
+                return 200, sorted((review for review in self.reviews.values()
+                                    if str(review["dealership"]) in ids),
+                                   key=lambda review: review["id"])
+        if parts[:2] == ["fetchReviews", "dealer"] and len(parts) == 3:
+            with self.lock:
+                reviews = sorted((review for review in self.reviews.values()
+                                  if str(review["dealership"]) == parts[2]),
+                                 key=lambda review: review["id"])
+            offset = int(query.get("offset", 0) or 0)
+            limit = int(query.get("limit", 0) or 0)
+            return 200, reviews[offset:offset + limit] if limit else reviews[offset:]
+        return super().handle_get(path, query, body)
+
+    def handle_post(self, path, query, body):
+        data = json.loads(body or b"null")
+        if path == "/insert_review":
+            with self.lock:
+                review = dict(data, id=self.next_id)
+                self.reviews[review["id"]] = review
+                self.next_id += 1
+            return 200, review
+        if path == "/update_sentiments":
+            with self.lock:
+                for update in data:
+                    if update["id"] in self.reviews:
+                        self.reviews[update["id"]]["sentiment"] = update["sentiment"]
+            return 200, {"modified": len(data)}
+        return super().handle_post(path, query, body)
+
+
+class SentimentStub(StubServer):
+    """
+    Stub of the sentiment analyzer, labelling each text by a hash of it
+    """
+
+    @staticmethod
+    def label(text):
+        return SENTIMENTS[hashlib.md5(text.encode("utf-8")).digest()[0] % len(SENTIMENTS)]
+
+    def handle_get(self, path, query, body):
+        if path.startswith("/analyze/"):
+            return 200, {"sentiment": self.label(path[len("/analyze/"):])}
+        return super().handle_get(path, query, body)
+
+    def handle_post(self, path, query, body):
+        if path == "/analyze/batch":
+            data = json.loads(body or b"null")
+            if isinstance(data, dict):
+                data = data.get("texts")
+            if not isinstance(data, list):
+                return 400, {"error": "Expected a JSON list of texts"}
+            return 200, {"sentiments": [self.label(text) for text in data]}
+        return super().handle_post(path, query, body)
+
+
+class SearchCarsStub(StubServer):
+    """
+    Stub of the car search service, answering /carsearch with the same
+    filters through the local inventory engine
+    """
+
+    def __init__(self, latency=0.0, scale=1):
+        super().__init__(latency)
+        # Imported here so the stubs module loads without Django configured
+        from djangoapp.inventory_engine import InventoryEngine
+        cars = _scaled(_load(INVENTORY_DATA / "car_records.json", "cars"), scale)
+        self.engine = InventoryEngine(cars)
+
+    def handle_get(self, path, query, body):
+        parts = path.strip("/").split("/")
+        if parts[0] == "carsearch" and len(parts) == 2:
+            try:
+                return 200, self.engine.search(parts[1], **query)
+            except (TypeError, ValueError) as err:
+                return 400, {"error": str(err)}
+        return super().handle_get(path, query, body)
@@ -34,6 +34,96 @@ app.get('/', async (req, res) => {
     res.send('Welcome to the Mongoose API');
 });
 
+// Mileage filter values are bucket upper bounds (50000, 100000, ...); anything else means "over 200000"
+const mileageCondition = (mileage) => {
+    if (mileage === 50000) {
+        return { $lte : mileage};
+    } else if (mileage === 100000){
+        return { $lte : mileage, $gt : 50000};
+    } else if (mileage === 150000){
+        return { $lte : mileage, $gt : 100000};
+    } else if (mileage === 200000){
+        return { $lte : mileage, $gt : 150000};
+    }
+    return { $gt : 200000};
+};
+
+// Price filter values are bucket upper bounds (20000, 40000, ...); anything else means "over 80000"
+const priceCondition = (price) => {
+    if (price === 20000) {
+        return { $lte : price};
+    } else if (price === 40000){
+        return { $lte : price, $gt : 20000};
+    } else if (price === 60000){
+        return { $lte : price, $gt : 40000};
+    } else if (price === 80000){
+        return { $lte : price, $gt : 60000};
+    }
+    return { $gt : 80000};
+};
+
+const SORT_FIELDS = ['make', 'model', 'year', 'mileage', 'price'];
+const MAX_LIMIT = 1000;
+
+// Combined search: any of year/make/model/mileage/price plus sort, limit and offset in one query
+app.get('/carsearch/:id', async (req, res) => {
+    try {
+        const idNumber = parseInt(req.params.id, 10);
+        if (isNaN(idNumber)) {
+            return res.status(400).json({ error: 'Invalid id type: id should be a number' });
+        }
+
+        const { year, make, model, mileage, price, sort, limit, offset } = req.query;
+        const query = { dealer_id: idNumber };
+        if (year !== undefined) {
+            const yearNumber = parseInt(year, 10);
+            if (isNaN(yearNumber)) {
+                return res.status(400).json({ error: 'Invalid year type: year should be a number' });
+            }
+            query.year = { $gte : yearNumber };
+        }
+        if (make !== undefined) {
+            query.make = make;
+        }
+        if (model !== undefined) {
+            query.model = model;
+        }
+        if (mileage !== undefined) {
+            query.mileage = mileageCondition(parseInt(mileage, 10));
+        }
+        if (price !== undefined) {
+            query.price = priceCondition(parseInt(price, 10));
+        }
+
+        let cursor = Cars.find(query);
+        if (sort !== undefined) {
+            const field = sort.replace(/^-/, '');
+            if (!SORT_FIELDS.includes(field)) {
+                return res.status(400).json({ error: `Invalid sort field: use one of ${SORT_FIELDS.join(', ')}` });
+            }
+            // Tie-break on _id so limit/offset pages are stable
+            cursor = cursor.sort({ [field]: sort.startsWith('-') ? -1 : 1, _id: 1 });
+        } else if (offset !== undefined || limit !== undefined) {
+            // Paging without a sort still needs a stable order
+            cursor = cursor.sort({ _id: 1 });
+        }
+        const skip = parseInt(offset, 10);
+        if (!isNaN(skip) && skip > 0) {
+            cursor = cursor.skip(skip);
+        }
+        const count = parseInt(limit, 10);
+        if (!isNaN(count) && count > 0) {
+            cursor = cursor.limit(Math.min(count, MAX_LIMIT));
+        }
+
+        const documents = await cursor;
+        res.json(documents);
+    } catch (error) {
+        console.error('Error searching cars:', error);
+        res.status(500).json({ error: 'Error fetching cars' });
+    }
+});
+
 app.get('/cars/:id', async (req, res) => {
     try{
         const document = await Cars.find({dealer_id: req.params.id});
@@ -80,18 +170,7 @@ app.get('/carsbymodel/:id/:model', async (req, res) => {
 app.get('/carsbymaxmileage/:id/:mileage', async (req, res) => {
     try {
         let mileage = parseInt(req.params.mileage)
-        let condition = {}
-        if(mileage === 50000) {
-          condition = { $lte : mileage}
-        } else if (mileage === 100000){
-          condition = { $lte : mileage, $gt : 50000}
-        } else if (mileage === 150000){
-          condition = { $lte : mileage, $gt : 100000}
-        } else if (mileage === 200000){
-          condition = { $lte : mileage, $gt : 150000}
-        } else {
-          condition = { $gt : 200000}
-        }
+        let condition = mileageCondition(mileage)
         const documents = await Cars.find({ dealer_id: req.params.id, mileage : condition });
         res.json(documents);
       } catch (error) {
@@ -102,18 +181,7 @@ app.get('/carsbymaxmileage/:id/:mileage', async (req, res) => {
 app.get('/carsbyprice/:id/:price', async (req, res) => {
     try {
         let price = parseInt(req.params.price)
-        let condition = {}
-        if(price === 20000) {
-            condition = { $lte : price}
-        } else if (price=== 40000){
-            condition = { $lte : price, $gt : 20000}
-        } else if (price === 60000){
-            condition = { $lte : price, $gt : 40000}
-        } else if (price === 80000){
-            condition = { $lte : price, $gt : 60000}
-        } else {
-            condition = { $gt : 80000}
-        }
+        let condition = priceCondition(price)
         const documents = await Cars.find({ dealer_id: req.params.id, price : condition });
         res.json(documents);
         } catch (error) {
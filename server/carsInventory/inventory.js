@@ -34,4 +34,7 @@ price: {
   }
 });
 
+// Lets the combined /carsearch query narrow by dealer and make/model without a collection scan
+cars.index({ dealer_id: 1, make: 1, model: 1, year: 1 });
+
 module.exports = mongoose.model('cars', cars);
\ No newline at end of file
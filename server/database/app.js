@@ -56,9 +56,13 @@ app.get('/', async (req, res) => {
 });
 
 // Express route to fetch all reviews
+// Optional ?after=<review id> returns only newer reviews, ordered by id, for incremental syncs
 app.get('/fetchReviews', async (req, res) => {
   try {
-    const documents = await Reviews.find();
+    const after = parseInt(req.query.after, 10);
+    const documents = isNaN(after)
+      ? await Reviews.find()
+      : await Reviews.find({ id: { $gt: after } }).sort({ id: 1 });
     res.json(documents);
   } catch (error) {
     res.status(500).json({ error: 'Error fetching documents' });
@@ -66,9 +70,22 @@ app.get('/fetchReviews', async (req, res) => {
 });
 
 // Express route to fetch reviews by a particular dealer
+// Optional ?offset=&limit= query parameters return one page, ordered by review id
 app.get('/fetchReviews/dealer/:id', async (req, res) => {
   try {
-    const documents = await Reviews.find({dealership: req.params.id});
+    let query = Reviews.find({dealership: req.params.id});
+    const offset = parseInt(req.query.offset, 10);
+    const limit = parseInt(req.query.limit, 10);
+    if (!isNaN(offset) || !isNaN(limit)) {
+      query = query.sort({ id: 1 });
+    }
+    if (!isNaN(offset) && offset > 0) {
+      query = query.skip(offset);
+    }
+    if (!isNaN(limit) && limit > 0) {
+      query = query.limit(limit);
+    }
+    const documents = await query;
     res.json(documents);
   } catch (error) {
     res.status(500).json({ error: 'Error fetching documents' });
@@ -105,9 +122,46 @@ app.get('/fetchDealer/:id', async (req, res) => {
   }
 });
 
+// Express route to fetch several dealers in one query
+// ?ids=1,2,3 returns the dealers with those ids; unknown ids are left out
+app.get('/fetchDealersByIds', async (req, res) => {
+  try {
+    const ids = String(req.query.ids || '').split(',')
+      .map((id) => parseInt(id, 10))
+      .filter((id) => !isNaN(id));
+    const documents = await Dealerships.find({ id: { $in: ids } });
+    res.json(documents);
+  } catch (err) {
+    res.status(500).json({ error: 'Error fetching documents' });
+  }
+});
+
+// Express route to fetch the reviews of several dealers in one query
+// ?ids=1,2,3 returns every review of those dealers, ordered by review id
+app.get('/fetchReviewsByDealers', async (req, res) => {
+  try {
+    const ids = String(req.query.ids || '').split(',')
+      .map((id) => parseInt(id, 10))
+      .filter((id) => !isNaN(id));
+    const documents = await Reviews.find({ dealership: { $in: ids } }).sort({ id: 1 });
+    res.json(documents);
+  } catch (err) {
+    res.status(500).json({ error: 'Error fetching documents' });
+  }
+});
+
 //Express route to insert review
+// An optional Idempotency-Key header makes retries safe: a key seen before
+// returns the review saved with it instead of inserting a copy
 app.post('/insert_review', express.raw({ type: '*/*' }), async (req, res) => {
   data = JSON.parse(req.body);
+  const idempotencyKey = req.get('Idempotency-Key');
+  if (idempotencyKey) {
+    const existing = await Reviews.findOne({ idempotency_key: idempotencyKey });
+    if (existing) {
+      return res.json(existing);
+    }
+  }
   const documents = await Reviews.find().sort( { id: -1 } )
   let new_id = documents[0]['id']+1
 
@@ -121,6 +175,8 @@ app.post('/insert_review', express.raw({ type: '*/*' }), async (req, res) => {
 		"car_make": data['car_make'],
 		"car_model": data['car_model'],
 		"car_year": data['car_year'],
+		"sentiment": data['sentiment'],
+		"idempotency_key": idempotencyKey,
 	});
 
   try {
@@ -132,6 +188,27 @@ app.post('/insert_review', express.raw({ type: '*/*' }), async (req, res) => {
   }
 });
 
+// Express route to store sentiments of existing reviews
+// Body: [{"id": <review id>, "sentiment": <label>}, ...]
+app.post('/update_sentiments', express.raw({ type: '*/*' }), async (req, res) => {
+  try {
+    const updates = JSON.parse(req.body);
+    if (updates.length === 0) {
+      return res.json({ modified: 0 });
+    }
+    const result = await Reviews.bulkWrite(updates.map((update) => ({
+      updateOne: {
+        filter: { id: update['id'] },
+        update: { $set: { sentiment: update['sentiment'] } },
+      },
+    })));
+    res.json({ modified: result.modifiedCount });
+  } catch (error) {
+    console.log(error);
+    res.status(500).json({ error: 'Error updating sentiments' });
+  }
+});
+
 // Start the Express server
 app.listen(port, () => {
   console.log(`Server is running on http://localhost:${port}`);
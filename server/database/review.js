@@ -47,8 +47,23 @@ const reviews = new Schema({
     type: Number,
     required: true
   },
+  // Sentiment label scored when the review is written, so reads need no analyzer call
+  sentiment: {
+    type: String,
+    required: false
+  },
+  // Idempotency-Key the review was inserted with, so a retried insert returns it instead of a copy
+  idempotency_key: {
+    type: String,
+    required: false
+  },
 });
 
+// Serves paged per-dealer review reads without a collection scan
+reviews.index({ dealership: 1, id: 1 });
+// One review per idempotency key; reviews inserted without a key are not indexed
+reviews.index({ idempotency_key: 1 }, { unique: true, sparse: true });
+
 // Export Mongoose model
 // Will be stored in MongoDB under collection "reviews"
 module.exports = mongoose.model('reviews', reviews);
\ No newline at end of file
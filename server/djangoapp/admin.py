@@ -1,16 +1,19 @@
 """
 Django Admin Configuration
 --------------------------
-This file registers the CarMake and CarModel models
-with the Django admin site so they can be managed
+This file registers the CarMake, CarModel and ReviewJob
+models with the Django admin site so they can be managed
 through the built-in admin interface.
 """
 
 from django.contrib import admin
-from .models import CarMake, CarModel
+from .models import CarMake, CarModel, ReviewJob
 
 # Register CarMake model in Django admin
 admin.site.register(CarMake)
 
 # Register CarModel model in Django admin
-admin.site.register(CarModel)
\ No newline at end of file
+admin.site.register(CarModel)
+
+# Register ReviewJob model in Django admin (queued review submissions)
+admin.site.register(ReviewJob)
@@ -7,6 +7,17 @@ recognize and include the app within the project.
 """
 
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
 
 class DjangoappConfig(AppConfig):
-    name = 'djangoapp'
\ No newline at end of file
+    name = 'djangoapp'
+
+    def ready(self):
+        # Connect model signal receivers
+        from . import signals  # noqa: F401
+        # Register system checks
+        from . import checks  # noqa: F401
+        # Time the queries of every DB connection for the request timings
+        from .instrumentation import install_query_timer
+        connection_created.connect(install_query_timer)
\ No newline at end of file
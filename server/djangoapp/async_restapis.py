@@ -0,0 +1,347 @@
+"""
+Async API Client Utilities
+--------------------------
+This file mirrors `restapis.py` for async views. It uses one pooled
+`httpx.AsyncClient` per upstream service and event loop, configured from the
+same environment variables as the sync clients (see `http_client.py`), so a
+single ASGI worker can keep many proxy requests in flight at once. Calls are
+timed under "upstream.<name>" like the sync clients, and bodies are encoded
+and decoded with `serializers.py`.
+
+Functions:
+- coalesced_get: Sends a GET request, sharing the upstream call with identical concurrent requests
+- get_request: Sends a GET request to the backend server
+- get_request_raw: Returns a backend GET response body undecoded, for pass-through
+- analyze_review_sentiments: Sends text to the sentiment analysis service and returns results
+- analyze_review_sentiments_batch: Sends a list of texts to the sentiment analysis service in one request
+- analyze_review_sentiments_concurrent: Scores a list of texts with parallel per-text requests
+- get_review_sentiments: Returns one sentiment label per text, from the sentiment cache or the configured scoring mode
+- searchcars_request: Sends a GET request to the car search service with optional query parameters
+- searchcars_request_raw: Returns a car search response body undecoded, for pass-through
+"""
+
+import asyncio
+import hashlib
+import logging
+import weakref
+from urllib.parse import urlencode
+import httpx
+from asgiref.sync import sync_to_async
+from . import sentiment_cache, serializers
+from .instrumentation import timed
+from .single_flight import AsyncSingleFlight
+from .http_client import CircuitBreaker, CircuitOpenError, RETRY_STATUSES, upstream_setting
+from .restapis import (backend_url, sentiment_analyzer_url, searchcars_url,
+                       sentiment_mode, sentiment_concurrency, JSON_HEADERS,
+                       UNKNOWN_SENTIMENT)
+
+logger = logging.getLogger(__name__)
+
+# Identical concurrent GETs and scoring calls on a loop share one upstream call
+flights = AsyncSingleFlight()
+
+
+class AsyncUpstreamClient:
+    """
+    Pooled async HTTP client for one upstream service
+
+    httpx clients are bound to the event loop they were first used on, so one
+    client is kept per running loop.
+
+    Args:
+        name (str): Upstream name, used to look up settings
+        base_url (str): Base URL that endpoints are appended to
+    """
+
+    def __init__(self, name, base_url):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(float(upstream_setting(name, "read_timeout")),
+                                     connect=float(upstream_setting(name, "connect_timeout")))
+        self.limits = httpx.Limits(
+            max_connections=int(upstream_setting(name, "pool_size")))
+        self.retries = int(upstream_setting(name, "retries"))
+        self.retry_backoff = float(upstream_setting(name, "retry_backoff"))
+        self.breaker = CircuitBreaker(
+            int(upstream_setting(name, "breaker_threshold")),
+            float(upstream_setting(name, "breaker_reset")))
+        self._clients = weakref.WeakKeyDictionary()
+
+    def client(self):
+        # Return the httpx client for the running event loop
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            # The transport retries failed connection attempts only
+            transport = httpx.AsyncHTTPTransport(retries=self.retries,
+                                                 limits=self.limits)
+            client = httpx.AsyncClient(transport=transport, timeout=self.timeout)
+            self._clients[loop] = client
+        return client
+
+    async def _send(self, method, endpoint, **kwargs):
+        # Send a request, retrying GETs answered with RETRY_STATUSES like the
+        # sync client's urllib3 Retry; failed connection attempts are
+        # retried by the transport
+        attempts = self.retries + 1 if method == "GET" else 1
+        for attempt in range(attempts):
+            response = await self.client().request(
+                method, self.base_url + endpoint, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                return response
+            await response.aclose()
+            await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+    async def request(self, method, endpoint, **kwargs):
+        """
+        Sends a request to the upstream through the pooled client
+
+        Raises:
+            CircuitOpenError: If the circuit for this upstream is open
+            httpx.HTTPError: On connection errors and timeouts
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                "Circuit open for upstream '{}'".format(self.name))
+        try:
+            with timed("upstream." + self.name):
+                response = await self._send(method, endpoint, **kwargs)
+        except httpx.HTTPError:
+            self.breaker.record_failure()
+            raise
+        if response.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def get(self, endpoint, params=None):
+        return await self.request("GET", endpoint, params=params)
+
+    async def post(self, endpoint, **kwargs):
+        return await self.request("POST", endpoint, **kwargs)
+
+
+# Pooled clients, one per upstream service
+backend_client = AsyncUpstreamClient("backend", backend_url)
+sentiment_client = AsyncUpstreamClient("sentiment_analyzer", sentiment_analyzer_url)
+searchcars_client = AsyncUpstreamClient("searchcars", searchcars_url)
+
+# The shared cache tier may block, so it is only touched from a thread
+if sentiment_cache.sentiment_cache_alias:
+    _cache_get_many = sync_to_async(sentiment_cache.get_many)
+    _cache_set_many = sync_to_async(sentiment_cache.set_many)
+else:
+    async def _cache_get_many(texts):
+        return sentiment_cache.get_many(texts)
+
+    async def _cache_set_many(texts, labels):
+        sentiment_cache.set_many(texts, labels)
+
+
+async def coalesced_get(client, endpoint, params=None):
+    """
+    Async counterpart of `restapis.coalesced_get`
+
+    Returns:
+        bytes: The response body; each caller decodes its own copy
+
+    Raises:
+        httpx.HTTPStatusError: If the upstream answered with a non-2xx status
+    """
+    params = params or {}
+    key = "{}:{}?{}".format(client.name, endpoint, urlencode(sorted(params.items())))
+
+    async def fetch():
+        response = await client.get(endpoint, params=params)
+        response.raise_for_status()
+        return response.content
+    return await flights.do(key, fetch)
+
+
+async def get_request(endpoint, **kwargs):
+    """
+    Sends a GET request to the backend server
+
+    Args:
+        endpoint (str): API endpoint to call
+        **kwargs: Optional query parameters as key-value pairs
+
+    Returns:
+        dict: JSON response from the backend if successful, and None otherwise
+    """
+    try:
+        return serializers.loads(await coalesced_get(backend_client, endpoint, kwargs))
+    except Exception as err:
+        logger.warning("GET %s failed: %r", endpoint, err)
+
+
+async def get_request_raw(endpoint, **kwargs):
+    """
+    Sends a GET request to the backend server and returns the body undecoded,
+    for views that pass it on to the client unchanged
+
+    Returns:
+        bytes: The JSON body of a 2xx response, and None otherwise (failed
+               calls and error statuses)
+    """
+    try:
+        body = await coalesced_get(backend_client, endpoint, kwargs)
+    except Exception as err:
+        logger.warning("GET %s failed: %r", endpoint, err)
+        return None
+    if not serializers.looks_like_json(body):
+        logger.warning("GET %s returned a non-JSON body", endpoint)
+        return None
+    return body
+
+
+async def analyze_review_sentiments(text):
+    """
+    Sends a text string to the sentiment analysis service
+
+    Args:
+        text (str): Review text to analyze
+
+    Returns:
+        dict: Sentiment analysis results (JSON) if successful, and None otherwise
+    """
+    try:
+        return serializers.loads(await coalesced_get(sentiment_client, "analyze/"+text))
+    except Exception as err:
+        logger.warning("Sentiment analysis failed: %r", err)
+
+
+async def analyze_review_sentiments_batch(texts):
+    """
+    Sends a list of text strings to the sentiment analysis service in one request
+
+    Args:
+        texts (list[str]): Review texts to analyze
+
+    Returns:
+        list[str]: Sentiment labels in the same order as `texts` if successful,
+                   and None otherwise
+    """
+    if not texts:
+        return []
+    try:
+        response = await sentiment_client.post(
+            "analyze/batch", content=serializers.dumps(list(texts)), headers=JSON_HEADERS)
+        sentiments = serializers.loads(response.content)['sentiments']
+        if len(sentiments) != len(texts):
+            raise ValueError("Expected {} sentiments, got {}".format(
+                len(texts), len(sentiments)))
+        return sentiments
+    except Exception as err:
+        logger.warning("Batch sentiment analysis of %d texts failed: %r", len(texts), err)
+
+
+async def analyze_review_sentiments_concurrent(texts, max_workers=None):
+    """
+    Scores a list of text strings with parallel per-text requests
+
+    Args:
+        texts (list[str]): Review texts to analyze
+        max_workers (int): Optional. Maximum number of in-flight requests.
+                           Defaults to `sentiment_concurrency`
+
+    Returns:
+        list[str]: Sentiment labels in the same order as `texts`. A text whose
+                   request failed is labelled UNKNOWN_SENTIMENT
+    """
+    semaphore = asyncio.Semaphore(max(max_workers or sentiment_concurrency, 1))
+
+    async def score(text):
+        async with semaphore:
+            response = await analyze_review_sentiments(text)
+        if isinstance(response, dict) and 'sentiment' in response:
+            return response['sentiment']
+        return UNKNOWN_SENTIMENT
+
+    return list(await asyncio.gather(*(score(text) for text in texts)))
+
+
+async def _score_sentiments(texts):
+    # Score texts with the configured `sentiment_mode`, bypassing the cache
+    if sentiment_mode == "batch":
+        sentiments = await analyze_review_sentiments_batch(texts)
+        if sentiments is not None:
+            return sentiments
+    # Batch endpoint disabled or unavailable, fan out per-text requests
+    return await analyze_review_sentiments_concurrent(texts)
+
+
+async def _score_sentiments_coalesced(texts):
+    # Requests for the same dealer page score the same texts: score them once
+    digest = hashlib.sha256("\0".join(texts).encode("utf-8")).hexdigest()
+
+    async def score():
+        return tuple(await _score_sentiments(texts))
+    return await flights.do("sentiments:" + digest, score)
+
+
+async def get_review_sentiments(texts):
+    """
+    Returns one sentiment label per text
+
+    Async counterpart of `restapis.get_review_sentiments`
+
+    Args:
+        texts (list[str]): Review texts to analyze
+
+    Returns:
+        list[str]: Sentiment labels in the same order as `texts`
+    """
+    sentiments = await _cache_get_many(texts)
+    missing = [index for index, sentiment in enumerate(sentiments)
+               if sentiment is None]
+    if missing:
+        # Score each distinct uncached text once
+        missing_texts = list(dict.fromkeys(texts[index] for index in missing))
+        scored = dict(zip(missing_texts, await _score_sentiments_coalesced(missing_texts)))
+        for index in missing:
+            sentiments[index] = scored[texts[index]]
+        # Failed calls are not cached so they are retried on the next view
+        known = [(text, sentiment) for text, sentiment in scored.items()
+                 if sentiment != UNKNOWN_SENTIMENT]
+        if known:
+            await _cache_set_many(*zip(*known))
+    return sentiments
+
+
+async def searchcars_request(endpoint, **kwargs):
+    """
+    Sends a GET request to the car search service
+
+    Args:
+        endpoint (str): API endpoint to call
+        **kwargs: Optional query parameters as key-value pairs
+
+    Returns:
+        dict: JSON response from the search service if successful, and None otherwise
+    """
+    try:
+        return serializers.loads(await coalesced_get(searchcars_client, endpoint, kwargs))
+    except Exception as err:
+        logger.warning("Car search %s failed: %r", endpoint, err)
+
+
+async def searchcars_request_raw(endpoint, **kwargs):
+    """
+    Sends a GET request to the car search service and returns the body
+    undecoded, for views that pass it on to the client unchanged
+
+    Returns:
+        bytes: The JSON body of a 2xx response, and None otherwise (failed
+               calls and error statuses)
+    """
+    try:
+        body = await coalesced_get(searchcars_client, endpoint, kwargs)
+    except Exception as err:
+        logger.warning("Car search %s failed: %r", endpoint, err)
+        return None
+    if not serializers.looks_like_json(body):
+        logger.warning("Car search %s returned a non-JSON body", endpoint)
+        return None
+    return body
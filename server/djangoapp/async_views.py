@@ -0,0 +1,250 @@
+"""
+Async Views
+-----------
+This file defines async versions of the dealer and inventory proxy views.
+They await the upstream services through `async_restapis.py` instead of
+blocking a worker thread, so one ASGI worker can serve many in-flight proxy
+requests. They are routed in place of the sync views in `views.py` when the
+`ASYNC_PROXY_VIEWS` setting is enabled; WSGI deployments keep the sync views.
+
+Functions:
+- search_inventory: Runs an inventory query against the local engine or the car search service
+- fetch_dealer: Returns one dealer from the local mirror when fresh, else the backend
+- dealer_reviews_page: Fetches a page of a dealer's reviews with sentiments
+- get_dealerships: Fetches a list of dealerships (all or filtered by state)
+- get_dealer_reviews: Fetches reviews for a specific dealer, with sentiment analysis
+- get_dealer_page: Fetches dealer details, reviews with sentiments and optionally inventory in one request
+- get_dealer_details: Fetches details of a specific dealer
+- get_dealers_by_ids: Fetches details of several dealers in one request
+- get_inventory: Fetches dealer inventory, filterable by any combination of year, make, model, mileage, and price
+"""
+import asyncio
+from asgiref.sync import sync_to_async
+from django.utils.cache import add_never_cache_headers
+from .async_restapis import (get_request, get_request_raw, get_review_sentiments,
+                             searchcars_request, searchcars_request_raw)
+from .response_cache import cache_response
+from .views import (JsonResponse, attach_sentiments, dealers_by_ids_response,
+                    dealerships_endpoint, inventory_query, parse_dealer_ids,
+                    proxy_json_response, search_local_inventory, uncached_if_missing,
+                    unscored_reviews)
+from . import inventory_engine, mirror
+from .streaming import aiter_pages, page_kwargs, page_params, stream_json_list, stream_requested
+
+
+async def search_inventory(dealer_id, data):
+    """
+    Async counterpart of `views.search_inventory`
+    """
+    endpoint, params = inventory_query(dealer_id, data)
+    if inventory_engine.inventory_backend == "local":
+        # In-memory lookups are fast enough to run on the event loop
+        return search_local_inventory(dealer_id, params)
+    return await searchcars_request(endpoint, **params)
+
+
+async def fetch_dealer(dealer_id):
+    """
+    Async counterpart of `views.fetch_dealer`
+    """
+    if await sync_to_async(mirror.serving)():
+        return await sync_to_async(mirror.dealer)(dealer_id)
+    return await get_request("/fetchDealer/"+str(dealer_id))
+
+
+async def dealer_reviews_page(dealer_id, offset=0, limit=None):
+    """
+    Async counterpart of `views.dealer_reviews_page`
+    """
+    from_mirror = await sync_to_async(mirror.serving)()
+    if from_mirror:
+        reviews = await sync_to_async(mirror.dealer_reviews)(dealer_id, offset, limit)
+    else:
+        reviews = await get_request("/fetchReviews/dealer/"+str(dealer_id),
+                                    **page_kwargs(offset, limit))
+    if not isinstance(reviews, list):
+        return None, True
+    # Only reviews written before sentiments were stored still need scoring
+    pending = unscored_reviews(reviews)
+    sentiments = await get_review_sentiments(
+        [review_detail['review'] for review_detail in pending])
+    scored = attach_sentiments(pending, sentiments)
+    if from_mirror and pending:
+        await sync_to_async(mirror.save_sentiments)(pending)
+    return reviews, scored
+
+
+@cache_response("dealers", scope_kwarg="state")
+async def get_dealerships(request, state="All"):
+    """
+    Fetches dealerships from the local mirror or the backend service
+
+    Args:
+        state (str): Optional. If provided, filters dealerships by state.
+                     Defaults to "All" for all dealerships
+
+    Returns:
+        JsonResponse: {"status": 200, "dealers": <list of dealerships>}
+    """
+    if await sync_to_async(mirror.serving)():
+        dealerships = await sync_to_async(mirror.dealerships)(state)
+        return JsonResponse({"status":200,"dealers":dealerships})
+    # The backend's list is returned unchanged, so it is not decoded
+    return proxy_json_response("dealers", await get_request_raw(dealerships_endpoint(state)))
+
+
+@cache_response("dealer_reviews")
+async def get_dealer_reviews(request, dealer_id):
+    """
+    Fetches dealer reviews with sentiment analysis
+
+    Args:
+        dealer_id (int): The ID of the dealer
+
+    Query Parameters (optional):
+        - offset, limit, stream: see `views.get_dealer_reviews`
+
+    Returns:
+        JsonResponse: {"status": 200, "reviews": <list with sentiments>} if valid dealer_id,
+                      {"status": 400, "message": "Bad Request"} otherwise
+        StreamingHttpResponse: {"status": 200, "reviews": [...], "complete": <bool>} when streaming
+    """
+    if(dealer_id):
+        try:
+            offset, limit = page_params(request.GET)
+        except ValueError:
+            return JsonResponse({"status":400,"message":"Bad Request"})
+        if stream_requested(request.GET):
+            async def fetch_page(page_offset, size):
+                return (await dealer_reviews_page(dealer_id, page_offset, size))[0]
+            return stream_json_list("reviews", aiter_pages(fetch_page, offset, limit))
+
+        reviews, scored = await dealer_reviews_page(dealer_id, offset, limit)
+        response = uncached_if_missing(
+            JsonResponse({"status":200,"reviews":reviews}), reviews)
+        if not scored:
+            # Retry the failed scores on the next read instead of caching them
+            add_never_cache_headers(response)
+        return response
+    else:
+        return JsonResponse({"status":400,"message":"Bad Request"})
+
+
+@cache_response("dealer_full")
+async def get_dealer_page(request, dealer_id):
+    """
+    Fetches everything the dealer page shows in one request
+
+    Args:
+        dealer_id (int): The ID of the dealer
+
+    Query Parameters (optional):
+        - inventory, inventory_limit: see `views.get_dealer_page`
+
+    Returns:
+        JsonResponse: see `views.get_dealer_page`
+    """
+    if not dealer_id:
+        return JsonResponse({"status":400,"message":"Bad Request"})
+
+    include_inventory = request.GET.get('inventory', 'false').lower() == 'true'
+
+    # Reviews are scored as soon as they arrive, overlapping the other calls
+    calls = [fetch_dealer(dealer_id), dealer_reviews_page(dealer_id)]
+    if include_inventory:
+        calls.append(search_inventory(
+            dealer_id, {'limit': request.GET.get('inventory_limit', '10')}))
+    results = await asyncio.gather(*calls)
+
+    reviews, scored = results[1]
+    data = {"status":200,"dealer":results[0],"reviews":reviews}
+    if include_inventory:
+        data["cars"] = results[2]
+
+    response = uncached_if_missing(JsonResponse(data), *data.values())
+    if not scored:
+        add_never_cache_headers(response)
+    return response
+
+
+@cache_response("dealer_details")
+async def get_dealer_details(request, dealer_id):
+    """
+    Fetches details of a specific dealer
+
+    Args:
+        dealer_id (int): The ID of the dealer
+
+    Returns:
+        JsonResponse: {"status": 200, "dealer": <dealer data>} if valid dealer_id,
+                      {"status": 400, "message": "Bad Request"} otherwise
+    """
+    if(dealer_id):
+        if await sync_to_async(mirror.serving)():
+            dealership = await sync_to_async(mirror.dealer)(dealer_id)
+            return JsonResponse({"status":200,"dealer":dealership})
+        return proxy_json_response(
+            "dealer", await get_request_raw("/fetchDealer/"+str(dealer_id)))
+    else:
+        return JsonResponse({"status":400,"message":"Bad Request"})
+
+
+@cache_response("dealers_by_ids")
+async def get_dealers_by_ids(request):
+    """
+    Fetches details of several dealers in one request
+
+    Query Parameters:
+        - ids: see `views.get_dealers_by_ids`
+
+    Returns:
+        JsonResponse: see `views.get_dealers_by_ids`
+    """
+    try:
+        dealer_ids = parse_dealer_ids(request.GET['ids'])
+    except (KeyError, ValueError):
+        return JsonResponse({"status":400,"message":"Bad Request"}, status=400)
+    if await sync_to_async(mirror.serving)():
+        dealers = await sync_to_async(mirror.dealers_by_ids)(dealer_ids)
+    else:
+        dealers = await get_request("/fetchDealersByIds",
+                                    ids=",".join(str(dealer_id) for dealer_id in dealer_ids))
+    return dealers_by_ids_response(dealer_ids, dealers)
+
+
+@cache_response("inventory")
+async def get_inventory(request, dealer_id):
+    """
+    Fetches dealer inventory with optional filters
+
+    Args:
+        dealer_id (int): The ID of the dealer
+
+    Query Parameters (optional):
+        - year, make, model, mileage, price, sort, limit, offset, stream: see `views.get_inventory`
+
+    Returns:
+        JsonResponse: {"status": 200, "cars": <filtered inventory>} if successful,
+                      {"status": 400, "message": "Bad Request"} otherwise
+    """
+    data = request.GET
+    if (dealer_id):
+        try:
+            offset, limit = page_params(data)
+        except ValueError:
+            return JsonResponse({"status": 400, "message": "Bad Request"})
+        if stream_requested(data):
+            async def fetch_page(page_offset, size):
+                return await search_inventory(dealer_id, dict(
+                    data.items(), offset=str(page_offset), limit=str(size)))
+            return stream_json_list("cars", aiter_pages(fetch_page, offset, limit))
+
+        if inventory_engine.inventory_backend == "local":
+            cars = await search_inventory(dealer_id, data)
+            return uncached_if_missing(
+                JsonResponse({"status": 200, "cars": cars}), cars)
+        # The car search service's list is returned unchanged, so it is not decoded
+        endpoint, params = inventory_query(dealer_id, data)
+        return proxy_json_response("cars", await searchcars_request_raw(endpoint, **params))
+    else:
+        return JsonResponse({"status": 400, "message": "Bad Request"})
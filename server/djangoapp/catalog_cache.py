@@ -0,0 +1,120 @@
+"""
+Catalog Cache
+-------------
+This file keeps the `get_cars` payload precomputed. The serialized CarModels
+document is stored as pre-encoded bytes, with its ETag, in process memory and
+in Django's cache under a catalog version. The version is bumped whenever a
+CarMake or CarModel changes (see `signals.py`) or the catalog is reloaded, so
+every process rebuilds the payload once and then serves it with no ORM query
+or JSON encoding.
+
+Version bumps only reach other processes when the cache is shared (see
+CACHES in settings.py). As a backstop for per-process caches, every copy of
+the payload expires after `catalog_cache_ttl` seconds and is rebuilt, so a
+change made from another process is served at most that late.
+
+Settings (environment variables):
+- catalog_cache_alias: Django cache alias to use (default "default")
+- catalog_cache_ttl: Seconds a built payload is served before it is rebuilt (default 300)
+
+Functions:
+- current_version: Returns the current catalog version
+- bump_version: Invalidates the cached payload in every process
+- get_catalog: Returns the encoded payload and its ETag
+"""
+
+import hashlib
+import os
+import threading
+import time
+from django.core.cache import caches
+from dotenv import load_dotenv
+from . import serializers
+from .models import CarModel
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Django cache alias holding the catalog version and payload
+catalog_cache_alias = os.getenv('catalog_cache_alias', default="default")
+
+# Seconds a payload is served, from this process or the cache, before it is rebuilt
+catalog_cache_ttl = int(os.getenv('catalog_cache_ttl', default="300"))
+
+VERSION_KEY = "catalog:version"
+PAYLOAD_KEY = "catalog:payload:{}"
+
+_lock = threading.Lock()
+# (version, body, etag, expiry on the monotonic clock) of the payload built
+# or fetched by this process
+_local = (None, None, None, 0)
+
+
+def _cache():
+    return caches[catalog_cache_alias]
+
+
+def current_version():
+    """
+    Returns the current catalog version, initializing it if missing
+    """
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_version(**kwargs):
+    """
+    Invalidates the cached payload in every process sharing the cache
+
+    Accepts and ignores signal keyword arguments so it can be used as a
+    receiver directly.
+    """
+    cache = _cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Missing or evicted: start over from a value no process has cached
+        cache.set(VERSION_KEY, current_version() + 1, timeout=None)
+
+
+def _build():
+    # Serialize the catalog straight from a two-column projection
+    cars = [{"CarModel": name, "CarMake": make_name}
+            for name, make_name in CarModel.objects.values_list('name', 'car_make__name')]
+    body = serializers.dumps({"CarModels": cars})
+    etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+    return body, etag
+
+
+def get_catalog():
+    """
+    Returns the encoded get_cars payload and its ETag
+
+    Returns:
+        tuple: (body bytes, etag str)
+    """
+    global _local
+    version = current_version()
+    local_version, body, etag, expires = _local
+    if local_version == version and time.monotonic() < expires:
+        return body, etag
+
+    with _lock:
+        local_version, body, etag, expires = _local
+        if local_version == version and time.monotonic() < expires:
+            return body, etag
+        cache = _cache()
+        key = PAYLOAD_KEY.format(version)
+        cached = cache.get(key)
+        if cached is None:
+            cached = _build()
+            # Old versions are never read again, and a per-process cache may
+            # have missed a bump, so let payloads expire
+            cache.set(key, cached, timeout=catalog_cache_ttl)
+        body, etag = cached
+        _local = (version, body, etag, time.monotonic() + catalog_cache_ttl)
+        return body, etag
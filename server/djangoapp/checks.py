@@ -0,0 +1,50 @@
+"""
+System Checks
+-------------
+This file registers Django system checks for deployment settings the app
+depends on. They run with `manage.py check`, `runserver` and every other
+management command.
+
+Functions:
+- check_shared_cache: Warns when cross-process invalidation uses a per-process cache
+"""
+
+from django.conf import settings
+from django.core import checks
+
+# Cache backends whose contents no other process can see
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Warns when a cache alias used to invalidate across processes is per process
+
+    The catalog version, the cached responses and shared single-flight locks
+    live in Django's cache. With a per-process backend, an admin edit,
+    `load_catalog`, `sync_mirror` or `process_review_jobs` only invalidates
+    the copies of the process it runs in; the others serve stale data until
+    their entries expire.
+    """
+    from . import catalog_cache, response_cache, single_flight
+
+    aliases = {catalog_cache.catalog_cache_alias, response_cache.response_cache_alias}
+    if single_flight.single_flight_mode == "shared":
+        aliases.add(single_flight.single_flight_cache_alias)
+    warnings = []
+    for alias in sorted(aliases):
+        backend = settings.CACHES.get(alias, {}).get("BACKEND")
+        if backend in PROCESS_LOCAL_BACKENDS:
+            warnings.append(checks.Warning(
+                "Cache alias '{}' uses the per-process backend {}.".format(alias, backend),
+                hint="Invalidation from admin edits and management commands does not "
+                     "reach other processes. Set cache_backend and cache_location to a "
+                     "shared cache (e.g. Redis or Memcached) when running more than one "
+                     "process.",
+                id="djangoapp.W001",
+            ))
+    return warnings
@@ -0,0 +1,188 @@
+"""
+Upstream HTTP Client
+--------------------
+This file provides the shared HTTP client layer used by `restapis.py`. Each
+upstream service (backend, sentiment analyzer, car search) gets one pooled,
+keep-alive `requests.Session` with timeouts, retries on idempotent GETs and a
+circuit breaker. Every call is timed under "upstream.<name>" in the request's
+timing record (see `instrumentation.py`).
+
+Settings are read from environment variables (or the .env file), per upstream
+first and then from a shared `upstream_` default, e.g. `backend_read_timeout`
+falls back to `upstream_read_timeout`:
+- <name>_pool_size: Maximum pooled connections kept alive (default 10)
+- <name>_connect_timeout: Seconds to wait for a connection (default 3.05)
+- <name>_read_timeout: Seconds to wait for a response (default 10)
+- <name>_retries: Retries for failed GET requests (default 2)
+- <name>_retry_backoff: Backoff factor between retries in seconds (default 0.2)
+- <name>_breaker_threshold: Consecutive failures that open the circuit (default 5)
+- <name>_breaker_reset: Seconds before an open circuit lets a request through (default 30)
+
+Classes:
+- CircuitOpenError: Raised when a request is refused by an open circuit
+- CircuitBreaker: Tracks consecutive failures for one upstream
+- UpstreamClient: Pooled session for one upstream base URL
+"""
+
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+from .instrumentation import timed
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Fallback values for settings missing from the environment
+DEFAULTS = {
+    "pool_size": "10",
+    "connect_timeout": "3.05",
+    "read_timeout": "10",
+    "retries": "2",
+    "retry_backoff": "0.2",
+    "breaker_threshold": "5",
+    "breaker_reset": "30",
+}
+
+# Upstream status codes worth retrying and counting as failures
+RETRY_STATUSES = (502, 503, 504)
+
+
+def upstream_setting(name, setting):
+    """
+    Reads a client setting for an upstream from the environment
+
+    Args:
+        name (str): Upstream name, e.g. "backend"
+        setting (str): Setting name, one of the keys of DEFAULTS
+
+    Returns:
+        str: `<name>_<setting>`, else `upstream_<setting>`, else the default
+    """
+    return os.getenv(name + "_" + setting,
+                     default=os.getenv("upstream_" + setting,
+                                       default=DEFAULTS[setting]))
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of calling an upstream whose circuit is open
+    """
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failures for one upstream
+
+    After `threshold` consecutive failures the circuit opens and requests are
+    refused for `reset_timeout` seconds. After that a single trial request is
+    let through; its outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        # Return True if a request may be sent now
+        if self.threshold <= 0:
+            return True
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Half-open: let one trial request through
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.threshold > 0 and self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class UpstreamClient:
+    """
+    Pooled, keep-alive HTTP client for one upstream service
+
+    Args:
+        name (str): Upstream name, used to look up settings
+        base_url (str): Base URL that endpoints are appended to
+    """
+
+    def __init__(self, name, base_url):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = (float(upstream_setting(name, "connect_timeout")),
+                        float(upstream_setting(name, "read_timeout")))
+        self.breaker = CircuitBreaker(
+            int(upstream_setting(name, "breaker_threshold")),
+            float(upstream_setting(name, "breaker_reset")))
+
+        pool_size = int(upstream_setting(name, "pool_size"))
+        # Only GETs are idempotent here, so only GETs are retried
+        retry = Retry(total=int(upstream_setting(name, "retries")),
+                      backoff_factor=float(upstream_setting(name, "retry_backoff")),
+                      status_forcelist=RETRY_STATUSES,
+                      allowed_methods=frozenset(["GET"]),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                              max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url(self, endpoint):
+        # Endpoints are appended verbatim, as the helpers in restapis expect
+        return self.base_url + endpoint
+
+    def request(self, method, endpoint, **kwargs):
+        """
+        Sends a request to the upstream through the pooled session
+
+        Args:
+            method (str): HTTP method
+            endpoint (str): Path appended to the base URL
+            **kwargs: Passed on to `requests.Session.request`
+
+        Returns:
+            requests.Response: The upstream response
+
+        Raises:
+            CircuitOpenError: If the circuit for this upstream is open
+            requests.RequestException: On connection errors and timeouts
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                "Circuit open for upstream '{}'".format(self.name))
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            with timed("upstream." + self.name):
+                response = self.session.request(method, self.url(endpoint), **kwargs)
+        except requests.RequestException:
+            self.breaker.record_failure()
+            raise
+        if response.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def get(self, endpoint, params=None, **kwargs):
+        return self.request("GET", endpoint, params=params, **kwargs)
+
+    def post(self, endpoint, **kwargs):
+        return self.request("POST", endpoint, **kwargs)
@@ -0,0 +1,223 @@
+"""
+Request Instrumentation
+-----------------------
+This file records where the time of each request goes: upstream calls
+(timed by the HTTP clients in `http_client.py` and `async_restapis.py`),
+database queries (timed by a wrapper installed on every DB connection) and
+JSON encoding (timed by the JsonResponse class in `views.py`). Timings are
+added to a per-request record held in a context variable; `middleware.py`
+opens the record, reports it and folds it into per-endpoint latency
+histograms.
+
+The record is a mutable object shared by reference, so timings added from
+asyncio tasks or from threads started with `in_context` land in the record of
+the request that started them.
+
+Classes:
+- RequestTimings: Timings recorded for one request
+- Histogram: Bucketed latency histogram with percentile estimates
+
+Functions:
+- start_request: Opens a timing record for the current request
+- finish_request: Closes the record and adds it to the endpoint's histograms
+- current: Returns the open record, or None outside a request
+- record: Adds a duration to the open record
+- timed: Context manager recording the duration of its block
+- in_context: Wraps a function to run in the caller's timing context
+- time_queries: DB execute wrapper recording query count and time
+- install_query_timer: Installs `time_queries` on a new DB connection
+- metrics_snapshot: Returns per-endpoint percentiles of all finished requests
+"""
+
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+# Upper bounds of the histogram buckets, in milliseconds
+BUCKET_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+PERCENTILES = (50, 95, 99)
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """
+    Timings recorded for one request
+
+    `metrics` maps a metric name such as "db" or "upstream.backend" to a
+    [count, total milliseconds] pair.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def add(self, metric, duration_ms):
+        with self._lock:
+            entry = self.metrics.setdefault(metric, [0, 0.0])
+            entry[0] += 1
+            entry[1] += duration_ms
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+class Histogram:
+    """
+    Bucketed latency histogram
+
+    Counts fall into the fixed BUCKET_BOUNDS buckets, so memory stays
+    constant however many requests are recorded. Percentiles are
+    interpolated linearly within the bucket they fall in.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration_ms):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, duration_ms)] += 1
+        self.count += 1
+        self.total += duration_ms
+        self.max = max(self.max, duration_ms)
+
+    def percentile(self, percent):
+        # Return the estimated duration below which `percent`% of samples fall
+        if not self.count:
+            return None
+        rank = self.count * percent / 100
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = BUCKET_BOUNDS[index - 1] if index else 0
+                upper = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+    def summary(self):
+        summary = {"count": self.count,
+                   "mean": round(self.total / self.count, 3) if self.count else None,
+                   "max": round(self.max, 3)}
+        for percent in PERCENTILES:
+            value = self.percentile(percent)
+            summary["p{}".format(percent)] = None if value is None else round(value, 3)
+        return summary
+
+
+# {endpoint: {"total" or metric name: Histogram}}
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def start_request():
+    """
+    Opens a timing record for the current request
+
+    Returns:
+        tuple: (record, token) to pass to `finish_request`
+    """
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def finish_request(timings, token, endpoint):
+    """
+    Closes a timing record and adds it to the endpoint's histograms
+
+    Args:
+        timings (RequestTimings): The record returned by `start_request`
+        token: The context token returned by `start_request`
+        endpoint (str): Name the request is aggregated under
+
+    Returns:
+        float: Total request duration in milliseconds
+    """
+    _current.reset(token)
+    total_ms = timings.elapsed_ms()
+    with _histograms_lock:
+        histograms = _histograms.setdefault(endpoint, {})
+        histograms.setdefault("total", Histogram()).add(total_ms)
+        for metric, (count, duration_ms) in timings.metrics.items():
+            histograms.setdefault(metric, Histogram()).add(duration_ms)
+    return total_ms
+
+
+def current():
+    """
+    Returns the open timing record, or None outside an instrumented request
+    """
+    return _current.get()
+
+
+def record(metric, duration_ms):
+    """
+    Adds a duration to the open timing record, if any
+
+    Args:
+        metric (str): Metric name, e.g. "upstream.backend"
+        duration_ms (float): Duration in milliseconds
+    """
+    timings = _current.get()
+    if timings is not None:
+        timings.add(metric, duration_ms)
+
+
+@contextlib.contextmanager
+def timed(metric):
+    """
+    Context manager recording the duration of its block under `metric`
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(metric, (time.perf_counter() - started) * 1000)
+
+
+def in_context(function):
+    """
+    Wraps a function to run in a copy of the caller's context
+
+    Threads do not inherit context variables, so work handed to a thread
+    pool is wrapped with this to be timed under the submitting request.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(function, *args, **kwargs)
+
+
+def time_queries(execute, sql, params, many, context):
+    """
+    DB execute wrapper recording query count and time under "db"
+    """
+    if _current.get() is None:
+        return execute(sql, params, many, context)
+    with timed("db"):
+        return execute(sql, params, many, context)
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """
+    `connection_created` receiver installing `time_queries` on a connection
+    """
+    if time_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_queries)
+
+
+def metrics_snapshot():
+    """
+    Returns per-endpoint latency percentiles of all finished requests
+
+    Returns:
+        dict: {endpoint: {"total" or metric name:
+               {"count", "mean", "max", "p50", "p95", "p99"}}}, in milliseconds
+    """
+    with _histograms_lock:
+        return {endpoint: {metric: histogram.summary()
+                           for metric, histogram in histograms.items()}
+                for endpoint, histograms in _histograms.items()}
@@ -0,0 +1,219 @@
+"""
+Local Inventory Engine
+----------------------
+This file provides an optional in-process replacement for the car search
+service. It loads `carsInventory/data/car_records.json` into a compact column
+store partitioned by dealer and answers the same filters as the service's
+`/carsearch/:id` route without a network hop.
+
+Each dealer partition keeps:
+- Hash indexes on make, model and year (value -> row ids)
+- Sorted arrays on mileage and price for range queries
+
+Settings (environment variables):
+- inventory_backend: "remote" (car search service, default) or "local" (this engine)
+- inventory_data_path: JSON file to load (default carsInventory/data/car_records.json)
+
+Classes:
+- InventoryEngine: Column store with per-dealer indexes
+
+Functions:
+- get_engine: Returns the shared engine, loading it on first use
+"""
+
+import json
+import os
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Where get_inventory reads cars from: "remote" or "local"
+inventory_backend = os.getenv('inventory_backend', default="remote")
+# Car records loaded by the local engine
+inventory_data_path = os.getenv(
+    'inventory_data_path',
+    default=str(Path(__file__).resolve().parent.parent
+                / "carsInventory" / "data" / "car_records.json"))
+
+# Bucket upper bounds for the mileage and price filters, as in the car search
+# service: a bound selects (previous bound, bound], anything else selects
+# everything over the last bound
+MILEAGE_BUCKETS = (50000, 100000, 150000, 200000)
+PRICE_BUCKETS = (20000, 40000, 60000, 80000)
+
+SORT_FIELDS = ('make', 'model', 'year', 'mileage', 'price')
+MAX_LIMIT = 1000
+
+
+def bucket_range(value, buckets):
+    """
+    Returns the (exclusive low, inclusive high) range a bucket filter selects
+
+    Args:
+        value (str): Filter value from the query string
+        buckets (tuple): Bucket upper bounds in ascending order
+
+    Returns:
+        tuple: (low, high), where high is None for the open-ended bucket
+    """
+    try:
+        bound = int(value)
+    except (TypeError, ValueError):
+        bound = None
+    if bound in buckets:
+        index = buckets.index(bound)
+        return (buckets[index - 1] if index else None), bound
+    return buckets[-1], None
+
+
+class _Partition:
+    # Row ids and indexes for one dealer
+
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.by_make = {}
+        self.by_model = {}
+        self.by_year = {}
+        for row in rows:
+            self.by_make.setdefault(columns['make'][row], []).append(row)
+            self.by_model.setdefault(columns['model'][row], []).append(row)
+            self.by_year.setdefault(columns['year'][row], []).append(row)
+        self.years = sorted(self.by_year)
+        # Parallel (values, rows) arrays sorted by value
+        self.sorted = {}
+        for field in ('mileage', 'price'):
+            ordered = sorted(rows, key=columns[field].__getitem__)
+            self.sorted[field] = (array('q', (columns[field][row] for row in ordered)),
+                                  array('q', ordered))
+
+    def range_rows(self, field, low, high):
+        # Rows with low < value <= high (either bound may be None)
+        values, rows = self.sorted[field]
+        start = bisect_right(values, low) if low is not None else 0
+        end = bisect_right(values, high) if high is not None else len(values)
+        return rows[start:end]
+
+    def year_rows(self, year):
+        # Rows with a model year of `year` or newer
+        start = bisect_right(self.years, year - 1)
+        return [row for value in self.years[start:] for row in self.by_year[value]]
+
+
+class InventoryEngine:
+    """
+    Column store of car records with per-dealer hash and range indexes
+
+    Args:
+        records (list[dict]): Car records as in car_records.json
+    """
+
+    FIELDS = ('make', 'model', 'bodyType', 'year', 'dealer_id', 'mileage', 'price')
+    NUMERIC = ('year', 'dealer_id', 'mileage', 'price')
+
+    def __init__(self, records):
+        self.columns = {field: array('q') if field in self.NUMERIC else []
+                        for field in self.FIELDS}
+        for record in records:
+            for field in self.FIELDS:
+                value = record.get(field)
+                if field in self.NUMERIC:
+                    self.columns[field].append(int(value or 0))
+                else:
+                    # Interned so repeated makes/models share one string
+                    self.columns[field].append(sys.intern(str(value or "")))
+
+        dealer_rows = {}
+        for row, dealer_id in enumerate(self.columns['dealer_id']):
+            dealer_rows.setdefault(dealer_id, []).append(row)
+        self.partitions = {dealer_id: _Partition(rows, self.columns)
+                           for dealer_id, rows in dealer_rows.items()}
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Builds an engine from a JSON file shaped like car_records.json
+        """
+        with open(path, encoding="utf-8") as data_file:
+            return cls(json.load(data_file)['cars'])
+
+    def record(self, row):
+        # Rebuild a car record from its columns
+        return {field: self.columns[field][row] for field in self.FIELDS}
+
+    def search(self, dealer_id, year=None, make=None, model=None, mileage=None,
+               price=None, sort=None, limit=None, offset=None):
+        """
+        Returns a dealer's cars matching every given filter
+
+        Filters have the same meaning as the car search service's query
+        parameters; all values may be passed as strings from the query string.
+
+        Returns:
+            list[dict]: Matching car records
+
+        Raises:
+            ValueError: On a non-numeric year or an unknown sort field
+        """
+        partition = self.partitions.get(int(dealer_id))
+        if partition is None:
+            return []
+
+        candidates = []
+        if make is not None:
+            candidates.append(partition.by_make.get(make, ()))
+        if model is not None:
+            candidates.append(partition.by_model.get(model, ()))
+        if year is not None:
+            candidates.append(partition.year_rows(int(year)))
+        if mileage is not None:
+            candidates.append(partition.range_rows(
+                'mileage', *bucket_range(mileage, MILEAGE_BUCKETS)))
+        if price is not None:
+            candidates.append(partition.range_rows(
+                'price', *bucket_range(price, PRICE_BUCKETS)))
+
+        if candidates:
+            # Intersect starting from the most selective index
+            candidates.sort(key=len)
+            rows = set(candidates[0])
+            for other in candidates[1:]:
+                if not rows:
+                    break
+                rows.intersection_update(other)
+            rows = sorted(rows)
+        else:
+            rows = list(partition.rows)
+
+        if sort:
+            field = sort.lstrip('-')
+            if field not in SORT_FIELDS:
+                raise ValueError("Invalid sort field: use one of " + ", ".join(SORT_FIELDS))
+            column = self.columns[field]
+            rows.sort(key=column.__getitem__, reverse=sort.startswith('-'))
+
+        start = max(int(offset or 0), 0)
+        count = int(limit or 0)
+        end = start + min(count, MAX_LIMIT) if count > 0 else None
+        return [self.record(row) for row in rows[start:end]]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    Returns the shared engine, loading `inventory_data_path` on first use
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = InventoryEngine.from_file(inventory_data_path)
+    return _engine
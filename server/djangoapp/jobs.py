@@ -0,0 +1,256 @@
+"""
+Review Queue
+------------
+This file moves review submission off the request path. `add_review` stores
+the review as a ReviewJob and returns at once; a pool of worker threads then
+scores its sentiment, posts it to the backend, adds it to its dealer's
+review summary and invalidates the cached review listings. Failed posts are
+retried with exponential backoff and dead-lettered after
+`review_max_attempts` tries.
+
+Each job posts with an Idempotency-Key derived from its id, so a retry (or a
+rerun of a job whose process exited after the post) returns the review the
+backend already saved instead of inserting it twice.
+
+Jobs live in the database, so a job whose process exits before it finishes is
+picked up again by the `process_review_jobs` management command.
+
+Settings (environment variables):
+- review_queue: "true" to queue reviews, "false" to post them inline (default "false")
+- review_workers: Worker threads per process (default 2)
+- review_max_attempts: Tries before a job is dead-lettered (default 5)
+- review_retry_backoff: Seconds before the first retry, doubled on each
+  further retry (default 2)
+
+Functions:
+- queue_enabled: Returns True if reviews are queued instead of posted inline
+- record_posted_review: Updates the mirror, summary and caches after a review is posted
+- enqueue_review: Stores a review as a job and schedules it
+- idempotency_key: Returns the key every attempt of a job posts with
+- process_job: Runs one job to completion, retry or dead letter
+- process_due_jobs: Runs every queued job whose next attempt is due
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+from django.utils.timezone import now
+from dotenv import load_dotenv
+from . import mirror, review_summary
+from .models import ReviewJob
+from .response_cache import invalidate_dealer_reviews
+from .restapis import UNKNOWN_SENTIMENT, get_review_sentiments, post_review
+
+# Load environment variables from .env file
+load_dotenv()
+
+review_queue = os.getenv('review_queue', default="false").lower() == "true"
+review_workers = int(os.getenv('review_workers', default="2"))
+review_max_attempts = int(os.getenv('review_max_attempts', default="5"))
+review_retry_backoff = float(os.getenv('review_retry_backoff', default="2"))
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Errors of the local bookkeeping done after the backend stored a review
+BOOKKEEPING_ERRORS = (DatabaseError, ValueError, TypeError)
+
+
+def queue_enabled():
+    """
+    Returns True if reviews are queued instead of posted inline
+    """
+    return review_queue
+
+
+def _get_executor():
+    # The pool is created lazily so forked server workers each get their own
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=review_workers,
+                                           thread_name_prefix="review-job")
+        return _executor
+
+
+def _submit(job_id, delay=0):
+    # Hand the job to a worker now, or after `delay` seconds
+    if delay > 0:
+        timer = threading.Timer(delay, _submit, args=(job_id,))
+        timer.daemon = True
+        timer.start()
+    else:
+        _get_executor().submit(process_job, job_id)
+
+
+def record_posted_review(result, dealer_id):
+    """
+    Updates the local copies after the backend stored a review: the mirror,
+    the dealer's review summary and the cached review listings
+
+    The review is already saved, so these steps are best-effort: a failure
+    is logged and the remaining steps still run. The cached listings are
+    always invalidated.
+
+    Args:
+        result (dict): The saved review returned by `/insert_review`
+        dealer_id: The review's dealer
+    """
+    try:
+        if mirror.dealer_source == "mirror":
+            try:
+                mirror.record_review(result)
+            except BOOKKEEPING_ERRORS:
+                logger.exception("Could not add review %s to the mirror", result.get('id'))
+        try:
+            review_summary.add_review(result)
+        except BOOKKEEPING_ERRORS:
+            logger.exception("Could not add review %s to the summary of dealer %s",
+                             result.get('id'), dealer_id)
+    finally:
+        invalidate_dealer_reviews(dealer_id)
+
+
+def enqueue_review(data, user=None):
+    """
+    Stores a review as a job and schedules it
+
+    The job is handed to a worker once the surrounding transaction commits,
+    so workers never see a job that was rolled back.
+
+    Args:
+        data (dict): Review data as sent to the backend's /insert_review
+        user (User): Optional. The user who submitted the review
+
+    Returns:
+        ReviewJob: The queued job
+    """
+    job = ReviewJob.objects.create(payload=data, user=user)
+    transaction.on_commit(lambda: _submit(job.pk))
+    return job
+
+
+def idempotency_key(job):
+    """
+    Returns the Idempotency-Key every attempt of `job` posts with
+    """
+    return "review-job-{}".format(job.pk)
+
+
+def _claim(job_id):
+    # Atomically move a due job to running; return it, or None if another
+    # worker got it first or it is not due yet
+    claimed = (ReviewJob.objects
+               .filter(pk=job_id, state__in=[ReviewJob.QUEUED, ReviewJob.RETRY],
+                       next_attempt_at__lte=now())
+               .update(state=ReviewJob.RUNNING, attempts=F('attempts') + 1,
+                       updated_at=now()))
+    return ReviewJob.objects.get(pk=job_id) if claimed else None
+
+
+def _fail(job, error):
+    # Schedule a retry with exponential backoff, or dead-letter the job
+    job.last_error = str(error)
+    if job.attempts >= review_max_attempts:
+        job.state = ReviewJob.DEAD
+        job.save(update_fields=['state', 'last_error', 'updated_at'])
+        logger.error("Review job %s dead after %d attempts: %s",
+                     job.pk, job.attempts, job.last_error)
+        return
+    delay = review_retry_backoff * 2 ** (job.attempts - 1)
+    job.state = ReviewJob.RETRY
+    job.next_attempt_at = now() + timedelta(seconds=delay)
+    job.save(update_fields=['state', 'last_error', 'next_attempt_at', 'updated_at'])
+    logger.warning("Review job %s failed (attempt %d), retrying in %.0fs: %s",
+                   job.pk, job.attempts, delay, job.last_error)
+    _submit(job.pk, delay)
+
+
+def process_job(job_id):
+    """
+    Runs one job: scores the review, posts it and invalidates the cached
+    review listings of its dealer
+
+    Args:
+        job_id (int): The ReviewJob to run
+
+    Returns:
+        str: The job's state afterwards, or None if it was not due
+    """
+    try:
+        job = _claim(job_id)
+        if job is None:
+            return None
+        try:
+            _run(job)
+        except Exception as err:
+            # Nothing reads the worker's future, so log the traceback here and
+            # schedule a retry instead of leaving the job running forever
+            logger.exception("Review job %s raised", job.pk)
+            _fail(job, err)
+            return job.state
+        if job.state == ReviewJob.DONE:
+            # Outside the retry handling: the review is saved, so a failure
+            # here must never lead to a second post
+            record_posted_review(job.result, job.payload.get('dealership'))
+        return job.state
+    finally:
+        # Worker threads outlive requests, so release their connections here
+        close_old_connections()
+
+
+def _run(job):
+    # Score and post a claimed job's review, then save it as done or
+    # schedule a retry
+    data = dict(job.payload)
+    # The sentiment is only ever set by server-side scoring, never by the
+    # client; score once on submission so reads never need the analyzer
+    data.pop('sentiment', None)
+    sentiment = get_review_sentiments([data.get('review', "")])[0]
+    if sentiment != UNKNOWN_SENTIMENT:
+        data['sentiment'] = sentiment
+    # post_review returns None on network errors and {"error": ...}
+    # when the backend could not save the review
+    result = post_review(data, idempotency_key=idempotency_key(job))
+    if not isinstance(result, dict) or result.get('error'):
+        _fail(job, (result or {}).get('error') or "Backend did not accept the review")
+        return
+
+    # Finish the job as soon as the backend has the review, before any
+    # bookkeeping
+    job.payload = data
+    job.result = result
+    job.state = ReviewJob.DONE
+    job.last_error = ""
+    job.save(update_fields=['payload', 'result', 'state', 'last_error', 'updated_at'])
+
+
+def process_due_jobs(include_running=False):
+    """
+    Runs every queued job whose next attempt is due, in the calling thread
+
+    Args:
+        include_running (bool): Also rerun jobs left running by a process
+            that exited mid-job
+
+    Returns:
+        dict: Number of jobs that ended in each state
+    """
+    if include_running:
+        ReviewJob.objects.filter(state=ReviewJob.RUNNING).update(state=ReviewJob.RETRY)
+    due = (ReviewJob.objects
+           .filter(state__in=[ReviewJob.QUEUED, ReviewJob.RETRY], next_attempt_at__lte=now())
+           .order_by('next_attempt_at')
+           .values_list('pk', flat=True))
+    counts = {}
+    for job_id in list(due):
+        state = process_job(job_id)
+        if state is not None:
+            counts[state] = counts.get(state, 0) + 1
+    return counts
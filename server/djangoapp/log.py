@@ -0,0 +1,129 @@
+"""
+Logging
+-------
+This file provides the logging pieces wired up by `LOGGING` in settings.py,
+chosen so that logging costs as little as possible on the request path:
+- Messages use lazy %-style arguments, so nothing is formatted for records
+  below the configured level
+- QueueingStreamHandler only puts records on an in-memory queue; a
+  background listener thread formats and writes them
+- SamplingFilter lets through a fraction of high-volume debug and info
+  records, while warnings and errors are always kept
+
+Classes:
+- SamplingFilter: Keeps a fixed fraction of the records below a level
+- JsonFormatter: Formats records as one JSON object per line
+- QueueingStreamHandler: Hands records to a background thread that writes them
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueListener
+
+# LogRecord attributes that are not `extra` fields
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps a fraction of the records below `level`
+
+    Records are kept evenly: with a rate of 0.4, two of every five.
+
+    Args:
+        rate (float): Fraction of records to keep, above 0 and at most 1
+            (default 1: all)
+        level (str): Records at this level or above are always kept
+            (default "WARNING")
+
+    Raises:
+        ValueError: If `rate` is not in (0, 1], so a typo such as a
+            percentage fails at startup instead of dropping every record
+    """
+
+    def __init__(self, rate=1.0, level="WARNING"):
+        super().__init__()
+        if not 0 < rate <= 1:
+            raise ValueError("Sample rate must be above 0 and at most 1, got {!r}".format(rate))
+        self.rate = rate
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+        # itertools.count is atomic under the GIL, so no lock is needed
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        if record.levelno >= self.level or self.rate == 1:
+            return True
+        # Keep the record whenever the running total of kept records,
+        # count * rate, reaches the next whole number
+        count = next(self._counter)
+        return int((count + 1) * self.rate) > int(count * self.rate)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line, with any `extra` fields
+    """
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items()
+                     if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class QueueingStreamHandler(logging.Handler):
+    """
+    Puts records on an unbounded in-memory queue; a listener thread formats
+    them and writes them to `stream`, so request threads never block on I/O
+
+    Records are formatted on the listener thread, so arguments should not be
+    mutated after they are logged.
+
+    This is a plain Handler holding its own queue and QueueListener rather
+    than a QueueHandler subclass: dictConfig treats QueueHandler subclasses
+    specially from Python 3.12 on and would not build this one.
+
+    Args:
+        stream: Optional. Stream to write to (default sys.stderr)
+        level: Optional. Handler level (default NOTSET)
+    """
+
+    def __init__(self, stream=None, level=logging.NOTSET):
+        super().__init__(level)
+        self.queue = queue.SimpleQueue()
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+        # Flush queued records on exit
+        atexit.register(self._stop_listener)
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def emit(self, record):
+        # The queue stays in process, so the record is passed on unformatted
+        try:
+            self.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+    def _stop_listener(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self._stop_listener()
+        super().close()
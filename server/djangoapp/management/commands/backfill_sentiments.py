@@ -0,0 +1,63 @@
+"""
+backfill_sentiments Command
+---------------------------
+Scores existing reviews that have no stored sentiment and saves the labels on
+the backend server, so dealer review reads no longer call the analyzer.
+
+Usage:
+    python manage.py backfill_sentiments [--batch-size N] [--dry-run]
+
+Reviews are fetched once from `/fetchReviews`, scored in batches through the
+sentiment analyzer's batch endpoint, and written back with one
+`/update_sentiments` call per batch. Reviews the analyzer could not score are
+left without a sentiment so a later run retries them. The review summaries of
+dealers whose reviews got a label are dropped, so they are rebuilt from the
+stored sentiments on their next read.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from djangoapp import review_summary
+from djangoapp.restapis import (UNKNOWN_SENTIMENT, get_request, get_review_sentiments,
+                                update_review_sentiments)
+from djangoapp.views import unscored_reviews
+
+
+class Command(BaseCommand):
+    help = "Scores reviews without a stored sentiment and saves the labels on the backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help="Reviews scored and saved per request (default: %(default)s)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Score reviews but do not save the labels")
+
+    def handle(self, *args, **options):
+        reviews = get_request("/fetchReviews")
+        if not isinstance(reviews, list):
+            raise CommandError("Could not fetch reviews from the backend")
+
+        pending = unscored_reviews(reviews)
+        batch_size = max(options['batch_size'], 1)
+        saved = skipped = 0
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            sentiments = get_review_sentiments(
+                [review_detail['review'] for review_detail in batch])
+            labelled = [(review_detail, sentiment)
+                        for review_detail, sentiment in zip(batch, sentiments)
+                        if sentiment != UNKNOWN_SENTIMENT]
+            updates = [{"id": review_detail['id'], "sentiment": sentiment}
+                       for review_detail, sentiment in labelled]
+            skipped += len(batch) - len(updates)
+            if updates and not options['dry_run']:
+                if update_review_sentiments(updates) is None:
+                    raise CommandError("Could not save sentiments after {} reviews".format(saved))
+                # Their summaries counted these reviews as unscored
+                review_summary.invalidate({review_detail['dealership']
+                                           for review_detail, _ in labelled})
+            saved += len(updates)
+
+        self.stdout.write(self.style.SUCCESS(
+            "{} of {} reviews needed a sentiment: {} {}, {} could not be scored.".format(
+                len(pending), len(reviews), saved,
+                "scored" if options['dry_run'] else "saved", skipped)))
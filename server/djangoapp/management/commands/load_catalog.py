@@ -0,0 +1,40 @@
+"""
+load_catalog Command
+--------------------
+Loads car makes and models from a catalog file into the database.
+
+Usage:
+    python manage.py load_catalog [path]
+
+`path` is a JSON or CSV catalog (see `djangoapp/populate.py`) and defaults to
+`djangoapp/data/catalog.json`. The load is idempotent and safe to run
+concurrently.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from djangoapp.populate import DEFAULT_CATALOG, load_catalog, read_catalog
+
+
+class Command(BaseCommand):
+    help = "Upserts car makes and models from a JSON or CSV catalog file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(DEFAULT_CATALOG),
+                            help="Catalog file (default: %(default)s)")
+
+    def handle(self, *args, **options):
+        try:
+            makes = read_catalog(options['path'])
+        except (OSError, ValueError, KeyError) as err:
+            raise CommandError("Could not read catalog {}: {}".format(
+                options['path'], err))
+        try:
+            counts = load_catalog(makes)
+        except ValueError as err:
+            raise CommandError("Could not load catalog {}: {}".format(
+                options['path'], err))
+        if options['verbosity'] == 0:
+            return
+        self.stdout.write(self.style.SUCCESS(
+            "Makes: {makes_created} created, {makes_updated} updated. "
+            "Models: {models_created} created, {models_updated} updated.".format(**counts)))
@@ -0,0 +1,40 @@
+"""
+process_review_jobs Command
+---------------------------
+Runs queued review submissions that are due, in this process.
+
+Usage:
+    python manage.py process_review_jobs [--recover] [--requeue-dead]
+
+Server processes run their own jobs (see `djangoapp/jobs.py`); this command
+picks up jobs left behind when a process exits, e.g. from a cron job after a
+deploy. `--recover` also reruns jobs left running by a process that exited
+mid-job, so only use it when no server process is running jobs.
+`--requeue-dead` gives dead-lettered jobs a fresh set of attempts.
+"""
+
+from django.core.management.base import BaseCommand
+from djangoapp.jobs import process_due_jobs
+from djangoapp.models import ReviewJob
+
+
+class Command(BaseCommand):
+    help = "Runs queued review submissions that are due"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recover', action='store_true',
+                            help="Also rerun jobs left running by an exited process")
+        parser.add_argument('--requeue-dead', action='store_true',
+                            help="Retry dead-lettered jobs with a fresh set of attempts")
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            requeued = (ReviewJob.objects.filter(state=ReviewJob.DEAD)
+                        .update(state=ReviewJob.QUEUED, attempts=0))
+            self.stdout.write("Requeued {} dead jobs.".format(requeued))
+
+        counts = process_due_jobs(include_running=options['recover'])
+        self.stdout.write(self.style.SUCCESS(
+            "Processed {} jobs: {} done, {} to retry, {} dead.".format(
+                sum(counts.values()), counts.get(ReviewJob.DONE, 0),
+                counts.get(ReviewJob.RETRY, 0), counts.get(ReviewJob.DEAD, 0))))
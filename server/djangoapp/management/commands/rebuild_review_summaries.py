@@ -0,0 +1,37 @@
+"""
+rebuild_review_summaries Command
+--------------------------------
+Recomputes every dealer's review summary (see `djangoapp/review_summary.py`)
+from the full list of reviews.
+
+Usage:
+    python manage.py rebuild_review_summaries
+
+Summaries are built when first read and kept up to date as reviews are
+posted through the app; run this after reviews are added to the backend
+directly. Reviews are read from the local mirror while it is fresh, else from
+the backend's `/fetchReviews`, and those without a stored sentiment are
+scored before they are counted.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from djangoapp import mirror, review_summary
+from djangoapp.models import Review
+from djangoapp.restapis import get_request
+
+
+class Command(BaseCommand):
+    help = "Recomputes every dealer's review summary from all reviews"
+
+    def handle(self, *args, **options):
+        from_mirror = mirror.serving()
+        if from_mirror:
+            reviews = list(Review.objects.values(*mirror.REVIEW_FIELDS))
+        else:
+            reviews = get_request("/fetchReviews")
+        if not isinstance(reviews, list):
+            raise CommandError("Could not fetch reviews from the backend")
+
+        dealers = review_summary.rebuild(reviews, from_mirror)
+        self.stdout.write(self.style.SUCCESS(
+            "Summarized {} reviews for {} dealers.".format(len(reviews), dealers)))
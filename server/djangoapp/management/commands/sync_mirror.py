@@ -0,0 +1,54 @@
+"""
+sync_mirror Command
+-------------------
+Syncs the local copy of the backend's dealerships and reviews (see
+`djangoapp/mirror.py`).
+
+Usage:
+    python manage.py sync_mirror [--from-files [DIR]] [--full] [--interval SECONDS]
+
+By default the backend is polled and only reviews newer than the last synced
+one are fetched. `--from-files` loads the seed files in database/data (or
+DIR) instead. `--full` refetches every review to pick up sentiments stored
+since. `--interval` keeps syncing every SECONDS, which keeps the mirror within
+`mirror_max_staleness` so views can serve from it.
+"""
+
+import time
+from django.core.management.base import BaseCommand, CommandError
+from djangoapp import mirror
+
+
+class Command(BaseCommand):
+    help = "Syncs the local dealership and review mirror from the backend or its seed files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-files', nargs='?', const=mirror.mirror_data_dir,
+                            default=None, metavar='DIR',
+                            help="Load dealerships.json and reviews.json from DIR "
+                                 "(default: %(const)s)")
+        parser.add_argument('--full', action='store_true',
+                            help="Refetch all reviews, not just new ones")
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep syncing every INTERVAL seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                if options['from_files']:
+                    counts = mirror.sync_from_files(options['from_files'])
+                else:
+                    counts = mirror.sync_from_backend(full=options['full'])
+            except (OSError, ValueError, KeyError) as err:
+                if not options['interval']:
+                    raise CommandError("Sync failed: {}".format(err))
+                self.stderr.write("Sync failed: {}".format(err))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    "Dealerships: {created} created, {updated} updated. ".format(
+                        **counts[mirror.DEALERSHIPS]) +
+                    "Reviews: {created} created, {updated} updated, "
+                    "high-water mark {high_water_mark}.".format(**counts[mirror.REVIEWS])))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
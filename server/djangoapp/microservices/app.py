@@ -7,21 +7,75 @@ to classify text as positive, negative, or neutral.
 Endpoints:
  - GET / -> Welcome message
  - GET /analyze/<text> -> Analyze sentiment of input text
+ - POST /analyze/batch -> Analyze sentiment of a JSON list of texts
 
 Example:
     GET /analyze/I love this car
     Response: {"sentiment": "positive"}
+
+    POST /analyze/batch  ["I love this car", "Terrible service"]
+    Response: {"sentiments": ["positive", "negative"]}
+
+Running:
+    Development: python app.py (debug mode only if sentiment_debug=true)
+    Production:  gunicorn -c gunicorn.conf.py app:app
+                 (preloads the VADER lexicon once, then forks
+                 `sentiment_workers` worker processes, see gunicorn.conf.py)
+
+Settings (environment variables):
+ - batch scoring settings: see scoring.py
+ - json_serializer: JSON library, see serializers.py (orjson when installed)
+ - sentiment_log_level: Logging level (default WARNING); DEBUG logs every score.
+   Records are written by a background thread (see configure_logging)
+ - sentiment_debug: Run the development server in debug mode (default false)
 """
 
-from flask import Flask
-from nltk.sentiment import SentimentIntensityAnalyzer
-import json
+from flask import Flask, Response, request
+from scoring import get_analyzer, label_for, score_batch, score_text
+from serializers import dumps, loads
+import atexit
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+
+_log_handler = None
+
+
+def configure_logging():
+    """
+    Sends log records through a queue to a background writer thread, so
+    request handlers never block on stderr. Per-text scores are only logged
+    at DEBUG level, and are not formatted at all below it.
+
+    Threads do not survive fork, so gunicorn.conf.py calls this again in each
+    worker to replace the handler and start a writer there.
+    """
+    global _log_handler
+    root = logging.getLogger()
+    if _log_handler is not None:
+        root.removeHandler(_log_handler)
+    records = queue.SimpleQueue()
+    writer = logging.StreamHandler()
+    writer.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = QueueListener(records, writer)
+    listener.start()
+    atexit.register(listener.stop)
+    root.setLevel(os.getenv('sentiment_log_level', default='WARNING').upper())
+    _log_handler = QueueHandler(records)
+    root.addHandler(_log_handler)
+
+
+configure_logging()
+logger = logging.getLogger("sentiment_analyzer")
 
 # Initialize Flask app
 app = Flask("Sentiment Analyzer")
 
-# Initialize Sentiment Analyzer (VADER from NLTK)
-sia = SentimentIntensityAnalyzer()
+# Initialize Sentiment Analyzer (VADER from NLTK). Built at import time so a
+# preloading server loads the lexicon once and shares it with its workers
+sia = get_analyzer()
 
 
 @app.get('/')
@@ -34,6 +88,31 @@ def home():
     Use /analyze/text to get the sentiment"
 
 
+def json_response(value, status=200):
+    """
+    Returns `value` encoded with serializers.dumps as an application/json response
+    """
+    return Response(dumps(value), status=status, mimetype='application/json')
+
+
+def classify_sentiment(input_txt):
+    """
+    Classify a single text as positive, negative, or neutral using VADER.
+
+    Args:
+        input_txt (str): The input text to analyze
+
+    Returns:
+        str: "positive", "negative" or "neutral"
+    """
+    # Get polarity scores from NLTK
+    scores = score_text(input_txt)
+    logger.debug("Scores %s", scores)
+
+    # Determine dominant sentiment
+    return label_for(scores)
+
+
 @app.get('/analyze/<input_txt>')
 def analyze_sentiment(input_txt):
     """
@@ -48,29 +127,45 @@ def analyze_sentiment(input_txt):
               {"sentiment": "negative"}
               {"sentiment": "neutral"}
     """
-    # Get polarity scores from NLTK
-    scores = sia.polarity_scores(input_txt)
-    print(scores)
+    res = {"sentiment": classify_sentiment(input_txt)}
+    logger.debug("%s", res)
+    return json_response(res)
 
-    # Extract sentiment scores
-    pos = float(scores['pos'])
-    neg = float(scores['neg'])
-    neu = float(scores['neu'])
 
-    # Determine dominant sentiment
-    res = "positive"
-    print("pos neg nue ", pos, neg, neu)
-    if (neg > pos and neg > neu):
-        res = "negative"
-    elif (neu > neg and neu > pos):
-        res = "neutral"
+@app.post('/analyze/batch')
+def analyze_sentiment_batch():
+    """
+    Analyze sentiment of several texts in a single request.
+
+    Request Body (JSON):
+        A list of strings, or {"texts": [<str>, ...]}
 
-    # Format result as JSON string
-    res = json.dumps({"sentiment": res})
-    print(res)
-    return res
+    Query Parameters (optional):
+        - scores: If "true", also return the pos/neg/neu/compound score arrays
+
+    Returns:
+        JSON: {"sentiments": [<label>, ...]} in the same order as the input,
+              plus {"scores": {"pos": [...], "neg": [...], "neu": [...], "compound": [...]}}
+              if requested, or {"error": <message>} with status 400 on a malformed body
+    """
+    try:
+        data = loads(request.get_data())
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        data = data.get('texts')
+    if not isinstance(data, list) or \
+            not all(isinstance(text, str) for text in data):
+        return json_response({"error": "Expected a JSON list of texts"}, 400)
+
+    # Score the whole batch at once, in parallel chunks for large batches
+    result = score_batch(data)
+    res = {"sentiments": result.pop('labels')}
+    if request.args.get('scores', 'false').lower() == 'true':
+        res["scores"] = result
+    return json_response(res)
 
 
 if __name__ == "__main__":
-    # Run Flask app in debug mode
-    app.run(debug=True)
\ No newline at end of file
+    # Run the Flask development server; use gunicorn.conf.py in production
+    app.run(debug=os.getenv('sentiment_debug', default='false').lower() == 'true')
\ No newline at end of file
@@ -0,0 +1,37 @@
+"""
+Gunicorn Configuration
+----------------------
+Production server settings for the Sentiment Analyzer API.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is preloaded in the master process, so the VADER lexicon is read once
+and shared copy-on-write by every forked worker.
+
+Settings (environment variables):
+ - sentiment_bind: Address to listen on (default 0.0.0.0:5000)
+ - sentiment_workers: Worker processes (default: number of CPU cores)
+ - sentiment_threads: Threads per worker (default 1)
+ - sentiment_log_level: Log level for gunicorn and the app (default warning)
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv('sentiment_bind', default='0.0.0.0:5000')
+
+# Scoring is CPU bound, so throughput scales with one process per core
+workers = int(os.getenv('sentiment_workers', default=str(multiprocessing.cpu_count())))
+threads = int(os.getenv('sentiment_threads', default='1'))
+
+# Import app.py (and build the analyzer) once before forking the workers
+preload_app = True
+
+loglevel = os.getenv('sentiment_log_level', default='warning').lower()
+accesslog = None
+
+
+def post_fork(server, worker):
+    # The log writer thread started while preloading does not survive fork
+    import app
+    app.configure_logging()
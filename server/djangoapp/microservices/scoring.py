@@ -0,0 +1,161 @@
+"""
+Batch Scoring Engine
+--------------------
+Scores lists of texts with NLTK's VADER SentimentIntensityAnalyzer.
+
+Large batches are split into chunks and spread across a ProcessPoolExecutor,
+so scoring is not limited to one core by the GIL. Scores are memoized per
+process on whitespace-normalized text, so repeated reviews are scored once.
+
+Settings (environment variables):
+ - sentiment_pool_workers: Processes used for large batches (default 0: score in-process)
+ - sentiment_chunk_size: Texts per chunk sent to a process (default 256)
+ - sentiment_memoize_size: Normalized texts memoized per process (default 10000, 0 disables)
+
+Functions:
+ - get_analyzer: Returns this process's SentimentIntensityAnalyzer
+ - label_for: Classifies VADER scores as positive, negative, or neutral
+ - score_text: Returns the VADER scores of one text
+ - score_batch: Scores a list of texts, returning score arrays and labels
+
+Usage (rescore a corpus such as database/data/reviews.json):
+    python scoring.py reviews.json [--workers N] [--output labels.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from nltk.sentiment import SentimentIntensityAnalyzer
+
+pool_workers = int(os.getenv('sentiment_pool_workers', default='0'))
+chunk_size = int(os.getenv('sentiment_chunk_size', default='256'))
+memoize_size = int(os.getenv('sentiment_memoize_size', default='10000'))
+
+SCORE_KEYS = ('pos', 'neg', 'neu', 'compound')
+
+_analyzer = None
+_pool = None
+
+
+def get_analyzer():
+    """
+    Returns this process's SentimentIntensityAnalyzer, building it on first use
+    """
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
+
+
+def label_for(scores):
+    """
+    Classifies VADER scores by their dominant component
+
+    Args:
+        scores (dict): VADER scores with 'pos', 'neg' and 'neu'
+
+    Returns:
+        str: "positive", "negative" or "neutral"
+    """
+    pos = float(scores['pos'])
+    neg = float(scores['neg'])
+    neu = float(scores['neu'])
+    if (neg > pos and neg > neu):
+        return "negative"
+    elif (neu > neg and neu > pos):
+        return "neutral"
+    return "positive"
+
+
+def _score(text):
+    scores = get_analyzer().polarity_scores(text)
+    return tuple(scores[key] for key in SCORE_KEYS)
+
+
+# VADER is case and punctuation sensitive, so only whitespace is normalized
+_score_memoized = lru_cache(maxsize=memoize_size)(_score) if memoize_size > 0 else _score
+
+
+def score_text(text, memoize=True):
+    """
+    Returns the VADER scores of one text
+
+    Returns:
+        dict: {"pos", "neg", "neu", "compound"}
+    """
+    normalized = " ".join(text.split())
+    values = _score_memoized(normalized) if memoize else _score(normalized)
+    return dict(zip(SCORE_KEYS, values))
+
+
+def _score_chunk(texts, memoize=True):
+    # Runs in a pool process: returns one score tuple per text
+    return [tuple(score_text(text, memoize).values()) for text in texts]
+
+
+def _get_pool(workers):
+    # The pool is created lazily so forked server workers each get their own
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=workers, initializer=get_analyzer)
+    return _pool
+
+
+def score_batch(texts, workers=None, chunk=None, memoize=True):
+    """
+    Scores a list of texts
+
+    Batches larger than one chunk are scored in parallel when `workers`
+    (default `sentiment_pool_workers`) is above zero.
+
+    Args:
+        texts (list[str]): Texts to score
+        workers (int): Optional. Processes to spread chunks across
+        chunk (int): Optional. Texts per chunk
+        memoize (bool): Reuse scores of previously seen texts
+
+    Returns:
+        dict: {"pos": [...], "neg": [...], "neu": [...], "compound": [...],
+               "labels": [...]}, each in the same order as `texts`
+    """
+    workers = pool_workers if workers is None else workers
+    chunk = chunk or chunk_size
+    if workers > 0 and len(texts) > chunk:
+        chunks = [texts[start:start + chunk] for start in range(0, len(texts), chunk)]
+        pool = _get_pool(workers)
+        rows = [row for result in pool.map(_score_chunk, chunks, [memoize] * len(chunks))
+                for row in result]
+    else:
+        rows = _score_chunk(texts, memoize)
+
+    columns = {key: [row[index] for row in rows] for index, key in enumerate(SCORE_KEYS)}
+    columns['labels'] = [label_for(dict(zip(SCORE_KEYS, row))) for row in rows]
+    return columns
+
+
+def main(argv=None):
+    # Rescore a {"reviews": [{"id", "review", ...}]} corpus and print labels by id
+    parser = argparse.ArgumentParser(description="Score every review in a reviews.json corpus")
+    parser.add_argument('path', help="JSON file with a 'reviews' list")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Processes to score with (default: CPU count)")
+    parser.add_argument('--output', help="Write {id: label} JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with open(args.path, encoding="utf-8") as corpus:
+        reviews = json.load(corpus)['reviews']
+    result = score_batch([review['review'] for review in reviews], workers=args.workers)
+    labels = {str(review['id']): label for review, label in zip(reviews, result['labels'])}
+
+    if args.output:
+        with open(args.output, 'w', encoding="utf-8") as output:
+            json.dump(labels, output)
+    else:
+        json.dump(labels, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
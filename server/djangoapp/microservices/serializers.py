@@ -0,0 +1,38 @@
+"""
+JSON Serializers
+----------------
+Encodes and decodes the analyzer's request and response bodies with orjson
+when it is installed, and with the stdlib `json` module otherwise. Both
+produce the same documents.
+
+Settings (environment variables):
+ - json_serializer: "auto" (orjson if installed, default), "orjson" or "stdlib"
+
+Functions:
+ - dumps: Encodes a value as JSON bytes
+ - loads: Decodes JSON from bytes or str, raising ValueError on malformed input
+"""
+
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+json_serializer = os.getenv('json_serializer', default='auto')
+if json_serializer == 'orjson' and orjson is None:
+    raise ImportError("json_serializer is 'orjson' but orjson is not installed")
+
+# The serializer in use: "orjson" or "stdlib"
+BACKEND = 'orjson' if orjson is not None and json_serializer != 'stdlib' else 'stdlib'
+
+if BACKEND == 'orjson':
+    dumps = orjson.dumps
+    loads = orjson.loads
+else:
+    def dumps(value):
+        return json.dumps(value).encode('utf-8')
+
+    loads = json.loads
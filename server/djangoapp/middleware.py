@@ -0,0 +1,96 @@
+"""
+Middleware
+----------
+This file defines the request timing middleware. Each request gets a timing
+record (see `instrumentation.py`) that the HTTP clients, the DB connection
+and JsonResponse add to. When the response is ready the timings are:
+- sent to the client as a `Server-Timing` header
+- logged on the "djangoapp.timing" logger at INFO, with the timings as
+  extra fields (one JSON object per request with log_format=json)
+- added to the per-endpoint histograms served by the `metrics` view
+
+Settings (environment variables):
+- server_timing_header: "false" to leave out the Server-Timing header (default "true")
+
+Classes:
+- ServerTimingMiddleware: Times each request and reports where its time went
+"""
+
+import logging
+import os
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from dotenv import load_dotenv
+from . import instrumentation
+
+# Load environment variables from .env file
+load_dotenv()
+
+server_timing_header = os.getenv('server_timing_header', default="true").lower() == "true"
+
+logger = logging.getLogger("djangoapp.timing")
+
+
+def _endpoint(request):
+    # Aggregate by URL pattern so dealer ids do not each get a histogram
+    match = getattr(request, "resolver_match", None)
+    return match.route if match is not None else "unmatched"
+
+
+def _server_timing(timings, total_ms):
+    # Format the record as Server-Timing metrics, e.g. db;dur=1.2;desc="3 calls"
+    entries = ['{};dur={:.1f};desc="{} calls"'.format(metric, duration_ms, count)
+               for metric, (count, duration_ms) in sorted(timings.metrics.items())]
+    entries.append("total;dur={:.1f}".format(total_ms))
+    return ", ".join(entries)
+
+
+class ServerTimingMiddleware:
+    """
+    Times each request and reports where its time went
+
+    Works under WSGI and ASGI: async views are awaited without leaving the
+    event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, token = instrumentation.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            total_ms = instrumentation.finish_request(timings, token, _endpoint(request))
+        self._report(request, response, timings, total_ms)
+        return response
+
+    async def __acall__(self, request):
+        timings, token = instrumentation.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            total_ms = instrumentation.finish_request(timings, token, _endpoint(request))
+        self._report(request, response, timings, total_ms)
+        return response
+
+    def _report(self, request, response, timings, total_ms):
+        if server_timing_header:
+            response["Server-Timing"] = _server_timing(timings, total_ms)
+        if logger.isEnabledFor(logging.INFO):
+            # Passed as extra fields so the JSON log format keeps the structure
+            logger.info("%s %s %s %.1fms", request.method, request.path,
+                        response.status_code, total_ms, extra={
+                            "endpoint": _endpoint(request),
+                            "status": response.status_code,
+                            "total_ms": round(total_ms, 3),
+                            "metrics": {metric: {"count": count, "ms": round(duration_ms, 3)}
+                                        for metric, (count, duration_ms)
+                                        in timings.metrics.items()},
+                        })
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoapp', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DealerReviewSummary',
+            fields=[
+                ('dealer_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('positive', models.PositiveIntegerField(default=0)),
+                ('negative', models.PositiveIntegerField(default=0)),
+                ('neutral', models.PositiveIntegerField(default=0)),
+                ('unscored', models.PositiveIntegerField(default=0)),
+                ('purchase_year_total', models.BigIntegerField(default=0)),
+                ('purchase_year_count', models.PositiveIntegerField(default=0)),
+                ('car_makes', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Dealership',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('state', models.CharField(blank=True, max_length=100)),
+                ('st', models.CharField(blank=True, max_length=10)),
+                ('address', models.CharField(blank=True, max_length=200)),
+                ('zip', models.CharField(blank=True, max_length=20)),
+                ('lat', models.FloatField(null=True)),
+                ('long', models.FloatField(null=True)),
+                ('short_name', models.CharField(blank=True, max_length=100)),
+                ('full_name', models.CharField(blank=True, max_length=200)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Review',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('dealership', models.IntegerField()),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('review', models.TextField(blank=True)),
+                ('purchase', models.BooleanField(default=False)),
+                ('purchase_date', models.CharField(blank=True, max_length=30)),
+                ('car_make', models.CharField(blank=True, max_length=100)),
+                ('car_model', models.CharField(blank=True, max_length=100)),
+                ('car_year', models.IntegerField(null=True)),
+                ('sentiment', models.CharField(blank=True, max_length=20)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReviewJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('retry', 'Waiting to retry'), ('done', 'Done'), ('dead', 'Failed')], default='queued', max_length=10)),
+                ('payload', models.JSONField()),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30, unique=True)),
+                ('high_water_mark', models.BigIntegerField(default=0)),
+                ('synced_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='carmake',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='carmodel',
+            index=models.Index(fields=['car_make', 'type', 'year'], name='carmodel_make_type_year'),
+        ),
+        migrations.AddIndex(
+            model_name='carmodel',
+            index=models.Index(fields=['name'], name='carmodel_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='carmodel',
+            constraint=models.UniqueConstraint(fields=('car_make', 'name', 'year'), name='unique_car_model'),
+        ),
+        migrations.AddIndex(
+            model_name='dealership',
+            index=models.Index(fields=['state'], name='dealership_state'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['dealership', 'id'], name='review_dealership_id'),
+        ),
+        migrations.AddField(
+            model_name='reviewjob',
+            name='user',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='reviewjob',
+            index=models.Index(fields=['state', 'next_attempt_at'], name='reviewjob_state_due'),
+        ),
+    ]
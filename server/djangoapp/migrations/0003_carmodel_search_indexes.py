@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoapp', '0002_catalog_constraints_queue_and_mirror'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='carmodel',
+            name='carmodel_make_type_year',
+        ),
+        migrations.AddIndex(
+            model_name='carmodel',
+            index=models.Index(fields=['car_make', 'type', 'id'], name='carmodel_make_type_id'),
+        ),
+        migrations.AddIndex(
+            model_name='carmodel',
+            index=models.Index(fields=['car_make', 'id'], name='carmodel_make_id'),
+        ),
+        migrations.AddIndex(
+            model_name='carmodel',
+            index=models.Index(fields=['type', 'id'], name='carmodel_type_id'),
+        ),
+        migrations.AddIndex(
+            model_name='carmodel',
+            index=models.Index(fields=['year', 'id'], name='carmodel_year_id'),
+        ),
+    ]
@@ -0,0 +1,275 @@
+"""
+Dealer Mirror
+-------------
+This file keeps an optional local copy of the backend's dealerships and
+reviews in the Django database (the Dealership and Review models), so the
+dealer and review views can be answered without a backend request.
+
+The mirror is filled by the `sync_mirror` management command, either from
+the backend's seed files (database/data/dealerships.json and reviews.json)
+or by polling `/fetchDealers` and `/fetchReviews`. Review syncs are
+incremental: SyncState keeps the highest review id synced so far, and only
+newer reviews are requested and inserted.
+
+Views read from the mirror only while `dealer_source` is "mirror" and both
+collections were synced within `mirror_max_staleness` seconds; otherwise they
+call the backend as before.
+
+Settings (environment variables):
+- dealer_source: "backend" (default) or "mirror"
+- mirror_max_staleness: Seconds a sync stays fresh enough to serve (default 300)
+- mirror_data_dir: Directory of the seed files (default database/data)
+
+Functions:
+- serving: Returns True if views should read from the mirror now
+- dealerships: Returns mirrored dealerships, all or in one state
+- dealer: Returns a mirrored dealer as a one-item list
+- dealers_by_ids: Returns the mirrored dealers with the given ids
+- dealer_reviews: Returns a page of a dealer's mirrored reviews
+- reviews_by_dealers: Returns the mirrored reviews of several dealers
+- save_sentiments: Stores scored sentiments on mirrored reviews
+- record_review: Adds a review just posted to the backend
+- sync_dealerships: Upserts a list of dealerships
+- sync_reviews: Inserts reviews above the high-water mark and updates sentiments
+- sync_from_files: Syncs both collections from the seed files
+- sync_from_backend: Syncs both collections from the backend
+"""
+
+import json
+import os
+from datetime import timedelta
+from pathlib import Path
+from django.db import transaction
+from django.utils.timezone import now
+from dotenv import load_dotenv
+from .models import Dealership, Review, SyncState
+from .response_cache import invalidate_dealer_reviews
+from .restapis import UNKNOWN_SENTIMENT, get_request
+
+# Load environment variables from .env file
+load_dotenv()
+
+dealer_source = os.getenv('dealer_source', default="backend")
+mirror_max_staleness = int(os.getenv('mirror_max_staleness', default="300"))
+mirror_data_dir = os.getenv(
+    'mirror_data_dir',
+    default=str(Path(__file__).resolve().parent.parent / "database" / "data"))
+
+DEALERSHIPS = "dealerships"
+REVIEWS = "reviews"
+
+DEALERSHIP_FIELDS = ('id', 'city', 'state', 'st', 'address', 'zip', 'lat', 'long',
+                     'short_name', 'full_name')
+REVIEW_FIELDS = ('id', 'name', 'dealership', 'review', 'purchase', 'purchase_date',
+                 'car_make', 'car_model', 'car_year', 'sentiment')
+
+
+def serving():
+    """
+    Returns True if `dealer_source` is "mirror" and both collections were
+    synced within `mirror_max_staleness` seconds
+    """
+    if dealer_source != "mirror":
+        return False
+    cutoff = now() - timedelta(seconds=mirror_max_staleness)
+    return SyncState.objects.filter(name__in=[DEALERSHIPS, REVIEWS],
+                                    synced_at__gte=cutoff).count() == 2
+
+
+def dealerships(state="All"):
+    """
+    Returns mirrored dealerships, in the backend's response shape
+
+    Args:
+        state (str): A state name, or "All"
+    """
+    rows = Dealership.objects.order_by('id')
+    if state != "All":
+        rows = rows.filter(state=state)
+    return list(rows.values(*DEALERSHIP_FIELDS))
+
+
+def dealer(dealer_id):
+    """
+    Returns a mirrored dealer as a one-item list, like `/fetchDealer/<id>`
+    (an empty list for an unknown dealer)
+    """
+    return list(Dealership.objects.filter(id=dealer_id).values(*DEALERSHIP_FIELDS))
+
+
+def dealers_by_ids(dealer_ids):
+    """
+    Returns the mirrored dealers with the given ids, like
+    `/fetchDealersByIds?ids=...` (unknown ids are left out)
+    """
+    return list(Dealership.objects.filter(id__in=dealer_ids).values(*DEALERSHIP_FIELDS))
+
+
+def dealer_reviews(dealer_id, offset=0, limit=None):
+    """
+    Returns a page of a dealer's mirrored reviews ordered by id, like
+    `/fetchReviews/dealer/<id>`. Reviews without a sentiment have it set to None.
+    """
+    rows = Review.objects.filter(dealership=dealer_id).order_by('id')
+    rows = rows[offset:offset + limit] if limit else rows[offset:]
+    reviews = list(rows.values(*REVIEW_FIELDS))
+    for review in reviews:
+        review['sentiment'] = review['sentiment'] or None
+    return reviews
+
+
+def reviews_by_dealers(dealer_ids):
+    """
+    Returns the mirrored reviews of several dealers ordered by id, like
+    `/fetchReviewsByDealers?ids=...`. Reviews without a sentiment have it set to None.
+    """
+    reviews = list(Review.objects.filter(dealership__in=dealer_ids).order_by('id')
+                   .values(*REVIEW_FIELDS))
+    for review in reviews:
+        review['sentiment'] = review['sentiment'] or None
+    return reviews
+
+
+def save_sentiments(reviews):
+    """
+    Stores sentiments scored on read, so mirrored reviews are scored once
+
+    Args:
+        reviews (list[dict]): Reviews with "id" and "sentiment"
+    """
+    rows = [Review(id=review['id'], sentiment=review['sentiment'])
+            for review in reviews
+            if review.get('sentiment') not in (None, "", UNKNOWN_SENTIMENT)]
+    Review.objects.bulk_update(rows, ['sentiment'])
+
+
+def _review(data):
+    # Build a Review from a backend or seed file review
+    fields = {field: data.get(field) for field in REVIEW_FIELDS}
+    for field in ('name', 'review', 'purchase_date', 'car_make', 'car_model', 'sentiment'):
+        fields[field] = fields[field] or ""
+    fields['purchase'] = bool(fields['purchase'])
+    return Review(**fields)
+
+
+def record_review(data):
+    """
+    Adds a review just posted to the backend, so it is served before the
+    next sync. The high-water mark is left alone, so the sync still fetches
+    every review posted elsewhere in the meantime.
+
+    Args:
+        data (dict): The saved review returned by `/insert_review`
+    """
+    if isinstance(data, dict) and data.get('id') is not None:
+        Review.objects.bulk_create([_review(data)], ignore_conflicts=True)
+
+
+def _mark_synced(name, high_water_mark=None):
+    defaults = {"synced_at": now()}
+    if high_water_mark is not None:
+        defaults["high_water_mark"] = high_water_mark
+    SyncState.objects.update_or_create(name=name, defaults=defaults)
+
+
+@transaction.atomic
+def sync_dealerships(rows):
+    """
+    Upserts a list of dealerships
+
+    Args:
+        rows (list[dict]): Dealerships from the backend or the seed file
+
+    Returns:
+        dict: Number of dealerships created and updated
+    """
+    wanted = {int(row['id']): Dealership(**{field: row.get(field) for field in DEALERSHIP_FIELDS})
+              for row in rows}
+    existing = set(Dealership.objects.filter(id__in=wanted).values_list('id', flat=True))
+    Dealership.objects.bulk_create([dealership for dealer_id, dealership in wanted.items()
+                                    if dealer_id not in existing], ignore_conflicts=True)
+    Dealership.objects.bulk_update([wanted[dealer_id] for dealer_id in existing],
+                                   [field for field in DEALERSHIP_FIELDS if field != 'id'])
+    _mark_synced(DEALERSHIPS)
+    return {"created": len(wanted) - len(existing), "updated": len(existing)}
+
+
+@transaction.atomic
+def sync_reviews(rows):
+    """
+    Inserts the reviews above the high-water mark and stores sentiments the
+    backend has since added to ones already mirrored
+
+    Args:
+        rows (list[dict]): Reviews from the backend or the seed file
+
+    Returns:
+        dict: Number of reviews created and updated, and the new high-water mark
+    """
+    state, _ = SyncState.objects.get_or_create(name=REVIEWS)
+    mark = state.high_water_mark
+    new = [_review(row) for row in rows if int(row['id']) > mark]
+    Review.objects.bulk_create(new, ignore_conflicts=True)
+
+    # Older reviews only change when their sentiment is stored
+    scored = {int(row['id']): row['sentiment'] for row in rows
+              if int(row['id']) <= mark and row.get('sentiment')}
+    changed = [Review(id=review_id, sentiment=scored[review_id])
+               for review_id, sentiment in Review.objects.filter(id__in=scored)
+               .values_list('id', 'sentiment') if sentiment != scored[review_id]]
+    Review.objects.bulk_update(changed, ['sentiment'])
+
+    mark = max([mark] + [review.id for review in new])
+    _mark_synced(REVIEWS, mark)
+    # Cached listings of dealers with new or rescored reviews are out of date
+    for dealer_id in {review.dealership for review in new} | set(
+            Review.objects.filter(id__in=[review.id for review in changed])
+            .values_list('dealership', flat=True)):
+        transaction.on_commit(lambda dealer_id=dealer_id: invalidate_dealer_reviews(dealer_id))
+    return {"created": len(new), "updated": len(changed), "high_water_mark": mark}
+
+
+def _read(path, key):
+    with open(path, encoding="utf-8") as data_file:
+        return json.load(data_file)[key]
+
+
+def sync_from_files(data_dir=None):
+    """
+    Syncs both collections from dealerships.json and reviews.json
+
+    Returns:
+        dict: {"dealerships": <counts>, "reviews": <counts>}
+    """
+    data_dir = Path(data_dir or mirror_data_dir)
+    return {
+        DEALERSHIPS: sync_dealerships(_read(data_dir / "dealerships.json", "dealerships")),
+        REVIEWS: sync_reviews(_read(data_dir / "reviews.json", "reviews")),
+    }
+
+
+def sync_from_backend(full=False):
+    """
+    Syncs both collections from the backend
+
+    Only reviews above the high-water mark are requested, unless `full` is
+    set, which also picks up sentiments stored on older reviews.
+
+    Returns:
+        dict: {"dealerships": <counts>, "reviews": <counts>}
+
+    Raises:
+        ValueError: If the backend could not be reached
+    """
+    rows = get_request("/fetchDealers")
+    if not isinstance(rows, list):
+        raise ValueError("Could not fetch dealerships from the backend")
+    counts = {DEALERSHIPS: sync_dealerships(rows)}
+
+    state = SyncState.objects.filter(name=REVIEWS).first()
+    after = 0 if full or state is None else state.high_water_mark
+    rows = get_request("/fetchReviews", after=str(after)) if after else get_request("/fetchReviews")
+    if not isinstance(rows, list):
+        raise ValueError("Could not fetch reviews from the backend")
+    counts[REVIEWS] = sync_reviews(rows)
+    return counts
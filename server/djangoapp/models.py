@@ -1,20 +1,28 @@
 """
 Car Models
 ----------
-This file defines Django ORM models for representing car makes and models
+This file defines Django ORM models for representing car makes and models,
+the queue of submitted reviews, the optional local mirror of the backend's
+dealerships and reviews, and per-dealer review summaries
 
 Models:
 - CarMake: Represents a car manufacturer/brand
 - CarModel: Represents a specific car model linked to a CarMake
+- ReviewJob: A submitted review waiting to be scored and posted to the backend
+- Dealership: Local copy of a backend dealership (see mirror.py)
+- Review: Local copy of a backend review (see mirror.py)
+- SyncState: When a mirrored collection was last synced, and its high-water mark
+- DealerReviewSummary: Running sentiment, purchase year and car make totals of a dealer's reviews
 """
 
+from django.conf import settings
 from django.db import models
 from django.utils.timezone import now
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 class CarMake(models.Model):
     # Represents a car manufacturer
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)  # Catalog upserts match makes by name
     description = models.TextField()
     
     def __str__(self):
@@ -40,7 +48,131 @@ class CarModel(models.Model):
             MinValueValidator(2015)  # Restricts to modern models
         ])
 
+    class Meta:
+        constraints = [
+            # Catalog upserts match models by make, name and year
+            models.UniqueConstraint(fields=['car_make', 'name', 'year'],
+                                    name='unique_car_model'),
+        ]
+        indexes = [
+            # Catalog search seeks by id after equality filters on make and/or
+            # type, so each filter shape has an index ending in id; a year
+            # range alone uses (year, id)
+            models.Index(fields=['car_make', 'type', 'id'], name='carmodel_make_type_id'),
+            models.Index(fields=['car_make', 'id'], name='carmodel_make_id'),
+            models.Index(fields=['type', 'id'], name='carmodel_type_id'),
+            models.Index(fields=['year', 'id'], name='carmodel_year_id'),
+            models.Index(fields=['name'], name='carmodel_name'),
+        ]
+
     def __str__(self):
         # Return the name as the string representation
-        return self.name  
-    
\ No newline at end of file
+        return self.name
+
+
+class ReviewJob(models.Model):
+    # A submitted review processed by the review queue (see jobs.py)
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    RETRY = 'retry'
+    DONE = 'done'
+    DEAD = 'dead'  # Dead-lettered after exhausting its attempts
+    STATES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (RETRY, 'Waiting to retry'),
+        (DONE, 'Done'),
+        (DEAD, 'Failed'),
+    ]
+    state = models.CharField(max_length=10, choices=STATES, default=QUEUED)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL)
+    payload = models.JSONField()  # Review data as sent to /insert_review
+    result = models.JSONField(null=True, blank=True)  # Backend response on success
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    next_attempt_at = models.DateTimeField(default=now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Workers look up due jobs by state and next attempt time
+            models.Index(fields=['state', 'next_attempt_at'], name='reviewjob_state_due'),
+        ]
+
+    def __str__(self):
+        return "Review job {} ({})".format(self.pk, self.state)
+
+
+class Dealership(models.Model):
+    # Local copy of a backend dealership; the id is the backend's dealer id
+    id = models.IntegerField(primary_key=True)
+    city = models.CharField(max_length=100, blank=True)
+    state = models.CharField(max_length=100, blank=True)
+    st = models.CharField(max_length=10, blank=True)
+    address = models.CharField(max_length=200, blank=True)
+    zip = models.CharField(max_length=20, blank=True)
+    lat = models.FloatField(null=True)
+    long = models.FloatField(null=True)
+    short_name = models.CharField(max_length=100, blank=True)
+    full_name = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        indexes = [
+            # get_dealerships filters by state
+            models.Index(fields=['state'], name='dealership_state'),
+        ]
+
+    def __str__(self):
+        return self.full_name
+
+
+class Review(models.Model):
+    # Local copy of a backend review; the id is the backend's review id
+    id = models.IntegerField(primary_key=True)
+    dealership = models.IntegerField()  # Backend dealer id, not a foreign key
+    name = models.CharField(max_length=100, blank=True)
+    review = models.TextField(blank=True)
+    purchase = models.BooleanField(default=False)
+    purchase_date = models.CharField(max_length=30, blank=True)
+    car_make = models.CharField(max_length=100, blank=True)
+    car_model = models.CharField(max_length=100, blank=True)
+    car_year = models.IntegerField(null=True)
+    sentiment = models.CharField(max_length=20, blank=True)
+
+    class Meta:
+        indexes = [
+            # get_dealer_reviews pages through a dealer's reviews by id
+            models.Index(fields=['dealership', 'id'], name='review_dealership_id'),
+        ]
+
+    def __str__(self):
+        return "Review {} of dealer {}".format(self.id, self.dealership)
+
+
+class SyncState(models.Model):
+    # Sync progress of one mirrored collection ("dealerships" or "reviews")
+    name = models.CharField(max_length=30, unique=True)
+    high_water_mark = models.BigIntegerField(default=0)  # Highest id synced so far
+    synced_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return "{} synced at {}".format(self.name, self.synced_at)
+
+
+class DealerReviewSummary(models.Model):
+    # Running totals of a dealer's reviews, updated as reviews are added
+    # (see review_summary.py)
+    dealer_id = models.IntegerField(primary_key=True)
+    review_count = models.PositiveIntegerField(default=0)
+    positive = models.PositiveIntegerField(default=0)
+    negative = models.PositiveIntegerField(default=0)
+    neutral = models.PositiveIntegerField(default=0)
+    unscored = models.PositiveIntegerField(default=0)  # No sentiment when added
+    purchase_year_total = models.BigIntegerField(default=0)
+    purchase_year_count = models.PositiveIntegerField(default=0)
+    car_makes = models.JSONField(default=dict)  # Car make -> number of reviews
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "Summary of dealer {} ({} reviews)".format(self.dealer_id, self.review_count)
@@ -1,53 +1,173 @@
 """
 Data Initialization
 -------------------
-This file provides a helper function to populate the database with sample CarMake 
-and CarModel instances 
+This file loads the CarMake and CarModel catalog into the database. The
+catalog is read from a file and upserted in bulk inside one transaction, so
+loading is idempotent and safe to run from several processes at once (the
+unique constraints on the models turn concurrent inserts into no-ops).
+
+Catalog files:
+- JSON catalog: {"makes": [{"name", "description", "models": [{"name", "type", "year"}]}]}
+  (see data/catalog.json, the default)
+- JSON car records: {"cars": [{"make", "model", "bodyType", "year"}]}
+  (e.g. carsInventory/data/car_records.json)
+- CSV: columns make, model, type, year and optionally description
+
+Types are matched to the CarModel.CAR_TYPES choices case-insensitively; the
+other body types of the car records are mapped to the closest choice (see
+TYPE_ALIASES). A catalog with any other type is rejected before anything is
+written, with one error per offending model.
 
 Functions:
-- initiate: Creates predefined CarMake and CarModel records in the database
+- read_catalog: Reads a catalog file into a list of makes
+- load_catalog: Upserts a list of makes and their models
+- initiate: Loads the default catalog
 """
 
+import csv
+import json
+from pathlib import Path
+from django.db import transaction
+from . import catalog_cache
 from .models import CarMake, CarModel
 
-def initiate():
+# Catalog loaded by `initiate` and the load_catalog command by default
+DEFAULT_CATALOG = Path(__file__).resolve().parent / "data" / "catalog.json"
+
+# Body types of carsInventory's car records that are not CarModel.CAR_TYPES
+# choices, mapped to the closest choice
+TYPE_ALIASES = {
+    "COUPE": "SEDAN",
+    "CONVERTIBLE": "SEDAN",
+    "HATCHBACK": "WAGON",
+    "MINIVAN": "WAGON",
+    "PICKUP": "SUV",
+}
+
+
+def _normalize_type(car_type):
+    # Map e.g. "Sedan" to the "SEDAN" choice; None for unknown types
+    upper = str(car_type).upper()
+    if upper in dict(CarModel.CAR_TYPES):
+        return upper
+    return TYPE_ALIASES.get(upper)
+
+
+def _group_rows(rows):
+    # Group flat make/model rows into the catalog shape
+    makes = {}
+    for row in rows:
+        make = makes.setdefault(row['make'], {
+            "name": row['make'],
+            "description": row.get('description') or "",
+            "models": [],
+        })
+        make["models"].append({
+            "name": row['model'],
+            "type": row.get('type') or row.get('bodyType') or "SUV",
+            "year": int(row['year']),
+        })
+    return list(makes.values())
+
+
+def read_catalog(path=DEFAULT_CATALOG):
     """
-    Populates the database with predefined car makes and models.
+    Reads a catalog file into a list of makes
+
+    Args:
+        path (str or Path): JSON or CSV catalog file
+
+    Returns:
+        list[dict]: [{"name", "description", "models": [{"name", "type", "year"}]}]
+    """
+    path = Path(path)
+    with open(path, encoding="utf-8", newline="") as catalog_file:
+        if path.suffix.lower() == ".csv":
+            return _group_rows(csv.DictReader(catalog_file))
+        data = json.load(catalog_file)
+    if "makes" in data:
+        return data["makes"]
+    return _group_rows({"make": car["make"], "model": car["model"],
+                        "bodyType": car.get("bodyType"), "year": car["year"]}
+                       for car in data["cars"])
+
 
-    - Creates a set of CarMake instances (Nissan, Mercedes, Audi, Kia, Toyota)
-    - For each CarMake, creates multiple CarModel instances with specific names, 
-      types (SUV or Sedan), and model years
+@transaction.atomic
+def load_catalog(makes):
     """
+    Upserts a list of makes and their models
 
-    car_make_data = [
-        {"name":"NISSAN", "description":"Great cars. Japanese technology"},
-        {"name":"Mercedes", "description":"Great cars. German technology"},
-        {"name":"Audi", "description":"Great cars. German technology"},
-        {"name":"Kia", "description":"Great cars. Korean technology"},
-        {"name":"Toyota", "description":"Great cars. Japanese technology"},
-    ]
-
-    car_make_instances = []
-    for data in car_make_data:
-            car_make_instances.append(CarMake.objects.create(name=data['name'], description=data['description']))
-
-    car_model_data = [
-      {"name":"Pathfinder", "type":"SUV", "year": 2023, "car_make":car_make_instances[0]},
-      {"name":"Qashqai", "type":"SUV", "year": 2023, "car_make":car_make_instances[0]},
-      {"name":"XTRAIL", "type":"SUV", "year": 2023, "car_make":car_make_instances[0]},
-      {"name":"A-Class", "type":"SUV", "year": 2023, "car_make":car_make_instances[1]},
-      {"name":"C-Class", "type":"SUV", "year": 2023, "car_make":car_make_instances[1]},
-      {"name":"E-Class", "type":"SUV", "year": 2023, "car_make":car_make_instances[1]},
-      {"name":"A4", "type":"SUV", "year": 2023, "car_make":car_make_instances[2]},
-      {"name":"A5", "type":"SUV", "year": 2023, "car_make":car_make_instances[2]},
-      {"name":"A6", "type":"SUV", "year": 2023, "car_make":car_make_instances[2]},
-      {"name":"Sorrento", "type":"SUV", "year": 2023, "car_make":car_make_instances[3]},
-      {"name":"Carnival", "type":"SUV", "year": 2023, "car_make":car_make_instances[3]},
-      {"name":"Cerato", "type":"Sedan", "year": 2023, "car_make":car_make_instances[3]},
-      {"name":"Corolla", "type":"Sedan", "year": 2023, "car_make":car_make_instances[4]},
-      {"name":"Camry", "type":"Sedan", "year": 2023, "car_make":car_make_instances[4]},
-      {"name":"Kluger", "type":"SUV", "year": 2023, "car_make":car_make_instances[4]},
-    ]
-
-    for data in car_model_data:
-            CarModel.objects.create(name=data['name'], car_make=data['car_make'], type=data['type'], year=data['year'])
\ No newline at end of file
+    New makes and models are inserted with `bulk_create`; descriptions and
+    types of existing ones are updated with `bulk_update`. Running it again
+    with the same catalog changes nothing.
+
+    Args:
+        makes (list[dict]): Catalog as returned by `read_catalog`
+
+    Returns:
+        dict: Number of makes and models created and updated
+
+    Raises:
+        ValueError: If a model's type is not a CAR_TYPES choice or alias;
+            nothing is written then
+    """
+    errors = ["{} {} {}: unknown type {!r}".format(make["name"], model["name"],
+                                                   model["year"], model.get("type"))
+              for make in makes for model in make.get("models", [])
+              if _normalize_type(model.get("type", "SUV")) is None]
+    if errors:
+        raise ValueError("; ".join(errors))
+
+    counts = {"makes_created": 0, "makes_updated": 0,
+              "models_created": 0, "models_updated": 0}
+
+    # Makes, keyed by name
+    wanted_makes = {make["name"]: make.get("description", "") for make in makes}
+    existing = CarMake.objects.in_bulk(list(wanted_makes), field_name='name')
+    CarMake.objects.bulk_create(
+        [CarMake(name=name, description=description)
+         for name, description in wanted_makes.items() if name not in existing],
+        ignore_conflicts=True)
+    counts["makes_created"] = len(wanted_makes) - len(existing)
+    changed = [car_make for name, car_make in existing.items()
+               if car_make.description != wanted_makes[name]]
+    for car_make in changed:
+        car_make.description = wanted_makes[car_make.name]
+    CarMake.objects.bulk_update(changed, ['description'])
+    counts["makes_updated"] = len(changed)
+
+    # Models, keyed by (make id, name, year)
+    make_ids = dict(CarMake.objects.filter(name__in=wanted_makes)
+                    .values_list('name', 'id'))
+    wanted_models = {}
+    for make in makes:
+        for model in make.get("models", []):
+            key = (make_ids[make["name"]], model["name"], int(model["year"]))
+            wanted_models[key] = _normalize_type(model.get("type", "SUV"))
+    existing = {(car_model.car_make_id, car_model.name, car_model.year): car_model
+                for car_model in CarModel.objects.filter(car_make_id__in=make_ids.values())}
+    CarModel.objects.bulk_create(
+        [CarModel(car_make_id=make_id, name=name, year=year, type=car_type)
+         for (make_id, name, year), car_type in wanted_models.items()
+         if (make_id, name, year) not in existing],
+        ignore_conflicts=True)
+    counts["models_created"] = len([key for key in wanted_models if key not in existing])
+    changed = [car_model for key, car_model in existing.items()
+               if key in wanted_models and car_model.type != wanted_models[key]]
+    for car_model in changed:
+        car_model.type = wanted_models[(car_model.car_make_id, car_model.name, car_model.year)]
+    CarModel.objects.bulk_update(changed, ['type'])
+    counts["models_updated"] = len(changed)
+
+    # Bulk operations send no model signals, so invalidate get_cars here
+    if any(counts.values()):
+        transaction.on_commit(catalog_cache.bump_version)
+    return counts
+
+
+def initiate():
+    """
+    Loads the default catalog (Nissan, Mercedes, Audi, Kia, Toyota and
+    their models) into the database
+    """
+    return load_catalog(read_catalog(DEFAULT_CATALOG))
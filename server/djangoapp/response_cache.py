@@ -0,0 +1,200 @@
+"""
+Response Cache
+--------------
+This file provides a decorator that caches the JSON responses of the proxy
+views in Django's cache framework, and a function to invalidate them.
+
+Cached responses carry ETag and Last-Modified headers, and a request whose
+If-None-Match / If-Modified-Since matches gets a 304 with no body. Keys are
+built from the endpoint name, a scope (the dealer_id or state URL argument)
+and the query string. Each scope has a generation counter, so `invalidate`
+evicts every filter variant of a scope at once.
+
+Settings (environment variables):
+- response_cache_alias: Django cache alias to use (default "default")
+- <endpoint>_cache_ttl: Seconds a response for that endpoint stays cached,
+  0 disables caching for it (see CACHE_TTLS for endpoints and defaults)
+
+Functions:
+- cache_response: Decorator caching a sync or async view's response
+- invalidate: Evicts all cached responses for an endpoint and scope
+- invalidate_dealer_reviews: Evicts every cached response listing a dealer's reviews
+"""
+
+import asyncio
+import functools
+import hashlib
+import os
+import time
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Django cache alias holding cached responses
+response_cache_alias = os.getenv('response_cache_alias', default="default")
+
+# Seconds a response stays cached, per endpoint
+CACHE_TTLS = {
+    "dealers": int(os.getenv('dealers_cache_ttl', default="300")),
+    "dealer_details": int(os.getenv('dealer_details_cache_ttl', default="300")),
+    "dealers_by_ids": int(os.getenv('dealers_by_ids_cache_ttl', default="300")),
+    "dealer_reviews": int(os.getenv('dealer_reviews_cache_ttl', default="60")),
+    "dealer_full": int(os.getenv('dealer_full_cache_ttl', default="60")),
+    "inventory": int(os.getenv('inventory_cache_ttl', default="60")),
+}
+
+# Prefix for all keys written by this module
+KEY_PREFIX = "response:"
+
+
+def _cache():
+    return caches[response_cache_alias]
+
+
+def _generation_key(endpoint, scope):
+    return "{}gen:{}:{}".format(KEY_PREFIX, endpoint, scope)
+
+
+def _scope(view_kwargs, scope_kwarg):
+    return str(view_kwargs.get(scope_kwarg, "all"))
+
+
+def _entry_key(request, endpoint, scope, generation):
+    query = "&".join("{}={}".format(key, value)
+                     for key, value in sorted(request.GET.items()))
+    digest = hashlib.md5(query.encode("utf-8")).hexdigest()
+    return "{}{}:{}:{}:{}".format(KEY_PREFIX, endpoint, scope, generation, digest)
+
+
+def invalidate(endpoint, scope="all"):
+    """
+    Evicts all cached responses for an endpoint and scope
+
+    Args:
+        endpoint (str): Endpoint name, one of the keys of CACHE_TTLS
+        scope: The dealer_id or state the responses were cached under
+    """
+    key = _generation_key(endpoint, scope)
+    cache = _cache()
+    # Bumping the generation orphans every key built with the old one
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def invalidate_dealer_reviews(dealer_id):
+    """
+    Evicts every cached response listing a dealer's reviews, so a newly
+    posted review shows up on the next read
+
+    Args:
+        dealer_id: The dealer the review was posted for
+    """
+    invalidate("dealer_reviews", dealer_id)
+    invalidate("dealer_full", dealer_id)
+
+
+def _not_modified(request, entry):
+    # Return True if the client's validators match the cached entry
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return "*" in etags or entry["etag"] in etags
+    if_modified_since = parse_http_date_safe(
+        request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    return (if_modified_since is not None
+            and int(entry["last_modified"]) <= if_modified_since)
+
+
+def _build_response(request, entry):
+    if _not_modified(request, entry):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry["body"], content_type=entry["content_type"])
+    response["ETag"] = entry["etag"]
+    response["Last-Modified"] = http_date(entry["last_modified"])
+    # Let browsers keep the body but revalidate it on every use
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def _lookup(request, endpoint, scope):
+    # Return (entry key, cached entry or None)
+    cache = _cache()
+    generation = cache.get(_generation_key(endpoint, scope), 0)
+    key = _entry_key(request, endpoint, scope, generation)
+    return key, cache.get(key)
+
+
+def _store(key, response, ttl):
+    # Cache a fresh response unless the view marked it as not storable;
+    # streamed responses are never buffered into the cache
+    if response.status_code != 200 or response.streaming or \
+            "no-store" in response.get("Cache-Control", ""):
+        return None
+    entry = {
+        "body": response.content,
+        "content_type": response["Content-Type"],
+        "etag": '"{}"'.format(hashlib.md5(response.content).hexdigest()),
+        "last_modified": time.time(),
+    }
+    _cache().set(key, entry, timeout=ttl)
+    return entry
+
+
+def cache_response(endpoint, scope_kwarg="dealer_id"):
+    """
+    Decorator caching a view's response under `endpoint` for its TTL
+
+    Works with sync and async views. Only GET and HEAD requests are cached;
+    a view can opt a response out by adding a `no-store` Cache-Control
+    directive, e.g. with `django.utils.cache.add_never_cache_headers`.
+
+    Args:
+        endpoint (str): Endpoint name, one of the keys of CACHE_TTLS
+        scope_kwarg (str): URL argument the cache is scoped and invalidated by
+    """
+    ttl = CACHE_TTLS[endpoint]
+
+    def decorator(view):
+        if ttl <= 0:
+            return view
+
+        if asyncio.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return await view(request, *args, **kwargs)
+                scope = _scope(kwargs, scope_kwarg)
+                key, entry = await sync_to_async(_lookup)(request, endpoint, scope)
+                if entry is None:
+                    response = await view(request, *args, **kwargs)
+                    entry = await sync_to_async(_store)(key, response, ttl)
+                    if entry is None:
+                        return response
+                return _build_response(request, entry)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            scope = _scope(kwargs, scope_kwarg)
+            key, entry = _lookup(request, endpoint, scope)
+            if entry is None:
+                response = view(request, *args, **kwargs)
+                entry = _store(key, response, ttl)
+                if entry is None:
+                    return response
+            return _build_response(request, entry)
+        return wrapper
+
+    return decorator
@@ -3,22 +3,41 @@ API Client Utilities
 --------------------
 This file defines utility functions for interacting with external services 
 and backend APIs. It loads environment variables for service URLs and provides 
-helper functions for GET and POST requests.
+helper functions for GET and POST requests. Requests go through one pooled 
+`UpstreamClient` per service (see `http_client.py`), so connections are reused 
+and every call has a timeout. Bodies are encoded and decoded with
+`serializers.py`.
 
 Functions:
+- coalesced_get: Sends a GET request, sharing the upstream call with identical concurrent requests
 - get_request: Sends a GET request to the backend server 
+- get_request_raw: Returns a backend GET response body undecoded, for pass-through
 - analyze_review_sentiments: Sends text to the sentiment analysis service and returns results
+- analyze_review_sentiments_batch: Sends a list of texts to the sentiment analysis service in one request
+- analyze_review_sentiments_concurrent: Scores a list of texts with parallel per-text requests
+- get_review_sentiments: Returns one sentiment label per text, from the sentiment cache or the configured scoring mode
 - post_review: Sends a POST request to the backend server to insert a new review
+- update_review_sentiments: Stores sentiments of existing reviews on the backend server
 - searchcars_request: Sends a GET request to the car search service with optional query parameters
+- searchcars_request_raw: Returns a car search response body undecoded, for pass-through
 """
 
-import requests
+import hashlib
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
 from dotenv import load_dotenv
+from . import sentiment_cache, serializers
+from .single_flight import SingleFlight
+from .http_client import UpstreamClient
+from .instrumentation import in_context
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # URL of the backend server
 backend_url = os.getenv(
     'backend_url', default="http://localhost:3030")
@@ -30,6 +49,52 @@ sentiment_analyzer_url = os.getenv(
 searchcars_url = os.getenv(
     'searchcars_url',
     default="http://localhost:3050/")
+# How reviews are scored: "batch" (one POST, falls back to concurrent)
+# or "concurrent" (parallel per-text GETs)
+sentiment_mode = os.getenv('sentiment_mode', default="batch")
+# Maximum number of in-flight per-text sentiment requests
+sentiment_concurrency = int(os.getenv('sentiment_concurrency', default="8"))
+
+# Pooled clients, one per upstream service
+backend_client = UpstreamClient("backend", backend_url)
+sentiment_client = UpstreamClient("sentiment_analyzer", sentiment_analyzer_url)
+searchcars_client = UpstreamClient("searchcars", searchcars_url)
+
+# Label given to a review whose sentiment could not be determined
+UNKNOWN_SENTIMENT = "unknown"
+
+# Headers of POST bodies encoded with `serializers.dumps`
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Identical concurrent GETs and scoring calls share one upstream call
+flights = SingleFlight()
+
+
+def coalesced_get(client, endpoint, params=None):
+    """
+    Sends a GET request, sharing one upstream call between identical
+    requests in flight at the same time (see `single_flight.py`)
+
+    Args:
+        client (UpstreamClient): The upstream to call
+        endpoint (str): API endpoint to call
+        params (dict): Optional query parameters
+
+    Returns:
+        bytes: The response body; each caller decodes its own copy
+
+    Raises:
+        requests.HTTPError: If the upstream answered with a non-2xx status,
+            so error bodies are never served (or cached) as data
+    """
+    params = params or {}
+    key = "{}:{}?{}".format(client.name, endpoint, urlencode(sorted(params.items())))
+
+    def fetch():
+        response = client.get(endpoint, params=params)
+        response.raise_for_status()
+        return response.content
+    return flights.do(key, fetch)
 
 
 def get_request(endpoint, **kwargs):
@@ -43,20 +108,38 @@ def get_request(endpoint, **kwargs):
     Returns:
         dict: JSON response from the backend if successful, and None otherwise
     """
-    params = ""
-    if(kwargs):
-        for key,value in kwargs.items():
-            params=params+key+"="+value+"&"
+    # Arguments are only formatted if DEBUG is enabled
+    logger.debug("GET %s%s %s", backend_url, endpoint, kwargs)
+    try:
+        # Concurrent requests for the same endpoint share one backend call
+        return serializers.loads(coalesced_get(backend_client, endpoint, kwargs))
+    except Exception as err:
+        logger.warning("GET %s failed: %r", endpoint, err)
+
+
+def get_request_raw(endpoint, **kwargs):
+    """
+    Sends a GET request to the backend server and returns the body undecoded,
+    for views that pass it on to the client unchanged
 
-    request_url = backend_url+endpoint+"?"+params
+    Args:
+        endpoint (str): API endpoint to call
+        **kwargs: Optional query parameters as key-value pairs
 
-    print("GET from {} ".format(request_url))
+    Returns:
+        bytes: The JSON body of a 2xx response, and None otherwise (failed
+               calls and error statuses)
+    """
+    logger.debug("GET %s%s %s", backend_url, endpoint, kwargs)
     try:
-        # Call get method of requests library with URL and parameters
-        response = requests.get(request_url)
-        return response.json()
-    except:
-        print("Network exception occurred")
+        body = coalesced_get(backend_client, endpoint, kwargs)
+    except Exception as err:
+        logger.warning("GET %s failed: %r", endpoint, err)
+        return None
+    if not serializers.looks_like_json(body):
+        logger.warning("GET %s returned a non-JSON body", endpoint)
+        return None
+    return body
 
 
 def analyze_review_sentiments(text):
@@ -69,33 +152,154 @@ def analyze_review_sentiments(text):
     Returns:
         dict: Sentiment analysis results (JSON) if successful, and None otherwise
     """
-    request_url = sentiment_analyzer_url+"analyze/"+text
     try:
-        # Call get method of requests library with URL and parameters
-        response = requests.get(request_url)
-        return response.json()
+        # Call get method of the pooled sentiment analyzer session
+        return serializers.loads(coalesced_get(sentiment_client, "analyze/"+text))
+    except Exception as err:
+        logger.warning("Sentiment analysis failed: %r", err)
+
+
+def analyze_review_sentiments_batch(texts):
+    """
+    Sends a list of text strings to the sentiment analysis service in one request
+
+    Args:
+        texts (list[str]): Review texts to analyze
+
+    Returns:
+        list[str]: Sentiment labels in the same order as `texts` if successful,
+                   and None otherwise
+    """
+    if not texts:
+        return []
+    try:
+        response = sentiment_client.post("analyze/batch", data=serializers.dumps(list(texts)),
+                                         headers=JSON_HEADERS)
+        sentiments = serializers.loads(response.content)['sentiments']
+        if len(sentiments) != len(texts):
+            raise ValueError("Expected {} sentiments, got {}".format(
+                len(texts), len(sentiments)))
+        return sentiments
     except Exception as err:
-        print(f"Unexpected {err=}, {type(err)=}")
-        print("Network exception occurred")
+        logger.warning("Batch sentiment analysis of %d texts failed: %r", len(texts), err)
 
 
-def post_review(data_dict):
+def analyze_review_sentiments_concurrent(texts, max_workers=None):
+    """
+    Scores a list of text strings with parallel per-text requests
+
+    Args:
+        texts (list[str]): Review texts to analyze
+        max_workers (int): Optional. Maximum number of in-flight requests.
+                           Defaults to `sentiment_concurrency`
+
+    Returns:
+        list[str]: Sentiment labels in the same order as `texts`. A text whose
+                   request failed is labelled UNKNOWN_SENTIMENT
+    """
+    if not texts:
+        return []
+
+    def score(text):
+        response = analyze_review_sentiments(text)
+        if isinstance(response, dict) and 'sentiment' in response:
+            return response['sentiment']
+        return UNKNOWN_SENTIMENT
+
+    workers = min(max_workers or sentiment_concurrency, len(texts))
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        # Run each request in the caller's timing context
+        return list(executor.map(in_context(score), texts))
+
+
+def _score_sentiments(texts):
+    # Score texts with the configured `sentiment_mode`, bypassing the cache
+    if sentiment_mode == "batch":
+        sentiments = analyze_review_sentiments_batch(texts)
+        if sentiments is not None:
+            return sentiments
+    # Batch endpoint disabled or unavailable, fan out per-text requests
+    return analyze_review_sentiments_concurrent(texts)
+
+
+def _score_sentiments_coalesced(texts):
+    # Requests for the same dealer page score the same texts: score them once
+    digest = hashlib.sha256("\0".join(texts).encode("utf-8")).hexdigest()
+    return flights.do("sentiments:" + digest, lambda: tuple(_score_sentiments(texts)))
+
+
+def get_review_sentiments(texts):
+    """
+    Returns one sentiment label per text
+
+    Labels are served from the sentiment cache where possible; only uncached
+    texts are sent to the analyzer, using the configured `sentiment_mode`
+
+    Args:
+        texts (list[str]): Review texts to analyze
+
+    Returns:
+        list[str]: Sentiment labels in the same order as `texts`
+    """
+    sentiments = sentiment_cache.get_many(texts)
+    missing = [index for index, sentiment in enumerate(sentiments)
+               if sentiment is None]
+    if missing:
+        # Score each distinct uncached text once
+        missing_texts = list(dict.fromkeys(texts[index] for index in missing))
+        scored = dict(zip(missing_texts, _score_sentiments_coalesced(missing_texts)))
+        for index in missing:
+            sentiments[index] = scored[texts[index]]
+        # Failed calls are not cached so they are retried on the next view
+        known = [(text, sentiment) for text, sentiment in scored.items()
+                 if sentiment != UNKNOWN_SENTIMENT]
+        if known:
+            sentiment_cache.set_many(*zip(*known))
+    return sentiments
+
+
+def post_review(data_dict, idempotency_key=None):
     """
     Sends a review payload to the backend server via POST request
 
     Args:
         data_dict (dict): Dictionary containing review data
+        idempotency_key (str): Optional. Sent as the Idempotency-Key header;
+            the backend returns the review already saved with the same key
+            instead of inserting it again
 
     Returns:
         dict: JSON response from the backend if successful, and None otherwise
     """
-    request_url = backend_url+"/insert_review"
+    headers = dict(JSON_HEADERS)
+    if idempotency_key:
+        headers["Idempotency-Key"] = idempotency_key
     try:
-        response = requests.post(request_url,json=data_dict)
-        print(response.json())
-        return response.json()
-    except:
-        print("Network exception occurred")
+        response = backend_client.post("/insert_review", data=serializers.dumps(data_dict),
+                                       headers=headers)
+        result = serializers.loads(response.content)
+        logger.debug("Posted review: %s", result)
+        return result
+    except Exception as err:
+        logger.warning("Posting review failed: %r", err)
+
+
+def update_review_sentiments(updates):
+    """
+    Stores sentiments of existing reviews on the backend server
+
+    Args:
+        updates (list[dict]): [{"id": <review id>, "sentiment": <label>}, ...]
+
+    Returns:
+        dict: {"modified": <count>} if successful, and None otherwise
+    """
+    try:
+        response = backend_client.post("/update_sentiments", data=serializers.dumps(updates),
+                                       headers=JSON_HEADERS)
+        return serializers.loads(response.content)
+    except Exception as err:
+        logger.warning("Updating %d sentiments failed: %r", len(updates), err)
 
 
 def searchcars_request(endpoint, **kwargs):
@@ -109,20 +313,35 @@ def searchcars_request(endpoint, **kwargs):
     Returns:
         dict: JSON response from the search service if successful, and None otherwise
     """
-    params = ""
-    if (kwargs):
-        for key, value in kwargs.items():
-            params = params+key + "=" + value + "&"
+    logger.debug("GET %s%s %s", searchcars_url, endpoint, kwargs)
+    try:
+        # Call get method of the pooled car search session with parameters
+        return serializers.loads(coalesced_get(searchcars_client, endpoint, kwargs))
+    except Exception as err:
+        logger.warning("Car search %s failed: %r", endpoint, err)
+
 
-    request_url = searchcars_url+endpoint+"?"+params
+def searchcars_request_raw(endpoint, **kwargs):
+    """
+    Sends a GET request to the car search service and returns the body
+    undecoded, for views that pass it on to the client unchanged
 
-    print("GET from {} ".format(request_url))
+    Args:
+        endpoint (str): API endpoint to call
+        **kwargs: Optional query parameters as key-value pairs
+
+    Returns:
+        bytes: The JSON body of a 2xx response, and None otherwise (failed
+               calls and error statuses)
+    """
+    logger.debug("GET %s%s %s", searchcars_url, endpoint, kwargs)
     try:
-        # Call get method of requests library with URL and parameters
-        response = requests.get(request_url)
-        return response.json()
-    except:
-        print("Network exception occurred")
-    finally:
-        print("GET request call complete!")
+        body = coalesced_get(searchcars_client, endpoint, kwargs)
+    except Exception as err:
+        logger.warning("Car search %s failed: %r", endpoint, err)
+        return None
+    if not serializers.looks_like_json(body):
+        logger.warning("Car search %s returned a non-JSON body", endpoint)
+        return None
+    return body
         
\ No newline at end of file
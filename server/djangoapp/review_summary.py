@@ -0,0 +1,253 @@
+"""
+Review Summaries
+----------------
+This file maintains per-dealer review aggregates (the DealerReviewSummary
+model): review counts per sentiment, the average purchase year and the number
+of reviews per car make. Summaries of dealers that exist but have none yet
+are built from their full review lists (from the mirror or the backend) when
+they are first read, and are then updated incrementally as reviews are posted
+through `add_review` or the review queue, so later reads are a single query.
+
+A read builds every missing summary it asks for together: one call confirms
+which dealers exist and one fetches all their reviews, so ids of unknown
+dealers cost no review fetch and are never stored. Dealers that do not exist,
+or whose reviews cannot be fetched, are returned as not summarized
+("summarized": false, counts null) rather than as zeros.
+
+Reviews without a stored sentiment (all reviews written before sentiments
+were stored) are scored in one batch while a summary is built, and the labels
+are kept on mirrored reviews. A summary is only stored once every review in
+it has a label; while the analyzer cannot score some of them, the summary is
+returned with those counted as "unknown" and is built again on the next read.
+`backfill_sentiments` drops the summaries of dealers whose reviews it labels,
+so they are rebuilt from the stored sentiments.
+
+Reviews added to the backend by other means are picked up by the
+`rebuild_review_summaries` management command, which recomputes every summary
+from scratch.
+
+Functions:
+- add_review: Adds one posted review to its dealer's summary, if it has one
+- build: Builds the summaries of several existing dealers from their reviews
+- rebuild: Recomputes every summary from a full list of reviews
+- invalidate: Drops the summaries of dealers so they are built again
+- summaries: Returns the summaries of several dealers
+- summary: Returns the summary of one dealer
+"""
+
+from django.db import transaction
+from . import mirror
+from .models import DealerReviewSummary
+from .restapis import UNKNOWN_SENTIMENT, get_request, get_review_sentiments
+
+SENTIMENTS = ("positive", "negative", "neutral")
+
+
+def _purchase_year(review):
+    # Year of a "MM/DD/YYYY" purchase date, or None
+    try:
+        return int(str(review.get('purchase_date') or "")[-4:])
+    except ValueError:
+        return None
+
+
+def _add(summary, review):
+    # Add one review to a summary in memory
+    summary.review_count += 1
+    sentiment = review.get('sentiment')
+    if sentiment in SENTIMENTS:
+        setattr(summary, sentiment, getattr(summary, sentiment) + 1)
+    else:
+        summary.unscored += 1
+    year = _purchase_year(review) if review.get('purchase') else None
+    if year is not None:
+        summary.purchase_year_total += year
+        summary.purchase_year_count += 1
+    make = review.get('car_make')
+    if make:
+        summary.car_makes[make] = summary.car_makes.get(make, 0) + 1
+
+
+def add_review(review):
+    """
+    Adds one posted review to its dealer's summary
+
+    Dealers without a summary are left alone: their summary is built from
+    the full review list, which includes this review, on first read.
+
+    Args:
+        review (dict): The saved review returned by the backend's /insert_review
+    """
+    if not isinstance(review, dict) or review.get('dealership') is None:
+        return
+    with transaction.atomic():
+        # Lock the row so concurrent reviews for a dealer are not lost
+        summary = (DealerReviewSummary.objects.select_for_update()
+                   .filter(dealer_id=int(review['dealership'])).first())
+        if summary is None:
+            return
+        _add(summary, review)
+        summary.save()
+
+
+def _score(reviews, from_mirror):
+    # Label reviews that have no stored sentiment, in one batch; return True
+    # if every review now has a label
+    pending = [review for review in reviews if review.get('sentiment') not in SENTIMENTS]
+    if not pending:
+        return True
+    sentiments = get_review_sentiments([review.get('review') or "" for review in pending])
+    scored = []
+    for review, sentiment in zip(pending, sentiments):
+        if sentiment in SENTIMENTS:
+            review['sentiment'] = sentiment
+            scored.append(review)
+    if from_mirror and scored:
+        # Keep the labels so mirrored reviews are only scored once
+        mirror.save_sentiments(scored)
+    return len(scored) == len(pending)
+
+
+def _fetch_dealers_and_reviews(dealer_ids, from_mirror):
+    # The dealers among dealer_ids that exist and all of their reviews, from
+    # the mirror while it is fresh or else from the backend; None on failure
+    if from_mirror:
+        return mirror.dealers_by_ids(dealer_ids), mirror.reviews_by_dealers(dealer_ids)
+    ids = ",".join(str(dealer_id) for dealer_id in dealer_ids)
+    dealers = get_request("/fetchDealersByIds", ids=ids)
+    if not isinstance(dealers, list):
+        return None, None
+    if not dealers:
+        return dealers, []
+    # Only reviews of dealers that exist are fetched
+    ids = ",".join(str(dealer['id']) for dealer in dealers)
+    return dealers, get_request("/fetchReviewsByDealers", ids=ids)
+
+
+def build(dealer_ids):
+    """
+    Builds the summaries of several dealers from their full review lists,
+    with one dealer lookup and one review fetch for all of them
+
+    Ids of dealers that do not exist are skipped, so they are never stored.
+    Reviews without a stored sentiment are scored first; if some cannot be
+    scored, the summaries are returned without being stored.
+
+    Args:
+        dealer_ids (list[int]): Dealers without a summary
+
+    Returns:
+        dict: {dealer_id: DealerReviewSummary} for the dealers that exist (the
+              rows saved first, if another process built some concurrently);
+              empty if the dealers or reviews could not be fetched
+    """
+    from_mirror = mirror.serving()
+    dealers, reviews = _fetch_dealers_and_reviews(dealer_ids, from_mirror)
+    if not isinstance(dealers, list) or not isinstance(reviews, list):
+        return {}
+    wanted = set(dealer_ids)
+    built = {int(dealer['id']): DealerReviewSummary(dealer_id=int(dealer['id']), car_makes={})
+             for dealer in dealers if int(dealer['id']) in wanted}
+    if not built:
+        return {}
+    reviews = [review for review in reviews if int(review['dealership']) in built]
+    complete = _score(reviews, from_mirror)
+    for review in reviews:
+        _add(built[int(review['dealership'])], review)
+    if not complete:
+        return built
+    DealerReviewSummary.objects.bulk_create(built.values(), ignore_conflicts=True)
+    return DealerReviewSummary.objects.in_bulk(list(built))
+
+
+@transaction.atomic
+def rebuild(reviews, from_mirror=False):
+    """
+    Recomputes every summary from a full list of reviews, scoring those
+    without a stored sentiment first
+
+    Args:
+        reviews (list[dict]): Every review, as returned by /fetchReviews
+        from_mirror (bool): Optional. True if the reviews were read from the
+            mirror, which then keeps the scored labels
+
+    Returns:
+        int: Number of dealers summarized
+    """
+    _score(reviews, from_mirror)
+    summaries = {}
+    for review in reviews:
+        dealer_id = int(review['dealership'])
+        if dealer_id not in summaries:
+            summaries[dealer_id] = DealerReviewSummary(dealer_id=dealer_id, car_makes={})
+        _add(summaries[dealer_id], review)
+    DealerReviewSummary.objects.all().delete()
+    DealerReviewSummary.objects.bulk_create(summaries.values())
+    return len(summaries)
+
+
+def invalidate(dealer_ids):
+    """
+    Drops the summaries of dealers whose reviews changed other than through
+    `add_review`, so they are built again on their next read
+    """
+    DealerReviewSummary.objects.filter(dealer_id__in=list(dealer_ids)).delete()
+
+
+def _as_dict(dealer_id, summary):
+    # Response shape of one summary, or the not summarized marker for None
+    if summary is None:
+        return {
+            "dealer_id": dealer_id,
+            "summarized": False,
+            "reviews": None,
+            "sentiments": None,
+            "positive_percent": None,
+            "average_purchase_year": None,
+            "car_makes": None,
+        }
+    counts = {sentiment: getattr(summary, sentiment) for sentiment in SENTIMENTS}
+    counts[UNKNOWN_SENTIMENT] = summary.unscored
+    scored = sum(summary_count for sentiment, summary_count in counts.items()
+                 if sentiment != UNKNOWN_SENTIMENT)
+    return {
+        "dealer_id": dealer_id,
+        "summarized": True,
+        "reviews": summary.review_count,
+        "sentiments": counts,
+        "positive_percent": round(100 * summary.positive / scored, 1) if scored else None,
+        "average_purchase_year": (round(summary.purchase_year_total / summary.purchase_year_count, 1)
+                                  if summary.purchase_year_count else None),
+        "car_makes": summary.car_makes,
+    }
+
+
+def summaries(dealer_ids=None):
+    """
+    Returns the summaries of several dealers in one query, building those
+    of requested dealers that exist but have none yet (see `build`)
+
+    Args:
+        dealer_ids (list[int]): Optional. Dealers to summarize, all summarized
+            dealers if omitted
+
+    Returns:
+        dict: {dealer_id: {"dealer_id", "summarized", "reviews", "sentiments",
+               "positive_percent", "average_purchase_year", "car_makes"}}
+    """
+    rows = DealerReviewSummary.objects.all()
+    if dealer_ids is not None:
+        rows = rows.filter(dealer_id__in=dealer_ids)
+    found = {summary.dealer_id: summary for summary in rows}
+    wanted = sorted(found) if dealer_ids is None else dealer_ids
+    missing = [dealer_id for dealer_id in wanted if dealer_id not in found]
+    if missing:
+        found.update(build(missing))
+    return {dealer_id: _as_dict(dealer_id, found.get(dealer_id)) for dealer_id in wanted}
+
+
+def summary(dealer_id):
+    """
+    Returns the summary of one dealer, see `summaries`
+    """
+    return summaries([dealer_id])[dealer_id]
@@ -0,0 +1,175 @@
+"""
+Sentiment Cache
+---------------
+This file provides a content-addressed cache for review sentiment labels.
+Review text never changes once posted, so a label is stored under a hash of
+the text and reused on every later view of the dealer page.
+
+Tiers:
+- In-process LRU: bounded by `sentiment_cache_max_entries`, expires after
+  `sentiment_cache_ttl` seconds
+- Shared (optional): a Django cache alias named by `sentiment_cache_alias`,
+  shared between workers
+
+Functions:
+- text_key: Returns the cache key for a review text
+- get_many: Looks up cached labels for a list of texts
+- set_many: Stores labels for a list of texts
+- stats: Returns hit/miss counters
+- clear: Empties the in-process tier and resets counters
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Seconds a cached label stays valid (0 disables expiry)
+sentiment_cache_ttl = int(os.getenv('sentiment_cache_ttl', default="86400"))
+# Maximum number of labels kept in the in-process tier (0 disables the tier)
+sentiment_cache_max_entries = int(os.getenv(
+    'sentiment_cache_max_entries', default="10000"))
+# Django cache alias used as the shared tier, empty to disable it
+sentiment_cache_alias = os.getenv('sentiment_cache_alias', default="")
+# Whether hit/miss counters are recorded
+sentiment_cache_stats = os.getenv(
+    'sentiment_cache_stats', default="true").lower() == "true"
+
+# Prefix for keys written to the shared tier
+KEY_PREFIX = "sentiment:"
+
+_lock = threading.Lock()
+# key -> (label, expiry timestamp or None), least recently used first
+_entries = OrderedDict()
+_counters = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+
+
+def text_key(text):
+    """
+    Returns the cache key for a review text
+
+    Args:
+        text (str): Review text
+
+    Returns:
+        str: SHA-256 hex digest of the UTF-8 encoded text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _shared_cache():
+    # Resolve the shared tier lazily so the module imports without settings
+    if not sentiment_cache_alias:
+        return None
+    from django.core.cache import caches
+    return caches[sentiment_cache_alias]
+
+
+def _count(name, amount=1):
+    if sentiment_cache_stats and amount:
+        with _lock:
+            _counters[name] += amount
+
+
+def _local_get(key, now):
+    if sentiment_cache_max_entries <= 0:
+        return None
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        label, expires = entry
+        if expires is not None and expires <= now:
+            del _entries[key]
+            return None
+        _entries.move_to_end(key)
+        return label
+
+
+def _local_set(key, label, now):
+    if sentiment_cache_max_entries <= 0:
+        return
+    expires = now + sentiment_cache_ttl if sentiment_cache_ttl > 0 else None
+    with _lock:
+        _entries[key] = (label, expires)
+        _entries.move_to_end(key)
+        while len(_entries) > sentiment_cache_max_entries:
+            _entries.popitem(last=False)
+
+
+def get_many(texts):
+    """
+    Looks up cached labels for a list of texts
+
+    Args:
+        texts (list[str]): Review texts
+
+    Returns:
+        list[str]: Cached label per text, None where the text is not cached
+    """
+    now = time.monotonic()
+    keys = [text_key(text) for text in texts]
+    labels = [_local_get(key, now) for key in keys]
+    local_hits = sum(label is not None for label in labels)
+    _count("local_hits", local_hits)
+
+    missing = [key for key, label in zip(keys, labels) if label is None]
+    shared = _shared_cache()
+    if missing and shared is not None:
+        found = shared.get_many([KEY_PREFIX + key for key in missing])
+        if found:
+            for index, key in enumerate(keys):
+                label = found.get(KEY_PREFIX + key)
+                if labels[index] is None and label is not None:
+                    labels[index] = label
+                    _local_set(key, label, now)
+            _count("shared_hits", len(found))
+
+    _count("misses", sum(label is None for label in labels))
+    return labels
+
+
+def set_many(texts, labels):
+    """
+    Stores labels for a list of texts
+
+    Args:
+        texts (list[str]): Review texts
+        labels (list[str]): Sentiment label per text
+    """
+    now = time.monotonic()
+    shared_entries = {}
+    for text, label in zip(texts, labels):
+        key = text_key(text)
+        _local_set(key, label, now)
+        shared_entries[KEY_PREFIX + key] = label
+    shared = _shared_cache()
+    if shared_entries and shared is not None:
+        shared.set_many(shared_entries,
+                        timeout=sentiment_cache_ttl if sentiment_cache_ttl > 0 else None)
+
+
+def stats():
+    """
+    Returns hit/miss counters and the current in-process tier size
+
+    Returns:
+        dict: {"local_hits", "shared_hits", "misses", "entries"}
+    """
+    with _lock:
+        return dict(_counters, entries=len(_entries))
+
+
+def clear():
+    """
+    Empties the in-process tier and resets the counters
+    """
+    with _lock:
+        _entries.clear()
+        for name in _counters:
+            _counters[name] = 0
@@ -0,0 +1,92 @@
+"""
+JSON Serializers
+----------------
+This file is the single place the app encodes and decodes JSON. It uses
+orjson when it is installed, which encodes and decodes large review and
+inventory payloads several times faster than the standard library, and falls
+back to the stdlib `json` module otherwise. Both produce the same documents.
+
+Settings (environment variables):
+- json_serializer: "auto" (orjson if installed, default), "orjson" or "stdlib"
+
+Functions:
+- dumps: Encodes a value as JSON bytes
+- loads: Decodes JSON from bytes or str
+- looks_like_json: Cheap check that an upstream body holds a JSON object or array
+"""
+
+import json
+import os
+from django.core.serializers.json import DjangoJSONEncoder
+from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+# Load environment variables from .env file
+load_dotenv()
+
+json_serializer = os.getenv('json_serializer', default="auto")
+if json_serializer == "orjson" and orjson is None:
+    raise ImportError("json_serializer is 'orjson' but orjson is not installed")
+
+# The serializer in use: "orjson" or "stdlib"
+BACKEND = "orjson" if orjson is not None and json_serializer != "stdlib" else "stdlib"
+
+# Types orjson does not encode natively are handled like DjangoJSONEncoder
+_django_encoder = DjangoJSONEncoder()
+
+if BACKEND == "orjson":
+    # Non-string keys (e.g. dealer ids) are written as strings, as json.dumps does
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(value):
+        """
+        Encodes a value as JSON
+
+        Returns:
+            bytes: UTF-8 encoded JSON
+        """
+        return orjson.dumps(value, default=_django_encoder.default, option=_ORJSON_OPTIONS)
+
+    def loads(data):
+        """
+        Decodes JSON from bytes or str
+
+        Raises:
+            ValueError: On malformed JSON
+        """
+        return orjson.loads(data)
+else:
+    def dumps(value):
+        """
+        Encodes a value as JSON
+
+        Returns:
+            bytes: UTF-8 encoded JSON
+        """
+        return json.dumps(value, cls=DjangoJSONEncoder).encode("utf-8")
+
+    def loads(data):
+        """
+        Decodes JSON from bytes or str
+
+        Raises:
+            ValueError: On malformed JSON
+        """
+        return json.loads(data)
+
+
+def looks_like_json(body):
+    """
+    Returns True if `body` starts like a JSON object or array
+
+    Used to decide whether an upstream body can be passed through to the
+    client as is. It does not validate the whole document: the upstream
+    services send either complete JSON or a non-JSON error page, which
+    fails this check.
+    """
+    stripped = body.lstrip()[:1]
+    return stripped in (b"{", b"[")
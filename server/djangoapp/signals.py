@@ -0,0 +1,23 @@
+"""
+Signal Receivers
+----------------
+This file connects model signals for the `djangoapp` application. It is
+imported by `DjangoappConfig.ready`.
+
+Receivers:
+- catalog_changed: Bumps the catalog version when a CarMake or CarModel is
+  saved or deleted, once the surrounding transaction commits
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import catalog_cache
+from .models import CarMake, CarModel
+
+
+@receiver([post_save, post_delete], sender=CarMake)
+@receiver([post_save, post_delete], sender=CarModel)
+def catalog_changed(sender, **kwargs):
+    # Bump after commit so no process rebuilds the payload from stale rows
+    transaction.on_commit(catalog_cache.bump_version)
@@ -0,0 +1,180 @@
+"""
+Single Flight
+-------------
+This file coalesces identical upstream calls that are in flight at the same
+time: the first caller for a key runs the call, and every caller that asks
+for the same key before it finishes waits for and shares its result. After a
+cached dealer page expires, a burst of requests for it then makes one
+backend call and one scoring call instead of one each.
+
+Callers share the result object, so calls should return immutable values
+(e.g. the raw response body) that each caller decodes on its own.
+
+Modes (environment variable `single_flight_mode`):
+- "local" (default): coalesce across the threads of one process
+- "shared": also coalesce across processes through a lock in Django's cache.
+  The process holding the lock stores the result in the cache for
+  `single_flight_result_ttl` seconds; the others poll for it and only make
+  the call themselves if the holder fails or `single_flight_lock_timeout`
+  passes
+- "off": every caller makes its own call
+
+Settings (environment variables):
+- single_flight_mode: "local", "shared" or "off" (default "local")
+- single_flight_cache_alias: Django cache alias for shared mode (default "default")
+- single_flight_lock_timeout: Seconds a shared lock is held at most (default 10)
+- single_flight_result_ttl: Seconds a shared result stays readable (default 2)
+
+Classes:
+- SingleFlight: Coalesces concurrent calls per key across threads
+- AsyncSingleFlight: Coalesces concurrent calls per key within an event loop
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import weakref
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+single_flight_mode = os.getenv('single_flight_mode', default="local")
+single_flight_cache_alias = os.getenv('single_flight_cache_alias', default="default")
+single_flight_lock_timeout = float(os.getenv('single_flight_lock_timeout', default="10"))
+single_flight_result_ttl = float(os.getenv('single_flight_result_ttl', default="2"))
+
+# Prefix for keys written to the shared cache
+KEY_PREFIX = "singleflight:"
+# Seconds between polls for a result computed by another process
+POLL_INTERVAL = 0.02
+
+
+class _Call:
+    # One in-flight call and its outcome
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _shared_cache():
+    # Resolve the cache lazily so the module imports without settings
+    from django.core.cache import caches
+    return caches[single_flight_cache_alias]
+
+
+def _shared_do(key, function):
+    # Run `function` in at most one process at a time for `key`
+    cache = _shared_cache()
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    lock_key = KEY_PREFIX + "lock:" + digest
+    result_key = KEY_PREFIX + "result:" + digest
+    deadline = time.monotonic() + single_flight_lock_timeout
+    while not cache.add(lock_key, 1, timeout=single_flight_lock_timeout):
+        # Another process is making the call; wait for it to publish the result
+        result = cache.get(result_key)
+        if result is not None:
+            return result
+        if time.monotonic() >= deadline:
+            return function()
+        time.sleep(POLL_INTERVAL)
+    try:
+        result = function()
+        if result is not None:
+            cache.set(result_key, result, timeout=single_flight_result_ttl)
+        return result
+    finally:
+        cache.delete(lock_key)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls per key across the threads of a process
+    """
+
+    def __init__(self, mode=None):
+        self.mode = mode or single_flight_mode
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        """
+        Returns the result of `function()`, shared with every concurrent
+        caller using the same `key`
+
+        Args:
+            key (str): Identifies the call, e.g. upstream, endpoint and parameters
+            function (callable): Makes the call
+
+        Returns:
+            The result of the one call made for `key`
+
+        Raises:
+            Exception: Whatever that call raised, in every waiting caller
+        """
+        if self.mode == "off":
+            return function()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if self.mode == "shared":
+                call.result = _shared_do(key, function)
+            else:
+                call.result = function()
+            return call.result
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent calls per key within each event loop
+
+    Shared mode is not used here: waiting on a cross-process lock would
+    block the loop, so async callers coalesce within their loop only.
+    """
+
+    def __init__(self, mode=None):
+        self.mode = mode or single_flight_mode
+        # Futures are bound to a loop, so in-flight calls are kept per loop
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key, function):
+        """
+        Returns the result of `await function()`, shared with every concurrent
+        caller on this loop using the same `key`
+        """
+        if self.mode == "off":
+            return await function()
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        future = calls.get(key)
+        if future is not None:
+            # shield: a cancelled waiter must not cancel the shared call
+            return await asyncio.shield(future)
+
+        future = calls[key] = asyncio.ensure_future(function())
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                calls.pop(key, None)
+            else:
+                future.add_done_callback(lambda _: calls.pop(key, None))
@@ -0,0 +1,195 @@
+"""
+Pagination and Streaming
+------------------------
+This file provides helpers for paginated list endpoints and for streaming a
+long list as a JSON document that is written incrementally, one upstream page
+at a time, so per-request memory stays bounded by the page size.
+
+A streamed response has the same shape as the buffered one, plus a
+"complete" flag that is false when an upstream page failed mid-stream:
+    {"status": 200, "<key>": [...], "complete": true}
+
+Settings (environment variables):
+- stream_page_size: Items fetched from upstream per page when streaming (default 50)
+
+Functions:
+- page_params: Parses offset/limit query parameters
+- page_kwargs: Turns offset/limit back into upstream query parameters
+- stream_requested: Tells whether the client asked for a streamed response
+- iter_pages: Fetches consecutive pages until the list or the limit is exhausted
+- aiter_pages: Async counterpart of iter_pages
+- stream_json_list: Builds a StreamingHttpResponse from an iterable of pages
+"""
+
+import os
+from django.http import StreamingHttpResponse
+from dotenv import load_dotenv
+from . import serializers
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Items fetched from upstream per page when streaming
+stream_page_size = int(os.getenv('stream_page_size', default="50"))
+
+
+def page_params(data):
+    """
+    Parses offset/limit query parameters
+
+    Args:
+        data (QueryDict): Request query parameters
+
+    Returns:
+        tuple: (offset, limit) where offset defaults to 0 and limit to None.
+               A limit of 0 also means no limit, as it does upstream, so
+               buffered and streamed responses return the same items
+
+    Raises:
+        ValueError: If either value is not a non-negative integer
+    """
+    offset = int(data.get('offset', 0))
+    limit = int(data['limit']) if 'limit' in data else None
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("offset and limit must not be negative")
+    return offset, limit or None
+
+
+def page_kwargs(offset, limit):
+    """
+    Returns offset/limit as string query parameters, omitting unset values
+    """
+    kwargs = {}
+    if offset:
+        kwargs['offset'] = str(offset)
+    if limit is not None:
+        kwargs['limit'] = str(limit)
+    return kwargs
+
+
+def stream_requested(data):
+    """
+    Returns True if the query parameters ask for a streamed response
+    """
+    return data.get('stream', 'false').lower() == 'true'
+
+
+def _page_sizes(offset, limit, page_size):
+    # Yield (offset, size) for successive pages; the caller sends back how
+    # many items each page actually returned
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        received = yield offset, size
+        if received < size:
+            return
+        offset += received
+        if remaining is not None:
+            remaining -= received
+
+
+def iter_pages(fetch_page, offset=0, limit=None, page_size=None):
+    """
+    Fetches consecutive pages until the list or the limit is exhausted
+
+    Args:
+        fetch_page (callable): fetch_page(offset, size) -> list, or None on failure
+        offset (int): Index of the first item
+        limit (int): Maximum number of items, None for all of them
+        page_size (int): Items per page, defaults to `stream_page_size`
+
+    Yields:
+        list: Each page; None once if a page failed, after which iteration stops
+    """
+    sizes = _page_sizes(offset, limit, page_size or stream_page_size)
+    try:
+        page_offset, size = next(sizes)
+        while True:
+            page = fetch_page(page_offset, size)
+            if not isinstance(page, list):
+                yield None
+                return
+            yield page
+            page_offset, size = sizes.send(len(page))
+    except StopIteration:
+        return
+
+
+async def aiter_pages(fetch_page, offset=0, limit=None, page_size=None):
+    """
+    Async counterpart of `iter_pages`, for a coroutine `fetch_page`
+    """
+    sizes = _page_sizes(offset, limit, page_size or stream_page_size)
+    try:
+        page_offset, size = next(sizes)
+        while True:
+            page = await fetch_page(page_offset, size)
+            if not isinstance(page, list):
+                yield None
+                return
+            yield page
+            page_offset, size = sizes.send(len(page))
+    except StopIteration:
+        return
+
+
+def _document_prefix(key):
+    return b'{"status":200,' + serializers.dumps(key) + b':['
+
+
+def _document_suffix(complete):
+    return b'],"complete":' + serializers.dumps(complete) + b'}'
+
+
+def _encode_page(page, first):
+    # Encode a page's items as the next stretch of the JSON array: the page
+    # is encoded in one call and its enclosing brackets dropped
+    body = serializers.dumps(page)[1:-1]
+    if body and not first:
+        body = b"," + body
+    return body
+
+
+def _stream(key, pages):
+    yield _document_prefix(key)
+    first = True
+    for page in pages:
+        if page is None:
+            yield _document_suffix(False)
+            return
+        if page:
+            yield _encode_page(page, first)
+            first = False
+    yield _document_suffix(True)
+
+
+async def _astream(key, pages):
+    yield _document_prefix(key)
+    first = True
+    async for page in pages:
+        if page is None:
+            yield _document_suffix(False)
+            return
+        if page:
+            yield _encode_page(page, first)
+            first = False
+    yield _document_suffix(True)
+
+
+def stream_json_list(key, pages):
+    """
+    Builds a StreamingHttpResponse writing `pages` as the JSON list `key`
+
+    Args:
+        key (str): Name of the list in the response document
+        pages: Iterable or async iterable of pages (lists), as produced by
+               `iter_pages` / `aiter_pages`
+
+    Returns:
+        StreamingHttpResponse: application/json response
+    """
+    if hasattr(pages, "__aiter__"):
+        content = _astream(key, pages)
+    else:
+        content = _stream(key, pages)
+    return StreamingHttpResponse(content, content_type="application/json")
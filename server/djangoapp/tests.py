@@ -0,0 +1,917 @@
+"""
+Tests
+-----
+Focused tests for the concurrency and state-machine pieces of djangoapp.
+Upstream services are replaced with mocks, so the suite runs without the
+backend, the sentiment analyzer or the car search service.
+
+Running:
+    python manage.py test djangoapp
+
+Classes:
+- CircuitBreakerTests: Circuit breaker state changes and their effect on UpstreamClient
+- SamplingFilterTests: Log sampling keeps the configured fraction and rejects bad rates
+- InventoryEngineTests: The local inventory engine against the car search service's query semantics
+- UpstreamErrorTests: Upstream error statuses are failures, never data served or cached
+- ReviewPagingTests: Buffered and streamed review lists agree for every offset and limit
+- CatalogSearchTests: Filters and keyset pagination of the catalog search endpoint
+- LoadCatalogTests: Idempotent catalog upserts from JSON and CSV files
+- ReviewSummaryTests: Summaries are built from full review lists, never from partial counts
+- ReviewJobTests: Review job retries, dead-lettering and post-once guarantees
+- SingleFlightTests: Coalescing of concurrent calls in threads, event loops and across processes
+"""
+
+import asyncio
+import hashlib
+import io
+import itertools
+import json
+import logging
+import random
+import tempfile
+import threading
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+import requests
+from django.core.cache import cache
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils.timezone import now
+
+from . import inventory_engine, jobs, populate, restapis, review_summary, single_flight, views
+from .http_client import CircuitBreaker, CircuitOpenError, UpstreamClient
+from .inventory_engine import InventoryEngine
+from .log import SamplingFilter
+from .streaming import page_params
+from .models import CarMake, CarModel, DealerReviewSummary, ReviewJob
+from .single_flight import AsyncSingleFlight, SingleFlight
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """
+    Circuit breaker state changes and their effect on UpstreamClient
+    """
+
+    def setUp(self):
+        self.clock = 1000.0
+        patcher = mock.patch("djangoapp.http_client.time.monotonic", lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_opens_after_threshold_consecutive_failures(self):
+        breaker = CircuitBreaker(threshold=3, reset_timeout=30)
+        for _ in range(2):
+            breaker.record_failure()
+            self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker(threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+
+    def test_half_open_lets_one_trial_through(self):
+        breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        self.clock += 29
+        self.assertFalse(breaker.allow())
+        self.clock += 1
+        self.assertTrue(breaker.allow())
+        # Only the trial request passes until its outcome is known
+        self.assertFalse(breaker.allow())
+
+    def test_successful_trial_closes_the_circuit(self):
+        breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        self.clock += 30
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.allow())
+
+    def test_failed_trial_opens_the_circuit_again(self):
+        breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        self.clock += 30
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.clock += 29
+        self.assertFalse(breaker.allow())
+
+    def test_zero_threshold_never_opens(self):
+        breaker = CircuitBreaker(threshold=0, reset_timeout=30)
+        for _ in range(10):
+            breaker.record_failure()
+        self.assertTrue(breaker.allow())
+
+    def _client(self, threshold=2):
+        with mock.patch.dict("os.environ", {"test_breaker_threshold": str(threshold),
+                                            "test_breaker_reset": "30"}):
+            return UpstreamClient("test", "http://upstream.invalid")
+
+    def test_client_counts_retry_statuses_and_refuses_when_open(self):
+        client = self._client()
+        client.session.request = mock.Mock(return_value=mock.Mock(status_code=503))
+        client.get("/a")
+        client.get("/a")
+        with self.assertRaises(CircuitOpenError):
+            client.get("/a")
+        self.assertEqual(client.session.request.call_count, 2)
+
+    def test_client_counts_connection_errors(self):
+        client = self._client(threshold=1)
+        client.session.request = mock.Mock(side_effect=requests.ConnectionError("refused"))
+        with self.assertRaises(requests.ConnectionError):
+            client.get("/a")
+        with self.assertRaises(CircuitOpenError):
+            client.get("/a")
+
+    def test_client_errors_do_not_open_the_circuit(self):
+        client = self._client(threshold=1)
+        client.session.request = mock.Mock(return_value=mock.Mock(status_code=404))
+        for _ in range(3):
+            client.get("/a")
+        self.assertEqual(client.session.request.call_count, 3)
+
+
+class SamplingFilterTests(SimpleTestCase):
+    """
+    Log sampling keeps the configured fraction and rejects bad rates
+    """
+
+    def kept(self, sampling_filter, level=logging.INFO, records=1000):
+        record = logging.makeLogRecord({"levelno": level})
+        return sum(sampling_filter.filter(record) for _ in range(records))
+
+    def test_keeps_the_configured_fraction(self):
+        for rate in (1, 0.6, 0.5, 0.4, 0.1):
+            self.assertEqual(self.kept(SamplingFilter(rate)), round(1000 * rate), rate)
+
+    def test_warnings_are_always_kept(self):
+        self.assertEqual(self.kept(SamplingFilter(0.1), logging.WARNING), 1000)
+
+    def test_rates_outside_the_range_are_rejected(self):
+        for rate in (0, -1, 2, 50, float("nan")):
+            with self.assertRaises(ValueError, msg=rate):
+                SamplingFilter(rate)
+
+
+def upstream_response(status, body=b'{"error": "failed"}'):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    return response
+
+
+class UpstreamErrorTests(SimpleTestCase):
+    """
+    Upstream error statuses are failures, never data served or cached
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        patcher = mock.patch.object(restapis.backend_client.session, "request")
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_helpers_return_none_for_error_statuses(self):
+        for status in (404, 500):
+            self.request.return_value = upstream_response(status)
+            with self.assertLogs("djangoapp.restapis", "WARNING"):
+                self.assertIsNone(restapis.get_request("/fetchDealers"))
+            with self.assertLogs("djangoapp.restapis", "WARNING"):
+                self.assertIsNone(restapis.get_request_raw("/fetchDealers"))
+
+    def test_helpers_return_2xx_bodies(self):
+        self.request.return_value = upstream_response(200, b'[{"id": 1}]')
+        self.assertEqual(restapis.get_request("/fetchDealers"), [{"id": 1}])
+        self.assertEqual(restapis.get_request_raw("/fetchDealers"), b'[{"id": 1}]')
+
+    def test_error_responses_are_not_cached(self):
+        request = RequestFactory().get("/djangoapp/get_dealers")
+        self.request.return_value = upstream_response(500)
+        with self.assertLogs("djangoapp.restapis", "WARNING"):
+            response = views.get_dealerships(request)
+        self.assertEqual(json.loads(response.content), {"status": 200, "dealers": None})
+        self.assertIn("no-store", response["Cache-Control"])
+
+        self.request.return_value = upstream_response(200, b'[{"id": 1}]')
+        response = views.get_dealerships(request)
+        self.assertEqual(json.loads(response.content), {"status": 200, "dealers": [{"id": 1}]})
+        # The successful response is the one cached
+        views.get_dealerships(request)
+        self.assertEqual(self.request.call_count, 2)
+
+
+class ReviewPagingTests(SimpleTestCase):
+    """
+    Buffered and streamed review lists agree for every offset and limit
+    """
+
+    REVIEWS = [{"id": review_id, "dealership": 15, "review": "fine", "sentiment": "neutral"}
+               for review_id in range(1, 8)]
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        patcher = mock.patch.object(views, "get_request", side_effect=self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def backend(self, endpoint, offset="0", limit="0"):
+        # /fetchReviews/dealer/<id>: a limit of 0 or none returns every review
+        offset, limit = int(offset), int(limit)
+        return [dict(review) for review in
+                (self.REVIEWS[offset:offset + limit] if limit else self.REVIEWS[offset:])]
+
+    def reviews(self, **params):
+        response = self.client.get("/djangoapp/reviews/dealer/15", params)
+        if response.streaming:
+            body = json.loads(b"".join(response.streaming_content))
+        else:
+            body = response.json()
+        return [review["id"] for review in body["reviews"]]
+
+    def test_zero_limit_means_no_limit(self):
+        self.assertEqual(page_params({"limit": "0"}), (0, None))
+        self.assertEqual(self.reviews(limit=0), list(range(1, 8)))
+
+    def test_streamed_and_buffered_lists_match(self):
+        for params in ({}, {"limit": "0"}, {"limit": "3"}, {"offset": "2"},
+                       {"offset": "2", "limit": "0"}, {"offset": "5", "limit": "4"}):
+            with self.subTest(**params):
+                self.assertEqual(self.reviews(stream="true", **params), self.reviews(**params))
+
+
+def carsearch(records, dealer_id, year=None, make=None, model=None, mileage=None,
+              price=None, sort=None, limit=None, offset=None):
+    # Reference implementation of carsInventory's /carsearch/:id over a list
+    # of records in insertion (_id) order
+    def bucket(value, bounds):
+        try:
+            bound = int(value)
+        except ValueError:
+            bound = None
+        if bound in bounds:
+            index = bounds.index(bound)
+            low = bounds[index - 1] if index else None
+            return lambda field: (low is None or field > low) and field <= bound
+        return lambda field: field > bounds[-1]
+
+    cars = [car for car in records if car["dealer_id"] == int(dealer_id)]
+    if year is not None:
+        cars = [car for car in cars if car["year"] >= int(year)]
+    if make is not None:
+        cars = [car for car in cars if car["make"] == make]
+    if model is not None:
+        cars = [car for car in cars if car["model"] == model]
+    if mileage is not None:
+        in_bucket = bucket(mileage, inventory_engine.MILEAGE_BUCKETS)
+        cars = [car for car in cars if in_bucket(car["mileage"])]
+    if price is not None:
+        in_bucket = bucket(price, inventory_engine.PRICE_BUCKETS)
+        cars = [car for car in cars if in_bucket(car["price"])]
+    if sort is not None:
+        # Stable sort: ties keep _id order, as the service's _id tie-break does
+        cars.sort(key=lambda car: car[sort.lstrip("-")], reverse=sort.startswith("-"))
+    start = int(offset or 0)
+    count = int(limit or 0)
+    return cars[start:start + min(count, inventory_engine.MAX_LIMIT)] if count > 0 else cars[start:]
+
+
+class InventoryEngineTests(SimpleTestCase):
+    """
+    The local inventory engine against the car search service's query semantics
+    """
+
+    MAKES = {"Audi": ("A4", "Q5"), "Kia": ("Seltos", "Soul"), "Nissan": ("Leaf",)}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = random.Random(7)
+        cls.records = []
+        for _ in range(400):
+            make = rng.choice(sorted(cls.MAKES))
+            cls.records.append({
+                "make": make,
+                "model": rng.choice(cls.MAKES[make]),
+                "bodyType": "SUV",
+                "year": rng.randint(2015, 2024),
+                "dealer_id": rng.randint(1, 4),
+                # Bucket bounds are included so the range edges are exercised
+                "mileage": rng.choice([50000, 100000, 150000, 200000, rng.randint(0, 250000)]),
+                "price": rng.choice([20000, 40000, 60000, 80000, rng.randint(5000, 100000)]),
+            })
+        cls.engine = InventoryEngine(cls.records)
+
+    def assertMatchesService(self, dealer_id, **query):
+        expected = carsearch(self.records, dealer_id, **query)
+        self.assertEqual(self.engine.search(dealer_id, **query), expected,
+                         "dealer {} {}".format(dealer_id, query))
+
+    def test_single_filters(self):
+        for dealer_id in (1, 2, 3, 4):
+            self.assertMatchesService(dealer_id)
+            for year in ("2015", "2020", "2024", "2030"):
+                self.assertMatchesService(dealer_id, year=year)
+            for make in ("Audi", "Kia", "Tesla"):
+                self.assertMatchesService(dealer_id, make=make)
+            self.assertMatchesService(dealer_id, model="Q5")
+            for bound in ("50000", "100000", "150000", "200000", "7", "abc"):
+                self.assertMatchesService(dealer_id, mileage=bound)
+            for bound in ("20000", "40000", "60000", "80000", "1"):
+                self.assertMatchesService(dealer_id, price=bound)
+
+    def test_combined_filters_sort_and_paging(self):
+        rng = random.Random(11)
+        options = {
+            "year": [None, "2018", "2022"],
+            "make": [None, "Audi", "Kia"],
+            "model": [None, "A4", "Soul"],
+            "mileage": [None, "100000", "200000", "999"],
+            "price": [None, "40000", "80000", "999"],
+            "sort": [None, "price", "-year", "make", "-mileage"],
+        }
+        for values in itertools.product(*options.values()):
+            query = {key: value for key, value in zip(options, values) if value is not None}
+            if rng.random() < 0.5:
+                query["limit"] = str(rng.randint(1, 5))
+                query["offset"] = str(rng.randint(0, 5))
+            self.assertMatchesService(rng.randint(1, 4), **query)
+
+    def test_unknown_dealer_has_no_cars(self):
+        self.assertEqual(self.engine.search(99), [])
+
+    def test_limit_is_capped(self):
+        engine = InventoryEngine([dict(self.records[0], dealer_id=1)] * 1500)
+        self.assertEqual(len(engine.search(1, limit="5000")), inventory_engine.MAX_LIMIT)
+
+    def test_invalid_sort_is_reported_like_the_service(self):
+        with self.assertRaises(ValueError):
+            self.engine.search(1, sort="colour")
+        with mock.patch.object(inventory_engine, "get_engine", return_value=self.engine):
+            result = views.search_local_inventory(1, {"sort": "colour"})
+        self.assertIn("error", result)
+
+
+class CatalogSearchTests(TestCase):
+    """
+    Filters and keyset pagination of the catalog search endpoint
+    """
+
+    url = "/djangoapp/get_cars/search"
+
+    @classmethod
+    def setUpTestData(cls):
+        audi = CarMake.objects.create(name="Audi", description="")
+        kia = CarMake.objects.create(name="Kia", description="")
+        for year in range(2015, 2025):
+            CarModel.objects.create(car_make=audi, name="A4", type="SEDAN", year=year)
+            CarModel.objects.create(car_make=audi, name="Q5", type="SUV", year=year)
+            CarModel.objects.create(car_make=kia, name="Soul", type="WAGON", year=year)
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def collect(self, **params):
+        # Follows "next" cursors to the last page
+        ids, pages = [], 0
+        cursor = None
+        while True:
+            if cursor is not None:
+                params["after"] = cursor
+            body = self.search(**params)
+            self.assertEqual(body["status"], 200)
+            ids.extend(car["id"] for car in body["CarModels"])
+            pages += 1
+            cursor = body["next"]
+            if cursor is None:
+                return ids, pages
+
+    def test_pages_cover_every_row_once_in_id_order(self):
+        ids, pages = self.collect(limit=7)
+        expected = list(CarModel.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 5)
+
+    def test_exact_last_page_has_no_cursor(self):
+        body = self.search(limit=30)
+        self.assertEqual(len(body["CarModels"]), 30)
+        self.assertIsNone(body["next"])
+
+    def test_filters_apply_across_pages(self):
+        ids, _ = self.collect(make="Audi", type="SUV", year_min=2018, year_max=2021, limit=3)
+        expected = CarModel.objects.filter(car_make__name="Audi", type="SUV",
+                                           year__gte=2018, year__lte=2021)
+        self.assertEqual(ids, list(expected.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(len(ids), 4)
+
+    def test_rows_carry_make_and_model_names(self):
+        car = self.search(make="Kia", limit=1)["CarModels"][0]
+        self.assertEqual((car["CarMake"], car["CarModel"], car["type"]), ("Kia", "Soul", "WAGON"))
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({"limit": "x"}, {"limit": "0"}, {"after": "y"}, {"year_min": "new"}):
+            self.assertEqual(self.search(**params)["status"], 400, params)
+
+
+class LoadCatalogTests(TestCase):
+    """
+    Idempotent catalog upserts from JSON and CSV files
+    """
+
+    CATALOG = [
+        {"name": "Audi", "description": "German", "models": [
+            {"name": "A4", "type": "Sedan", "year": 2021},
+            {"name": "Q5", "type": "SUV", "year": 2022},
+        ]},
+        {"name": "Kia", "description": "Korean", "models": [
+            {"name": "Soul", "type": "WAGON", "year": 2023},
+        ]},
+    ]
+
+    def test_migrate_does_not_load_the_catalog(self):
+        self.assertEqual(CarMake.objects.count(), 0)
+
+    def test_first_load_creates_makes_and_models(self):
+        counts = populate.load_catalog(self.CATALOG)
+        self.assertEqual(counts, {"makes_created": 2, "makes_updated": 0,
+                                  "models_created": 3, "models_updated": 0})
+        self.assertEqual(CarModel.objects.get(name="A4").type, "SEDAN")
+
+    def test_second_load_changes_nothing(self):
+        populate.load_catalog(self.CATALOG)
+        with mock.patch.object(populate.catalog_cache, "bump_version") as bump_version:
+            with self.captureOnCommitCallbacks(execute=True):
+                counts = populate.load_catalog(self.CATALOG)
+        self.assertEqual(set(counts.values()), {0})
+        bump_version.assert_not_called()
+        self.assertEqual((CarMake.objects.count(), CarModel.objects.count()), (2, 3))
+
+    def test_changed_descriptions_and_types_are_updated(self):
+        populate.load_catalog(self.CATALOG)
+        catalog = [{"name": "Audi", "description": "Vorsprung", "models": [
+            {"name": "A4", "type": "WAGON", "year": 2021},
+            {"name": "A4", "type": "SEDAN", "year": 2024},
+        ]}]
+        with mock.patch.object(populate.catalog_cache, "bump_version") as bump_version:
+            with self.captureOnCommitCallbacks(execute=True):
+                counts = populate.load_catalog(catalog)
+        self.assertEqual(counts, {"makes_created": 0, "makes_updated": 1,
+                                  "models_created": 1, "models_updated": 1})
+        bump_version.assert_called_once_with()
+        self.assertEqual(CarMake.objects.get(name="Audi").description, "Vorsprung")
+        self.assertEqual(CarModel.objects.get(name="A4", year=2021).type, "WAGON")
+        # Rows missing from the file are kept
+        self.assertTrue(CarModel.objects.filter(name="Q5").exists())
+
+    def test_reads_csv_catalogs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "catalog.csv"
+            path.write_text("make,model,type,year,description\n"
+                            "Audi,A4,Sedan,2021,German\n"
+                            "Audi,Q5,SUV,2022,German\n"
+                            "Kia,Soul,WAGON,2023,Korean\n", encoding="utf-8")
+            makes = populate.read_catalog(path)
+        self.assertEqual(makes, [
+            {"name": "Audi", "description": "German", "models": [
+                {"name": "A4", "type": "Sedan", "year": 2021},
+                {"name": "Q5", "type": "SUV", "year": 2022},
+            ]},
+            {"name": "Kia", "description": "Korean", "models": [
+                {"name": "Soul", "type": "WAGON", "year": 2023},
+            ]},
+        ])
+
+    def test_car_record_body_types_map_to_choices(self):
+        path = Path(settings.BASE_DIR) / "carsInventory" / "data" / "car_records.json"
+        populate.load_catalog(populate.read_catalog(path))
+        types = set(CarModel.objects.values_list('type', flat=True))
+        self.assertLessEqual(types, set(dict(CarModel.CAR_TYPES)))
+        self.assertEqual(CarModel.objects.filter(type__in=["Convertible", "Coupe"]).count(), 0)
+
+    def test_unknown_types_are_rejected_per_model(self):
+        catalog = [{"name": "Audi", "description": "", "models": [
+            {"name": "A4", "type": "Sedan", "year": 2021},
+            {"name": "R8", "type": "Spaceship", "year": 2022},
+            {"name": "TT", "type": "Roadster", "year": 2023},
+        ]}]
+        with self.assertRaisesMessage(ValueError, "Audi R8 2022: unknown type 'Spaceship'; "
+                                                  "Audi TT 2023: unknown type 'Roadster'"):
+            populate.load_catalog(catalog)
+        self.assertFalse(CarMake.objects.exists())
+
+    def test_command_reports_unknown_types(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "catalog.csv"
+            path.write_text("make,model,type,year\nAudi,R8,Spaceship,2022\n", encoding="utf-8")
+            with self.assertRaisesMessage(CommandError, "Audi R8 2022: unknown type 'Spaceship'"):
+                call_command("load_catalog", str(path), stdout=io.StringIO())
+
+    def test_command_loads_the_default_catalog_idempotently(self):
+        out = io.StringIO()
+        call_command("load_catalog", stdout=out)
+        self.assertIn("Makes: 5 created", out.getvalue())
+        first = CarModel.objects.count()
+        out = io.StringIO()
+        call_command("load_catalog", stdout=out)
+        self.assertIn("Makes: 0 created, 0 updated. Models: 0 created, 0 updated.",
+                      out.getvalue())
+        self.assertEqual(CarModel.objects.count(), first)
+
+
+class ReviewSummaryTests(TestCase):
+    """
+    Summaries are built from full review lists, never from partial counts
+    """
+
+    REVIEWS = [
+        {"id": 1, "dealership": 15, "sentiment": "positive", "purchase": True,
+         "purchase_date": "07/11/2020", "car_make": "Audi"},
+        {"id": 2, "dealership": 15, "sentiment": "negative", "purchase": True,
+         "purchase_date": "02/10/2022", "car_make": "Audi"},
+        {"id": 3, "dealership": 15, "review": "It was fine", "purchase": False, "car_make": "Kia"},
+    ]
+
+    def setUp(self):
+        self.dealers = [{"id": 15}, {"id": 16}]
+        self.reviews = self.REVIEWS
+        patcher = mock.patch.object(review_summary, "get_request", side_effect=self.backend)
+        self.get_request = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(review_summary, "get_review_sentiments",
+                                    side_effect=lambda texts: ["neutral"] * len(texts))
+        self.get_review_sentiments = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def backend(self, endpoint, ids):
+        # The backend's bulk endpoints, or None while self.reviews is None
+        ids = [int(dealer_id) for dealer_id in ids.split(",")]
+        if endpoint == "/fetchDealersByIds":
+            return [dealer for dealer in self.dealers if dealer["id"] in ids]
+        if self.reviews is None:
+            return None
+        return [dict(review) for review in self.reviews if review["dealership"] in ids]
+
+    def test_first_read_builds_from_every_review(self):
+        summary = review_summary.summary(15)
+        self.assertEqual(summary, {
+            "dealer_id": 15,
+            "summarized": True,
+            "reviews": 3,
+            "sentiments": {"positive": 1, "negative": 1, "neutral": 1, "unknown": 0},
+            "positive_percent": 33.3,
+            "average_purchase_year": 2021.0,
+            "car_makes": {"Audi": 2, "Kia": 1},
+        })
+        self.assertEqual(self.get_request.call_args_list, [
+            mock.call("/fetchDealersByIds", ids="15"),
+            mock.call("/fetchReviewsByDealers", ids="15"),
+        ])
+        # Only the review without a stored sentiment was scored
+        self.get_review_sentiments.assert_called_once_with(["It was fine"])
+        # Later reads use the stored summary
+        self.assertEqual(review_summary.summary(15), summary)
+        self.assertEqual(self.get_request.call_count, 2)
+
+    def test_summaries_with_unscored_reviews_are_not_stored(self):
+        self.get_review_sentiments.side_effect = lambda texts: ["unknown"] * len(texts)
+        summary = review_summary.summary(15)
+        self.assertTrue(summary["summarized"])
+        self.assertEqual(summary["sentiments"]["unknown"], 1)
+        self.assertFalse(DealerReviewSummary.objects.exists())
+
+        # Built again, and stored, once the analyzer answers
+        self.get_review_sentiments.side_effect = lambda texts: ["neutral"] * len(texts)
+        self.assertEqual(review_summary.summary(15)["sentiments"]["unknown"], 0)
+        self.assertTrue(DealerReviewSummary.objects.filter(dealer_id=15).exists())
+
+    def test_rebuild_scores_unscored_reviews(self):
+        self.assertEqual(review_summary.rebuild([dict(review) for review in self.REVIEWS]), 1)
+        summary = DealerReviewSummary.objects.get(dealer_id=15)
+        self.assertEqual((summary.neutral, summary.unscored), (1, 0))
+
+    def test_backfill_drops_the_summaries_it_changes(self):
+        review_summary.summaries([15, 16])
+        with mock.patch("djangoapp.management.commands.backfill_sentiments.get_request",
+                        return_value=[dict(review) for review in self.REVIEWS]), \
+                mock.patch("djangoapp.management.commands.backfill_sentiments.get_review_sentiments",
+                           return_value=["positive"]), \
+                mock.patch("djangoapp.management.commands.backfill_sentiments.update_review_sentiments",
+                           return_value={"updated": 1}) as update:
+            call_command("backfill_sentiments", stdout=io.StringIO())
+        update.assert_called_once_with([{"id": 3, "sentiment": "positive"}])
+        self.assertEqual(list(DealerReviewSummary.objects.values_list('dealer_id', flat=True)), [16])
+
+    def test_missing_summaries_are_built_together(self):
+        summaries = review_summary.summaries([15, 16])
+        self.assertEqual((summaries[15]["reviews"], summaries[16]["reviews"]), (3, 0))
+        self.assertEqual(self.get_request.call_count, 2)
+        self.assertEqual(DealerReviewSummary.objects.count(), 2)
+
+    def test_unknown_dealers_are_not_stored_or_fetched(self):
+        summaries = review_summary.summaries(list(range(100, 200)))
+        self.assertFalse(any(summary["summarized"] for summary in summaries.values()))
+        self.assertFalse(DealerReviewSummary.objects.exists())
+        # Only the dealer lookup was made
+        self.assertEqual(self.get_request.call_count, 1)
+
+        summaries = review_summary.summaries([15, 99])
+        self.assertEqual((summaries[15]["summarized"], summaries[99]["summarized"]), (True, False))
+        self.assertEqual(self.get_request.call_args, mock.call("/fetchReviewsByDealers", ids="15"))
+        self.assertEqual(list(DealerReviewSummary.objects.values_list('dealer_id', flat=True)), [15])
+
+    def test_unreachable_backend_gives_the_not_summarized_marker(self):
+        self.reviews = None
+        summary = review_summary.summary(15)
+        self.assertFalse(summary["summarized"])
+        self.assertIsNone(summary["reviews"])
+        self.assertFalse(DealerReviewSummary.objects.exists())
+
+        # The next read tries again
+        self.reviews = self.REVIEWS
+        self.assertEqual(review_summary.summary(15)["reviews"], 3)
+
+    def test_posted_reviews_never_start_a_partial_summary(self):
+        review_summary.add_review({"id": 4, "dealership": 15, "sentiment": "neutral"})
+        self.assertFalse(DealerReviewSummary.objects.exists())
+
+    def test_posted_reviews_update_existing_summaries(self):
+        review_summary.summary(15)
+        review_summary.add_review({"id": 4, "dealership": 15, "sentiment": "neutral",
+                                   "car_make": "Kia"})
+        summary = review_summary.summary(15)
+        self.assertEqual(summary["reviews"], 4)
+        self.assertEqual(summary["sentiments"]["neutral"], 2)
+        self.assertEqual(summary["car_makes"], {"Audi": 2, "Kia": 2})
+
+    def test_summaries_endpoint_builds_missing_dealers(self):
+        response = self.client.get("/djangoapp/reviews/summary", {"dealers": "15"})
+        body = response.json()
+        self.assertEqual(body["status"], 200)
+        self.assertEqual(body["summaries"]["15"]["reviews"], 3)
+
+
+class ReviewJobTests(TestCase):
+    """
+    Review job retries, dead-lettering and post-once guarantees
+    """
+
+    PAYLOAD = {"name": "Ann", "dealership": 15, "review": "Great service",
+               "purchase": False, "sentiment": "positive"}
+
+    def setUp(self):
+        patches = {
+            "post_review": mock.patch.object(jobs, "post_review", return_value={"id": 7, "dealership": 15}),
+            "sentiments": mock.patch.object(jobs, "get_review_sentiments", return_value=["neutral"]),
+            "submit": mock.patch.object(jobs, "_submit"),
+            "invalidate": mock.patch.object(jobs, "invalidate_dealer_reviews"),
+            # Closing the connection would abort the test's transaction
+            "close": mock.patch.object(jobs, "close_old_connections"),
+            "max_attempts": mock.patch.object(jobs, "review_max_attempts", 3),
+            "backoff": mock.patch.object(jobs, "review_retry_backoff", 2.0),
+        }
+        self.mocks = {name: patcher.start() for name, patcher in patches.items()}
+        for patcher in patches.values():
+            self.addCleanup(patcher.stop)
+
+    def job(self, **fields):
+        return ReviewJob.objects.create(payload=dict(self.PAYLOAD), **fields)
+
+    def test_enqueue_submits_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            job = jobs.enqueue_review(dict(self.PAYLOAD))
+            self.mocks["submit"].assert_not_called()
+        self.assertEqual(len(callbacks), 1)
+        self.mocks["submit"].assert_called_once_with(job.pk)
+
+    def test_success_posts_once_with_server_side_sentiment(self):
+        job = self.job()
+        self.assertEqual(jobs.process_job(job.pk), ReviewJob.DONE)
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.attempts), (ReviewJob.DONE, 1))
+        self.assertEqual(job.result, {"id": 7, "dealership": 15})
+        posted, = self.mocks["post_review"].call_args.args
+        self.assertEqual(posted["sentiment"], "neutral")
+        self.assertEqual(self.mocks["post_review"].call_args.kwargs,
+                         {"idempotency_key": jobs.idempotency_key(job)})
+        self.mocks["invalidate"].assert_called_once_with(15)
+
+    def test_unscored_reviews_are_posted_without_sentiment(self):
+        self.mocks["sentiments"].return_value = [jobs.UNKNOWN_SENTIMENT]
+        jobs.process_job(self.job().pk)
+        posted, = self.mocks["post_review"].call_args.args
+        self.assertNotIn("sentiment", posted)
+
+    def test_failed_post_is_retried_with_backoff(self):
+        self.mocks["post_review"].return_value = {"error": "backend down"}
+        job = self.job()
+        with self.assertLogs("djangoapp.jobs", "WARNING"):
+            self.assertEqual(jobs.process_job(job.pk), ReviewJob.RETRY)
+        self.mocks["submit"].assert_called_once_with(job.pk, 2.0)
+        job.refresh_from_db()
+        self.assertEqual(job.last_error, "backend down")
+        self.assertGreater(job.next_attempt_at, now())
+
+        # Not due yet, so no worker runs it early
+        self.assertIsNone(jobs.process_job(job.pk))
+        ReviewJob.objects.filter(pk=job.pk).update(next_attempt_at=now())
+        self.mocks["post_review"].return_value = None
+        with self.assertLogs("djangoapp.jobs", "WARNING"):
+            self.assertEqual(jobs.process_job(job.pk), ReviewJob.RETRY)
+        self.assertEqual(self.mocks["submit"].call_args.args, (job.pk, 4.0))
+        self.mocks["invalidate"].assert_not_called()
+
+    def test_exceptions_schedule_a_retry(self):
+        self.mocks["sentiments"].side_effect = DatabaseError("sentiment cache unavailable")
+        job = self.job()
+        with self.assertLogs("djangoapp.jobs", "WARNING") as logs:
+            self.assertEqual(jobs.process_job(job.pk), ReviewJob.RETRY)
+        self.assertIn("Traceback", "\n".join(logs.output))
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.last_error), (ReviewJob.RETRY, "sentiment cache unavailable"))
+        self.mocks["submit"].assert_called_once_with(job.pk, 2.0)
+        self.mocks["post_review"].assert_not_called()
+
+    def test_failed_done_save_is_retried_with_the_same_key(self):
+        job = self.job()
+        with mock.patch.object(ReviewJob, "save", autospec=True,
+                               side_effect=[DatabaseError("disk full"), None]), \
+                self.assertLogs("djangoapp.jobs", "WARNING"):
+            self.assertEqual(jobs.process_job(job.pk), ReviewJob.RETRY)
+        self.mocks["invalidate"].assert_not_called()
+        ReviewJob.objects.filter(pk=job.pk).update(state=ReviewJob.RETRY, next_attempt_at=now())
+        self.assertEqual(jobs.process_job(job.pk), ReviewJob.DONE)
+        keys = {call.kwargs["idempotency_key"] for call in self.mocks["post_review"].call_args_list}
+        self.assertEqual(keys, {jobs.idempotency_key(job)})
+
+    def test_job_is_dead_lettered_after_max_attempts(self):
+        self.mocks["post_review"].return_value = None
+        job = self.job(attempts=2)
+        with self.assertLogs("djangoapp.jobs", "ERROR"):
+            self.assertEqual(jobs.process_job(job.pk), ReviewJob.DEAD)
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.attempts), (ReviewJob.DEAD, 3))
+        self.mocks["submit"].assert_not_called()
+        self.assertIsNone(jobs.process_job(job.pk))
+
+    def test_finished_jobs_are_never_posted_again(self):
+        job = self.job()
+        jobs.process_job(job.pk)
+        self.assertIsNone(jobs.process_job(job.pk))
+        self.assertEqual(jobs.process_due_jobs(include_running=True), {})
+        self.assertEqual(self.mocks["post_review"].call_count, 1)
+
+    def test_bookkeeping_errors_do_not_fail_the_job(self):
+        with mock.patch.object(jobs.review_summary, "add_review",
+                               side_effect=DatabaseError("locked")), \
+                self.assertLogs("djangoapp.jobs", "ERROR"):
+            self.assertEqual(jobs.process_job(self.job().pk), ReviewJob.DONE)
+        self.mocks["invalidate"].assert_called_once_with(15)
+        self.assertEqual(self.mocks["post_review"].call_count, 1)
+
+    def test_process_due_jobs_resumes_interrupted_jobs(self):
+        self.job()
+        self.job(state=ReviewJob.RUNNING, attempts=1)
+        self.job(state=ReviewJob.RETRY, next_attempt_at=now() + timedelta(hours=1))
+        self.assertEqual(jobs.process_due_jobs(), {ReviewJob.DONE: 1})
+        self.assertEqual(jobs.process_due_jobs(include_running=True), {ReviewJob.DONE: 1})
+        self.assertEqual(ReviewJob.objects.filter(state=ReviewJob.RETRY).count(), 1)
+
+
+class SingleFlightTests(SimpleTestCase):
+    """
+    Coalescing of concurrent calls in threads, event loops and across processes
+    """
+
+    def run_concurrently(self, flight, function, callers=5):
+        # Runs `callers` threads through flight.do("key", function) and only
+        # lets the call finish once every other caller is waiting on it
+        waiting = threading.Semaphore(0)
+
+        class _Call(single_flight._Call):
+            def __init__(self):
+                super().__init__()
+                wait = self.done.wait
+
+                def counted_wait(*args):
+                    waiting.release()
+                    return wait(*args)
+                self.done.wait = counted_wait
+
+        def call():
+            for _ in range(callers - 1):
+                self.assertTrue(waiting.acquire(timeout=5))
+            return function()
+
+        outcomes = [None] * callers
+
+        def caller(index):
+            try:
+                outcomes[index] = ("result", flight.do("key", call))
+            except Exception as err:
+                outcomes[index] = ("error", err)
+
+        with mock.patch.object(single_flight, "_Call", _Call):
+            threads = [threading.Thread(target=caller, args=(index,)) for index in range(callers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+        return outcomes
+
+    def test_concurrent_callers_share_one_call(self):
+        function = mock.Mock(return_value=b"body")
+        flight = SingleFlight("local")
+        outcomes = self.run_concurrently(flight, function)
+        self.assertEqual(outcomes, [("result", b"body")] * 5)
+        function.assert_called_once_with()
+        self.assertEqual(flight._calls, {})
+
+    def test_errors_reach_every_waiter(self):
+        error = ValueError("upstream failed")
+        flight = SingleFlight("local")
+        outcomes = self.run_concurrently(flight, mock.Mock(side_effect=error))
+        self.assertEqual(outcomes, [("error", error)] * 5)
+        self.assertEqual(flight._calls, {})
+
+    def test_later_calls_are_not_coalesced(self):
+        function = mock.Mock(side_effect=[1, 2])
+        flight = SingleFlight("local")
+        self.assertEqual((flight.do("key", function), flight.do("key", function)), (1, 2))
+
+    def test_off_mode_calls_every_time(self):
+        function = mock.Mock(return_value=1)
+        flight = SingleFlight("off")
+        for _ in range(3):
+            flight.do("key", function)
+        self.assertEqual(function.call_count, 3)
+        self.assertEqual(flight._calls, {})
+
+    def test_async_callers_share_one_call(self):
+        calls = []
+
+        async def function():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return b"body"
+
+        async def main():
+            flight = AsyncSingleFlight("local")
+            results = await asyncio.gather(*[flight.do("key", function) for _ in range(5)])
+            other = await flight.do("other", function)
+            return results, other, flight._calls[asyncio.get_running_loop()]
+
+        results, other, in_flight = asyncio.run(main())
+        self.assertEqual(results, [b"body"] * 5)
+        self.assertEqual(other, b"body")
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(in_flight, {})
+
+    def test_cancelled_waiter_does_not_cancel_the_shared_call(self):
+        async def function():
+            await asyncio.sleep(0.05)
+            return b"body"
+
+        async def main():
+            flight = AsyncSingleFlight("local")
+            first = asyncio.ensure_future(flight.do("key", function))
+            second = asyncio.ensure_future(flight.do("key", function))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second, first.cancelled()
+
+        self.assertEqual(asyncio.run(main()), (b"body", True))
+
+    def test_shared_mode_publishes_the_result_and_releases_the_lock(self):
+        cache.clear()
+        function = mock.Mock(return_value=b"body")
+        self.assertEqual(SingleFlight("shared").do("key", function), b"body")
+        # A process that finds the lock taken reads the published result
+        self.assertTrue(cache.add(single_flight.KEY_PREFIX + "lock:" + self.digest("key"), 1))
+        self.assertEqual(single_flight._shared_do("key", function), b"body")
+        function.assert_called_once_with()
+
+    def test_shared_mode_calls_itself_when_the_holder_never_publishes(self):
+        cache.clear()
+        cache.add(single_flight.KEY_PREFIX + "lock:" + self.digest("key"), 1)
+        function = mock.Mock(return_value=b"body")
+        with mock.patch.object(single_flight, "single_flight_lock_timeout", 0.05), \
+                mock.patch.object(single_flight, "POLL_INTERVAL", 0.01):
+            self.assertEqual(single_flight._shared_do("key", function), b"body")
+        function.assert_called_once_with()
+
+    @staticmethod
+    def digest(key):
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
@@ -9,6 +9,13 @@ from django.conf.urls.static import static
 from django.conf import settings
 from . import views
 
+# Proxy views for the dealer and inventory endpoints: async under ASGI when
+# enabled, sync otherwise
+if settings.ASYNC_PROXY_VIEWS:
+    from . import async_views as proxy_views
+else:
+    proxy_views = views
+
 # App Name
 app_name = 'djangoapp'
 
@@ -26,22 +33,44 @@ urlpatterns = [
     # get_cars: Fetch available cars (`views.get_cars`)
     path(route='get_cars', view=views.get_cars, name ='getcars'),
 
-    # get_dealers: Fetch all dealerships (`views.get_dealerships`)
-    path(route='get_dealers', view=views.get_dealerships, name='get_dealers'),
+    # search_cars: Search the car catalog with filters and keyset pagination (`views.search_cars`)
+    path(route='get_cars/search', view=views.search_cars, name='search_cars'),
+
+    # get_dealers: Fetch all dealerships (`get_dealerships`)
+    path(route='get_dealers', view=proxy_views.get_dealerships, name='get_dealers'),
+
+    # get_dealers_by_state: Fetch dealerships filtered by state (`get_dealerships`)
+    path(route='get_dealers/<str:state>', view=proxy_views.get_dealerships, name='get_dealers_by_state'),
+
+    # dealer_details: Fetch details for a specific dealer by dealer_id (`get_dealer_details`)
+    path(route='dealer/<int:dealer_id>', view=proxy_views.get_dealer_details, name='dealer_details'),
 
-    # get_dealers_by_state: Fetch dealerships filtered by state (`views.get_dealerships`)
-    path(route='get_dealers/<str:state>', view=views.get_dealerships, name='get_dealers_by_state'),
+    # dealers_by_ids: Fetch several dealers at once, ?ids=1,2,3 (`get_dealers_by_ids`)
+    path(route='dealers', view=proxy_views.get_dealers_by_ids, name='dealers_by_ids'),
 
-    # dealer_details: Fetch details for a specific dealer by dealer_id (`views.get_dealer_details`)
-    path(route='dealer/<int:dealer_id>', view=views.get_dealer_details, name='dealer_details'),
+    # dealer_page: Fetch dealer details, reviews and optionally inventory in one request (`get_dealer_page`)
+    path(route='dealer/<int:dealer_id>/full', view=proxy_views.get_dealer_page, name='dealer_page'),
 
-    # dealer_reviews: Fetch reviews for a specific dealer (`views.get_dealer_reviews`)
-    path(route='reviews/dealer/<int:dealer_id>', view=views.get_dealer_reviews, name='dealer_details'),
+    # dealer_reviews: Fetch reviews for a specific dealer (`get_dealer_reviews`)
+    path(route='reviews/dealer/<int:dealer_id>', view=proxy_views.get_dealer_reviews, name='dealer_details'),
+
+    # dealer_review_summary: Review counts and breakdowns of a dealer (`views.get_dealer_review_summary`)
+    path(route='reviews/dealer/<int:dealer_id>/summary', view=views.get_dealer_review_summary,
+         name='dealer_review_summary'),
+
+    # review_summaries: Review summaries of several dealers, ?dealers=1,2,3 (`views.get_review_summaries`)
+    path(route='reviews/summary', view=views.get_review_summaries, name='review_summaries'),
 
     # add_review: Add a new review for a dealer (`views.add_review`)
     path(route='add_review', view=views.add_review, name='add_review'),
 
-    # get_inventory: Fetch inventory for a dealer (`views.get_inventory`)
-    path(route='get_inventory/<int:dealer_id>', view=views.get_inventory, name='get_inventory')
+    # review_status: State of a queued review submission (`views.review_status`)
+    path(route='review_status/<int:job_id>', view=views.review_status, name='review_status'),
+
+    # get_inventory: Fetch inventory for a dealer (`get_inventory`)
+    path(route='get_inventory/<int:dealer_id>', view=proxy_views.get_inventory, name='get_inventory'),
+
+    # metrics: Per-endpoint latency percentiles of this process (`views.metrics`)
+    path(route='metrics', view=views.metrics, name='metrics'),
 
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
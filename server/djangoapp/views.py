@@ -3,18 +3,46 @@ Views
 -----
 This file defines Django view functions for handling authentication, dealership 
 data, reviews, cars, and inventory. Views interact with models, external APIs, 
-and services, returning JSON responses for frontend consumption
+and services, returning JSON responses for frontend consumption. JSON is
+encoded with `serializers.py`, and upstream bodies the views do not change
+are passed through undecoded.
+
+Classes:
+- JsonResponse: JSON response encoded with `serializers.dumps`
 
 Functions:
-- get_cars: Returns a list of car makes and models; populates database if empty
+- get_cars: Returns a list of car makes and models
+- search_cars: Searches the car catalog by make, type and year range, with keyset pagination
 - login_user: Authenticates a user and starts a session
 - logout_request: Logs out the current user and clears session
 - registration: Registers a new user account, or returns error if already registered
+- in_pool_thread: Wraps work for a per-request thread pool, closing its DB connections afterwards
+- uncached_if_missing: Keeps a proxy response out of the response cache if its upstream call failed
+- proxy_json_response: Wraps an undecoded upstream JSON body in a {"status": 200, <key>: ...} response
+- unscored_reviews: Returns the reviews that have no stored sentiment yet
+- attach_sentiments: Sets the sentiment of each review
+- dealer_reviews_page: Fetches a page of a dealer's reviews with sentiments
+- dealerships_endpoint: Builds the backend endpoint for the dealership list
+- fetch_dealer: Returns one dealer from the local mirror when fresh, else the backend
+- parse_dealer_ids: Parses a comma-separated list of dealer ids
+- fetch_dealers_by_ids: Returns several dealers in one mirror or backend query
+- dealers_by_ids_response: Keys fetched dealers by id and reports the missing ones
+- inventory_query: Builds the car search endpoint and parameters for a dealer's inventory filters
+- search_local_inventory: Answers an inventory query from the in-process engine
+- search_inventory: Runs an inventory query against the local engine or the car search service
 - get_dealerships: Fetches a list of dealerships (all or filtered by state)
-- get_dealer_reviews: Fetches reviews for a specific dealer, with sentiment analysis
+  (dealer, review and inventory responses are cached, see `response_cache.py`)
+- get_dealer_reviews: Fetches reviews for a specific dealer, with sentiment analysis (paginated or streamed)
+- get_dealer_page: Fetches dealer details, reviews with sentiments and optionally inventory in one request
 - get_dealer_details: Fetches details of a specific dealer
-- add_review: Submits a review for a dealer (authenticated users only)
-- get_inventory: Fetches dealer inventory, filterable by year, make, model, mileage, or price
+- get_dealers_by_ids: Fetches details of several dealers in one request
+- get_dealer_review_summary: Returns a dealer's review counts per sentiment, average purchase year and car makes
+- get_review_summaries: Returns the review summaries of several dealers in one call
+- add_review: Submits a review for a dealer (authenticated users only), queued if the review queue is on
+- review_status: Returns the state of a queued review submission
+- metrics: Returns per-endpoint latency percentiles of this process (staff only)
+- get_inventory: Fetches dealer inventory, filterable by any combination of year, make, model, mileage, and price
+  (paginated or streamed)
 """
 from django.shortcuts import render
 from django.http import HttpResponseRedirect, HttpResponse
@@ -23,36 +51,113 @@ from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth import logout
 from django.contrib import messages
 from datetime import datetime
-from django.http import JsonResponse
+from django.http import HttpResponseNotModified
+from django.conf import settings
+from django.utils.http import parse_etags
+from django.utils.cache import add_never_cache_headers
 from django.contrib.auth import login, authenticate
+from django.db import connections
 import logging
-import json
+from concurrent.futures import ThreadPoolExecutor
 from django.views.decorators.csrf import csrf_exempt
-from .populate import initiate
-from .models import CarMake, CarModel
-from .restapis import get_request, analyze_review_sentiments, post_review
-from .restapis import get_request, analyze_review_sentiments, post_review, searchcars_request
+from .models import CarModel, ReviewJob
+from .restapis import (get_request, get_request_raw, get_review_sentiments, post_review,
+                       searchcars_request, searchcars_request_raw, UNKNOWN_SENTIMENT)
+from .response_cache import cache_response
+from . import catalog_cache, inventory_engine, jobs, mirror, review_summary, serializers
+from .instrumentation import in_context, metrics_snapshot, timed
+from .streaming import iter_pages, page_kwargs, page_params, stream_json_list, stream_requested
+
+
+class JsonResponse(HttpResponse):
+    """
+    HttpResponse whose content is `data` encoded with `serializers.dumps`
+    (orjson when installed), recording the encoding time under "json"
+
+    Args:
+        data: The value to encode; a dict unless `safe` is False
+        safe (bool): Refuse non-dict data, like django.http.JsonResponse
+    """
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the "
+                            "safe parameter to False.")
+        kwargs.setdefault("content_type", "application/json")
+        with timed("json"):
+            content = serializers.dumps(data)
+        super().__init__(content=content, **kwargs)
 
 
 def get_cars(request):
     """
     Returns all car makes and models from the database
 
-    - If no CarMake records exist, calls `initiate()` to populate data
-    - Uses `select_related` for efficient query joins with CarMake
+    - Read-only: the catalog is loaded by the `load_catalog` management command
+    - Serves the pre-encoded payload from `catalog_cache`; the ORM is only
+      queried after the catalog changes
+    - Answers 304 Not Modified when If-None-Match matches the catalog ETag
+
+    Returns:
+        HttpResponse: {"CarModels": [{"CarModel": <name>, "CarMake": <make>}, ...]}
+    """
+    body, etag = catalog_cache.get_catalog()
+    if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    return response
+
+# Page size bounds for the catalog search
+CATALOG_PAGE_SIZE = 50
+CATALOG_MAX_PAGE_SIZE = 500
+
+def search_cars(request):
+    """
+    Searches the car catalog with filters and keyset pagination
+
+    Query Parameters (optional):
+        - make: Car make name
+        - type: Car type (e.g. SUV, SEDAN)
+        - year_min, year_max: Inclusive model year range
+        - after: Cursor from the previous page's "next" value
+        - limit: Page size (default 50, at most 500)
 
     Returns:
-        JsonResponse: {"CarModels": [{"CarModel": <name>, "CarMake": <make>}, ...]}
-    """
-    count = CarMake.objects.filter().count()
-    print(count)
-    if(count == 0):
-        initiate()
-    car_models = CarModel.objects.select_related('car_make')
-    cars = []
-    for car_model in car_models:
-        cars.append({"CarModel": car_model.name, "CarMake": car_model.car_make.name})
-    return JsonResponse({"CarModels":cars})
+        JsonResponse: {"status": 200, "CarModels": [{"id", "CarModel", "CarMake", "type", "year"}, ...],
+                       "next": <cursor for the next page, or null>} if successful,
+                      {"status": 400, "message": "Bad Request"} on invalid parameters
+    """
+    data = request.GET
+    try:
+        limit = min(int(data.get('limit', CATALOG_PAGE_SIZE)), CATALOG_MAX_PAGE_SIZE)
+        after = int(data.get('after', 0))
+        year_min = int(data['year_min']) if 'year_min' in data else None
+        year_max = int(data['year_max']) if 'year_max' in data else None
+    except ValueError:
+        return JsonResponse({"status":400,"message":"Bad Request"})
+    if limit <= 0:
+        return JsonResponse({"status":400,"message":"Bad Request"})
+
+    car_models = CarModel.objects.all()
+    if 'make' in data:
+        # Joins on the unique make name, then seeks the (car_make, [type,] id) index
+        car_models = car_models.filter(car_make__name=data['make'])
+    if 'type' in data:
+        car_models = car_models.filter(type=data['type'])
+    if year_min is not None:
+        car_models = car_models.filter(year__gte=year_min)
+    if year_max is not None:
+        car_models = car_models.filter(year__lte=year_max)
+
+    # Keyset pagination: seek past the last id instead of counting an offset
+    rows = list(car_models.filter(id__gt=after).order_by('id')
+                .values('id', 'name', 'car_make__name', 'type', 'year')[:limit + 1])
+    next_cursor = rows[limit - 1]['id'] if len(rows) > limit else None
+    cars = [{"id": row['id'], "CarModel": row['name'], "CarMake": row['car_make__name'],
+             "type": row['type'], "year": row['year']} for row in rows[:limit]]
+    return JsonResponse({"status":200,"CarModels":cars,"next":next_cursor})
 
 # Get an instance of a logger
 logger = logging.getLogger(__name__)
@@ -72,7 +177,7 @@ def login_user(request):
     """
 
     # Get username and password from request.POST dictionary
-    data = json.loads(request.body)
+    data = serializers.loads(request.body)
     username = data['userName']
     password = data['password']
     # Check if provide credential can be authenticated
@@ -116,7 +221,7 @@ def registration(request):
     """
     context = {}
     # Load JSON data from the request body
-    data = json.loads(request.body)
+    data = serializers.loads(request.body)
     username = data['userName']
     password = data['password']
     first_name = data['firstName']
@@ -130,7 +235,7 @@ def registration(request):
         username_exist = True
     except:
         # If not, simply log this is a new user
-        logger.debug("{} is new user".format(username))
+        logger.debug("%s is new user", username)
 
     # If it is a new user
     if not username_exist:
@@ -144,9 +249,201 @@ def registration(request):
         data = {"userName":username,"error":"Already Registered"}
         return JsonResponse(data)
 
+def in_pool_thread(function):
+    """
+    Wraps a function to run on a per-request thread pool: in the request's
+    timing context, closing the DB connections the thread opened (e.g. for
+    mirror reads) when it finishes, since the thread is discarded after the
+    request
+    """
+    function = in_context(function)
+
+    def run(*args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        finally:
+            connections.close_all()
+    return run
+
+def uncached_if_missing(response, *upstream_data):
+    """
+    Marks a proxy response as not storable when any of its upstream calls
+    failed, so the response cache does not keep the failure around
+    """
+    if any(data is None for data in upstream_data):
+        add_never_cache_headers(response)
+    return response
+
+def proxy_json_response(key, body):
+    """
+    Builds {"status": 200, <key>: <upstream body>} around an upstream JSON
+    body without decoding and re-encoding it
+
+    Args:
+        key (str): Key the upstream data is returned under
+        body (bytes): Body from `get_request_raw` or `searchcars_request_raw`,
+                      or None if the upstream call failed
+
+    Returns:
+        HttpResponse: application/json response, kept out of the response
+                      cache if the call failed (the data is then null)
+    """
+    if body is None:
+        return uncached_if_missing(JsonResponse({"status":200,key:None}), body)
+    return HttpResponse(b'{"status":200,' + serializers.dumps(key) + b':' + body + b'}',
+                        content_type="application/json")
+
+def unscored_reviews(reviews):
+    """
+    Returns the reviews that have no stored sentiment yet
+    """
+    return [review_detail for review_detail in reviews
+            if review_detail.get('sentiment') in (None, "", UNKNOWN_SENTIMENT)]
+
+def attach_sentiments(reviews, sentiments):
+    """
+    Sets the sentiment of each review
+
+    Returns:
+        bool: True if every review was scored, False if any is UNKNOWN_SENTIMENT
+    """
+    for review_detail, sentiment in zip(reviews, sentiments):
+        review_detail['sentiment'] = sentiment
+    return UNKNOWN_SENTIMENT not in sentiments
+
+def dealerships_endpoint(state):
+    """
+    Returns the backend endpoint listing dealerships for a state, or all of them
+    """
+    if(state == "All"):
+        return "/fetchDealers"
+    return "/fetchDealers/"+state
+
+def fetch_dealer(dealer_id):
+    """
+    Returns a dealer as a one-item list, from the local mirror while it is
+    fresh (see `mirror.py`), else from the backend
+    """
+    if mirror.serving():
+        return mirror.dealer(dealer_id)
+    return get_request("/fetchDealer/"+str(dealer_id))
+
+# Most dealer ids accepted by one batched request
+MAX_DEALER_IDS = 100
+
+def parse_dealer_ids(value):
+    """
+    Parses a comma-separated list of dealer ids, e.g. "1,2,3"
+
+    Returns:
+        list[int]: The ids in order, without duplicates
+
+    Raises:
+        ValueError: If an id is not an integer or there are more than MAX_DEALER_IDS
+    """
+    dealer_ids = list(dict.fromkeys(int(dealer_id) for dealer_id in value.split(",")))
+    if len(dealer_ids) > MAX_DEALER_IDS:
+        raise ValueError("At most {} dealer ids".format(MAX_DEALER_IDS))
+    return dealer_ids
+
+def fetch_dealers_by_ids(dealer_ids):
+    """
+    Returns the dealers with the given ids in one query, from the local
+    mirror while it is fresh, else from the backend
+    """
+    if mirror.serving():
+        return mirror.dealers_by_ids(dealer_ids)
+    return get_request("/fetchDealersByIds",
+                       ids=",".join(str(dealer_id) for dealer_id in dealer_ids))
+
+def dealers_by_ids_response(dealer_ids, dealers):
+    """
+    Builds the `get_dealers_by_ids` response from the fetched dealers
+
+    Returns:
+        JsonResponse: {"status": 200, "dealers": {<id>: <dealer>}, "missing": [<id>, ...]},
+                      or {"status": 502, "message": "Bad Gateway"} if the fetch failed
+    """
+    if not isinstance(dealers, list):
+        return JsonResponse({"status":502,"message":"Bad Gateway"}, status=502)
+    found = {dealer['id']: dealer for dealer in dealers if dealer.get('id') in dealer_ids}
+    return JsonResponse({
+        "status":200,
+        "dealers":{dealer_id: found[dealer_id] for dealer_id in dealer_ids if dealer_id in found},
+        "missing":[dealer_id for dealer_id in dealer_ids if dealer_id not in found],
+    })
+
+# Query parameters pushed down to the car search service's combined query
+INVENTORY_FILTERS = ('year', 'make', 'model', 'mileage', 'price')
+INVENTORY_PAGING = ('sort', 'limit', 'offset')
+
+def inventory_query(dealer_id, data):
+    """
+    Returns the car search endpoint and query parameters for a dealer's
+    inventory, combining every filter, sort and paging option in `data`
+
+    Returns:
+        tuple: (endpoint, params) for `searchcars_request(endpoint, **params)`
+    """
+    params = {key: data[key] for key in INVENTORY_FILTERS + INVENTORY_PAGING
+              if key in data}
+    return "/carsearch/"+str(dealer_id), params
+
+def search_local_inventory(dealer_id, params):
+    """
+    Answers an inventory query from the in-process engine
+
+    Returns:
+        list: Matching cars, or {"error": <message>} for an invalid query,
+              as the car search service would
+    """
+    try:
+        return inventory_engine.get_engine().search(dealer_id, **params)
+    except ValueError as err:
+        return {"error": str(err)}
+
+def search_inventory(dealer_id, data):
+    """
+    Returns a dealer's cars matching the inventory filters in `data`, from the
+    local engine or the car search service depending on `inventory_backend`
+    """
+    endpoint, params = inventory_query(dealer_id, data)
+    if inventory_engine.inventory_backend == "local":
+        return search_local_inventory(dealer_id, params)
+    return searchcars_request(endpoint, **params)
+
+def dealer_reviews_page(dealer_id, offset=0, limit=None):
+    """
+    Fetches a page of a dealer's reviews, from the local mirror while it is
+    fresh or else from the backend, and attaches a sentiment to each
+
+    Returns:
+        tuple: (reviews, or None if the backend call failed,
+                True if every review was scored)
+    """
+    from_mirror = mirror.serving()
+    if from_mirror:
+        reviews = mirror.dealer_reviews(dealer_id, offset, limit)
+    else:
+        reviews = get_request("/fetchReviews/dealer/"+str(dealer_id),
+                              **page_kwargs(offset, limit))
+    if not isinstance(reviews, list):
+        return None, True
+    # Only reviews written before sentiments were stored still need scoring,
+    # all at once instead of one blocking call per review
+    pending = unscored_reviews(reviews)
+    sentiments = get_review_sentiments(
+        [review_detail['review'] for review_detail in pending])
+    scored = attach_sentiments(pending, sentiments)
+    if from_mirror and pending:
+        # Keep the labels so mirrored reviews are only scored once
+        mirror.save_sentiments(pending)
+    return reviews, scored
+
+@cache_response("dealers", scope_kwarg="state")
 def get_dealerships(request, state="All"):
     """
-    Fetches dealerships from the backend service
+    Fetches dealerships from the local mirror or the backend service
 
     Args:
         state (str): Optional. If provided, filters dealerships by state.
@@ -155,13 +452,12 @@ def get_dealerships(request, state="All"):
     Returns:
         JsonResponse: {"status": 200, "dealers": <list of dealerships>}
     """
-    if(state == "All"):
-        endpoint = "/fetchDealers"
-    else:
-        endpoint = "/fetchDealers/"+state
-    dealerships = get_request(endpoint)
-    return JsonResponse({"status":200,"dealers":dealerships})
+    if mirror.serving():
+        return JsonResponse({"status":200,"dealers":mirror.dealerships(state)})
+    # The backend's list is returned unchanged, so it is not decoded
+    return proxy_json_response("dealers", get_request_raw(dealerships_endpoint(state)))
 
+@cache_response("dealer_reviews")
 def get_dealer_reviews(request, dealer_id):
     """
     Fetches dealer reviews with sentiment analysis
@@ -169,23 +465,85 @@ def get_dealer_reviews(request, dealer_id):
     Args:
         dealer_id (int): The ID of the dealer
 
+    Query Parameters (optional):
+        - offset: Number of reviews to skip
+        - limit: Maximum number of reviews to return (0 for all of them)
+        - stream: If "true", write the list incrementally, one upstream page at a time
+
     Returns:
         JsonResponse: {"status": 200, "reviews": <list with sentiments>} if valid dealer_id,
                       {"status": 400, "message": "Bad Request"} otherwise
+        StreamingHttpResponse: {"status": 200, "reviews": [...], "complete": <bool>} when streaming
     """
 
     # if dealer id has been provided
     if(dealer_id):
-        endpoint = "/fetchReviews/dealer/"+str(dealer_id)
-        reviews = get_request(endpoint)
-        for review_detail in reviews:
-            response = analyze_review_sentiments(review_detail['review'])
-            print(response)
-            review_detail['sentiment'] = response['sentiment']
-        return JsonResponse({"status":200,"reviews":reviews})
+        try:
+            offset, limit = page_params(request.GET)
+        except ValueError:
+            return JsonResponse({"status":400,"message":"Bad Request"})
+        if stream_requested(request.GET):
+            # Fetch, score and write one page at a time
+            pages = iter_pages(
+                lambda page_offset, size: dealer_reviews_page(dealer_id, page_offset, size)[0],
+                offset, limit)
+            return stream_json_list("reviews", pages)
+
+        reviews, scored = dealer_reviews_page(dealer_id, offset, limit)
+        response = uncached_if_missing(
+            JsonResponse({"status":200,"reviews":reviews}), reviews)
+        if not scored:
+            # Retry the failed scores on the next read instead of caching them
+            add_never_cache_headers(response)
+        return response
     else:
         return JsonResponse({"status":400,"message":"Bad Request"})
 
+@cache_response("dealer_full")
+def get_dealer_page(request, dealer_id):
+    """
+    Fetches everything the dealer page shows in one request
+
+    Dealer details, reviews and (optionally) inventory are fetched from the
+    upstream services concurrently, and reviews are scored while the other
+    requests are still in flight.
+
+    Args:
+        dealer_id (int): The ID of the dealer
+
+    Query Parameters (optional):
+        - inventory: If "true", include the first page of the dealer's cars
+        - inventory_limit: Number of cars in that page (default 10)
+
+    Returns:
+        JsonResponse: {"status": 200, "dealer": <dealer data>, "reviews": <list with sentiments>,
+                       "cars": <first inventory page, only if requested>} if valid dealer_id,
+                      {"status": 400, "message": "Bad Request"} otherwise
+    """
+    if not dealer_id:
+        return JsonResponse({"status":400,"message":"Bad Request"})
+
+    include_inventory = request.GET.get('inventory', 'false').lower() == 'true'
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        # Upstream calls made on the pool are timed under this request
+        dealer_future = executor.submit(in_pool_thread(fetch_dealer), dealer_id)
+        reviews_future = executor.submit(in_pool_thread(dealer_reviews_page), dealer_id)
+        if include_inventory:
+            cars_future = executor.submit(
+                in_pool_thread(search_inventory), dealer_id,
+                {'limit': request.GET.get('inventory_limit', '10')})
+
+        reviews, scored = reviews_future.result()
+        data = {"status":200,"dealer":dealer_future.result(),"reviews":reviews}
+        if include_inventory:
+            data["cars"] = cars_future.result()
+
+    response = uncached_if_missing(JsonResponse(data), *data.values())
+    if not scored:
+        add_never_cache_headers(response)
+    return response
+
+@cache_response("dealer_details")
 def get_dealer_details(request, dealer_id):
     """
     Fetches details of a specific dealer
@@ -198,12 +556,71 @@ def get_dealer_details(request, dealer_id):
                       {"status": 400, "message": "Bad Request"} otherwise
     """
     if(dealer_id):
-        endpoint = "/fetchDealer/"+str(dealer_id)
-        dealership = get_request(endpoint)
-        return JsonResponse({"status":200,"dealer":dealership})
+        if mirror.serving():
+            return JsonResponse({"status":200,"dealer":mirror.dealer(dealer_id)})
+        return proxy_json_response("dealer", get_request_raw("/fetchDealer/"+str(dealer_id)))
     else:
         return JsonResponse({"status":400,"message":"Bad Request"})
 
+@cache_response("dealers_by_ids")
+def get_dealers_by_ids(request):
+    """
+    Fetches details of several dealers in one request, with one batched
+    backend query (or mirror lookup) instead of one per dealer
+
+    Query Parameters:
+        - ids: Comma-separated dealer ids, e.g. "1,2,3" (at most MAX_DEALER_IDS)
+
+    Returns:
+        JsonResponse: {"status": 200, "dealers": {<id>: <dealer data>},
+                       "missing": [<ids with no dealer>]},
+                      {"status": 400, "message": "Bad Request"} for a missing or malformed ids list,
+                      {"status": 502, "message": "Bad Gateway"} if the backend could not be reached
+    """
+    try:
+        dealer_ids = parse_dealer_ids(request.GET['ids'])
+    except (KeyError, ValueError):
+        return JsonResponse({"status":400,"message":"Bad Request"}, status=400)
+    return dealers_by_ids_response(dealer_ids, fetch_dealers_by_ids(dealer_ids))
+
+def get_dealer_review_summary(request, dealer_id):
+    """
+    Returns the review summary of a dealer, without scoring its reviews; they
+    are only fetched the first time the dealer is summarized (see `review_summary.py`)
+
+    Args:
+        dealer_id (int): The ID of the dealer
+
+    Returns:
+        JsonResponse: {"status": 200, "summary": {"dealer_id", "summarized", "reviews",
+                       "sentiments": {"positive", "negative", "neutral", "unknown"},
+                       "positive_percent", "average_purchase_year", "car_makes"}};
+                      "summarized" is false, and the rest null, if the dealer does
+                      not exist or its reviews could not be fetched to build its summary
+    """
+    return JsonResponse({"status":200,"summary":review_summary.summary(dealer_id)})
+
+def get_review_summaries(request):
+    """
+    Returns the review summaries of several dealers in one call
+
+    Query Parameters (optional):
+        - dealers: Comma-separated dealer ids, e.g. "1,2,3"; all summarized
+          dealers if omitted
+
+    Returns:
+        JsonResponse: {"status": 200, "summaries": {<dealer_id>: <summary>}}, where
+                      missing summaries of existing dealers are built together and
+                      unknown dealers are not summarized,
+                      {"status": 400, "message": "Bad Request"} for a malformed dealers list
+    """
+    dealers = request.GET.get('dealers')
+    try:
+        dealer_ids = parse_dealer_ids(dealers) if dealers else None
+    except ValueError:
+        return JsonResponse({"status":400,"message":"Bad Request"}, status=400)
+    return JsonResponse({"status":200,"summaries":review_summary.summaries(dealer_ids)})
+
 def add_review(request):
     """
     Submits a review for a dealer
@@ -213,22 +630,68 @@ def add_review(request):
 
     Request Body (JSON):
         - Review data fields as required by backend service
+        (the review's sentiment is scored here and stored with it; a
+        "sentiment" field sent by the client is ignored)
+
+    With the review queue on (see `jobs.py`) the review is stored and posted
+    in the background; poll `review_status/<job_id>` for the outcome.
 
     Returns:
         JsonResponse: {"status": 200} if successful,
+                      {"status": 202, "job_id": <id>} if the review was queued,
                       {"status": 401, "message": "Error in posting review"} on error,
                       {"status": 403, "message": "Unauthorized"} if user is not logged in
     """
     if(request.user.is_anonymous == False):
-        data = json.loads(request.body)
-        try:
-            response = post_review(data)
-            return JsonResponse({"status":200})
-        except:
+        data = serializers.loads(request.body)
+        # The sentiment is only ever set by server-side scoring, never by the client
+        data.pop('sentiment', None)
+        if jobs.queue_enabled():
+            job = jobs.enqueue_review(data, request.user)
+            return JsonResponse({"status":202,"job_id":job.pk}, status=202)
+        # Score once on submission so reads never need the analyzer
+        sentiment = get_review_sentiments([data.get('review', "")])[0]
+        if sentiment != UNKNOWN_SENTIMENT:
+            data['sentiment'] = sentiment
+        # post_review returns None on network errors and {"error": ...}
+        # when the backend could not save the review
+        response = post_review(data)
+        if not isinstance(response, dict) or response.get('error'):
             return JsonResponse({"status":401,"message":"Error in posting review"})
+        # Best-effort; also drops cached reviews so the new one shows up
+        jobs.record_posted_review(response, data.get('dealership'))
+        return JsonResponse({"status":200})
     else:
         return JsonResponse({"status":403,"message":"Unauthorized"})
 
+def review_status(request, job_id):
+    """
+    Returns the state of a queued review submission
+
+    Args:
+        job_id (int): The job id returned by `add_review`
+
+    Returns:
+        JsonResponse: {"status": 200, "job": {"id", "state", "attempts", "last_error"}}
+                      where state is queued, running, retry, done or dead,
+                      {"status": 403, "message": "Unauthorized"} unless the job is the user's,
+                      {"status": 404, "message": "Job not found"} for an unknown job
+    """
+    if request.user.is_anonymous:
+        return JsonResponse({"status":403,"message":"Unauthorized"}, status=403)
+    job = ReviewJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return JsonResponse({"status":404,"message":"Job not found"}, status=404)
+    if job.user_id != request.user.pk:
+        return JsonResponse({"status":403,"message":"Unauthorized"}, status=403)
+    return JsonResponse({"status":200,"job":{
+        "id": job.pk,
+        "state": job.state,
+        "attempts": job.attempts,
+        "last_error": job.last_error,
+    }})
+
+@cache_response("inventory")
 def get_inventory(request, dealer_id):
     """
     Fetches dealer inventory with optional filters
@@ -236,34 +699,58 @@ def get_inventory(request, dealer_id):
     Args:
         dealer_id (int): The ID of the dealer
 
-    Query Parameters (optional):
-        - year: Filter cars by year
+    Query Parameters (optional, any combination):
+        - year: Filter cars by year (this year or newer)
         - make: Filter cars by make
         - model: Filter cars by model
         - mileage: Filter cars by max mileage
         - price: Filter cars by price
+        - sort: Field to sort by (make, model, year, mileage or price), "-" prefix for descending
+        - limit: Maximum number of cars to return (0 for all of them)
+        - offset: Number of matching cars to skip
+        - stream: If "true", write the list incrementally, one page at a time
 
     Returns:
         JsonResponse: {"status": 200, "cars": <filtered inventory>} if successful,
                       {"status": 400, "message": "Bad Request"} otherwise
+        StreamingHttpResponse: {"status": 200, "cars": [...], "complete": <bool>} when streaming
     """
     data = request.GET
     if (dealer_id):
-        if 'year' in data:
-            endpoint = "/carsbyyear/"+str(dealer_id)+"/"+data['year']
-        elif 'make' in data:
-            endpoint = "/carsbymake/"+str(dealer_id)+"/"+data['make']
-        elif 'model' in data:
-            endpoint = "/carsbymodel/"+str(dealer_id)+"/"+data['model']
-        elif 'mileage' in data:
-            endpoint = "/carsbymaxmileage/"+str(dealer_id)+"/"+data['mileage']
-        elif 'price' in data:
-            endpoint = "/carsbyprice/"+str(dealer_id)+"/"+data['price']
-        else:
-            endpoint = "/cars/"+str(dealer_id)
- 
-        cars = searchcars_request(endpoint)
-        return JsonResponse({"status": 200, "cars": cars})
+        try:
+            offset, limit = page_params(data)
+        except ValueError:
+            return JsonResponse({"status": 400, "message": "Bad Request"})
+        if stream_requested(data):
+            # Run the query one page at a time and write each page as it arrives
+            def fetch_page(page_offset, size):
+                return search_inventory(dealer_id, dict(
+                    data.items(), offset=str(page_offset), limit=str(size)))
+            return stream_json_list("cars", iter_pages(fetch_page, offset, limit))
+
+        # All filters run as one query instead of fetching and filtering here
+        if inventory_engine.inventory_backend == "local":
+            cars = search_inventory(dealer_id, data)
+            return uncached_if_missing(
+                JsonResponse({"status": 200, "cars": cars}), cars)
+        # The car search service's list is returned unchanged, so it is not decoded
+        endpoint, params = inventory_query(dealer_id, data)
+        return proxy_json_response("cars", searchcars_request_raw(endpoint, **params))
     else:
         return JsonResponse({"status": 400, "message": "Bad Request"})
-    return JsonResponse({"status": 400, "message": "Bad Request"})
+
+def metrics(request):
+    """
+    Returns per-endpoint latency percentiles recorded by this process
+
+    Requirements:
+        - User must be staff, unless DEBUG is on
+
+    Returns:
+        JsonResponse: {"status": 200, "endpoints": {<route>: {"total" or metric:
+                       {"count", "mean", "max", "p50", "p95", "p99"}}}} in milliseconds,
+                      {"status": 403, "message": "Unauthorized"} otherwise
+    """
+    if not (settings.DEBUG or request.user.is_staff):
+        return JsonResponse({"status":403,"message":"Unauthorized"}, status=403)
+    return JsonResponse({"status":200,"endpoints":metrics_snapshot()})
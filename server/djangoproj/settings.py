@@ -35,6 +35,11 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [],
 }
 
+# Serve the dealer and inventory proxy views with their async versions
+# (`djangoapp/async_views.py`). Only useful when running under ASGI
+ASYNC_PROXY_VIEWS = os.getenv(
+    'async_proxy_views', default='false').lower() == 'true'
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -48,6 +53,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the timings cover every other middleware
+    'djangoapp.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -91,6 +98,24 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# The catalog and response caches and shared single-flight invalidate across
+# processes through this cache, so deployments running more than one process
+# (or running management commands next to the server) need a shared backend.
+# cache_backend: Django cache backend class (default LocMemCache, which is
+#   per process; `manage.py check` warns about it, see djangoapp/checks.py)
+# cache_location: the backend's LOCATION, e.g. redis://127.0.0.1:6379/1,
+#   127.0.0.1:11211 or a directory for FileBasedCache
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('cache_backend',
+                             default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('cache_location', default=''),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME':
@@ -143,3 +168,47 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'frontend/build'),
     os.path.join(BASE_DIR, 'frontend/build/static'),
 ]
+
+# Logging
+# https://docs.djangoproject.com/en/3.2/topics/logging/
+# Records go through a queue to a background writer thread (see djangoapp/log.py).
+# log_level: level for the djangoapp loggers (default WARNING, so nothing
+#   below a warning is formatted on the request path)
+# log_format: "text" or "json" (default text)
+# log_sample_rate: fraction of debug/info records kept, above 0 and at most 1
+#   (default 1); other values stop the server at startup
+
+LOG_LEVEL = os.getenv('log_level', default='WARNING').upper()
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sample': {
+            '()': 'djangoapp.log.SamplingFilter',
+            'rate': float(os.getenv('log_sample_rate', default='1')),
+        },
+    },
+    'formatters': {
+        'text': {
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
+        },
+        'json': {
+            '()': 'djangoapp.log.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'queue': {
+            'class': 'djangoapp.log.QueueingStreamHandler',
+            'formatter': os.getenv('log_format', default='text'),
+            'filters': ['sample'],
+        },
+    },
+    'loggers': {
+        'djangoapp': {
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
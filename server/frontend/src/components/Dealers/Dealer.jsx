@@ -2,8 +2,8 @@
 React component for displaying details and reviews of a specific car dealer.
 
 Responsibilities:
-Fetch dealer information from the backend based on the dealer ID from URL params
-Fetch reviews for the dealer, including sentiment analysis icons
+Fetch dealer information and reviews (with sentiments) from the backend in one
+request, based on the dealer ID from URL params, and show sentiment analysis icons
 Display a "Post Review" button if the user is logged in (sessionStorage username exists)
 Show dealer information including name, address, city, state, and zip
 Provide a link to search available cars for the dealer
@@ -31,31 +31,21 @@ const Dealer = () => {
   let root_url = curr_url.substring(0,curr_url.indexOf("dealer"));
   let params = useParams();
   let id =params.id;
-  let dealer_url = root_url+`djangoapp/dealer/${id}`;
-  let reviews_url = root_url+`djangoapp/reviews/dealer/${id}`;
+  let dealer_page_url = root_url+`djangoapp/dealer/${id}/full`;
   let post_review = root_url+`postreview/${id}`;
   
-  // Fetch dealer info from backend
-  const get_dealer = async ()=>{
-    const res = await fetch(dealer_url, {
+  // Fetch dealer info and reviews from backend, and mark if no reviews exist
+  const get_dealer_page = async ()=>{
+    const res = await fetch(dealer_page_url, {
       method: "GET"
     });
     const retobj = await res.json();
     
     if(retobj.status === 200) {
-      setDealer(retobj.dealer[0])
-    }
-  }
-
-  // Fetch reviews and mark if none exist
-  const get_reviews = async ()=>{
-    const res = await fetch(reviews_url, {
-      method: "GET"
-    });
-    const retobj = await res.json();
-    
-    if(retobj.status === 200) {
-      if(retobj.reviews.length > 0){
+      if(retobj.dealer) {
+        setDealer(retobj.dealer[0])
+      }
+      if(retobj.reviews && retobj.reviews.length > 0){
         setReviews(retobj.reviews)
       } else {
         setUnreviewed(true);
@@ -70,8 +60,7 @@ const Dealer = () => {
   }
 
   useEffect(() => {
-    get_dealer();
-    get_reviews();
+    get_dealer_page();
 
     // Show "Post Review" button if user is logged in
     if(sessionStorage.getItem("username")) {
@@ -78,8 +78,8 @@ const PostReview = () => {
   });
 
   const json = await res.json();
-  if (json.status === 200) {
-      // Redirect to dealer page on success
+  if (json.status === 200 || json.status === 202) {
+      // Redirect to dealer page on success (202: the review is queued and shows up shortly)
       window.location.href = window.location.origin+"/dealer/"+id;
   }
 